@@ -1,193 +1,389 @@
-import asyncio
-import aiofiles
+import time
 import psutil
-import pandas as pd
 import json
 from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-import xlsxwriter
+from collector import Collector, make_snapshot
+from scheduler import SamplingScheduler, DEFAULT_TIERS, CPU_BUDGET, attrs_for
+from license_catalog import LicenseCatalog
+from rollups import Rollups
+from proc_reader import default_sampler
+from capture import CaptureWriter, RecordingSampler
+from retention import RetentionManager
+from registry import ProcessRegistry, SORT_KEYS
+from topk import TopKIndex
+from process_tree import ProcessTree, GROUP_SORT_KEYS
+from persist_log import ChangeLog
+from energy import EnergyLedger
+from usage_index import UsageIndex
+from last_execution import LastExecutionResolver, default_providers, unused_licenses
+import store
+from tree_view import VirtualTree, SortHeadings, TreeRows
+from exporter import RowsExportJob
+from export_dialog import ExportDialog
+import scoring
+import instrument
 
 # Placeholder data (replace with actual data or functions)
 
 
 license_cost_data_file = 'license_cost_data.json'
-
-# Placeholder constants for power consumption and emissions factor
-CPU_POWER_CONSUMPTION_W = 50  # Watts
-MEMORY_POWER_CONSUMPTION_W_PER_GB = 5  # Watts per GB
-EMISSIONS_FACTOR_KG_CO2_PER_KWH = 0.475  # Average emissions factor
-
-# In-memory data storage
-process_data = {}
+license_catalog = LicenseCatalog(license_cost_data_file)
+
+# Power consumption and emissions factor for this host (see power_model.json)
+power_model = scoring.load_power_model()
+CPU_POWER_CONSUMPTION_W = power_model.cpu_power_w  # Watts
+MEMORY_POWER_CONSUMPTION_W_PER_GB = power_model.memory_power_w_per_gb  # Watts per GB
+EMISSIONS_FACTOR_KG_CO2_PER_KWH = power_model.emissions_factor_kg_co2_per_kwh  # Average emissions factor
+
+# In-memory data storage; processes are keyed by (pid, create_time)
+registry = ProcessRegistry()
+# Top 20 per sort key, maintained from each sweep's records instead of sorting them all
+rankings = TopKIndex(registry.records, SORT_KEYS, k=20)
+# Live processes linked by ppid and rolled up to their licensed application;
+# only applications whose members changed are re-ranked each sweep
+process_tree = ProcessTree()
+app_rankings = TopKIndex(process_tree.groups, GROUP_SORT_KEYS, k=20)
+tree_mode = False  # Set from the UI; application rows are only built while the tree is shown
 hourly_data = {}
 sustainability_hourly_data = {}
 
-def monitor_processes():
-    current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username']):
+# Set METRICS_PORT (e.g. instrument.DEFAULT_PORT) to serve the monitor's own
+# metrics at http://127.0.0.1:<port>/metrics; the Diagnostics window shows the
+# same. Both turn instrumentation on, which is otherwise off.
+METRICS_PORT = None
+# Set CAPTURE_FILE (e.g. 'incident.capture.gz') to also record every sweep
+# for later replay with capture.py
+CAPTURE_FILE = None
+
+# Latest snapshot published by the collector thread; the UI only reads this
+latest_snapshot = None
+UI_POLL_MS = 200
+# Sweeps are paced per metric (CPU every 2 s, memory and I/O every 10 s,
+# threads every 60 s, stretched while quiet) within 1% of a core
+scheduler = SamplingScheduler(DEFAULT_TIERS, budget=CPU_BUDGET)
+for tier in DEFAULT_TIERS:
+    instrument.gauge_callback('sweep_interval_seconds', lambda tier=tier: scheduler.interval(tier), metric=tier)
+sweep_totals = {}  # Per-metric totals of the last sweep, fed back to the scheduler
+
+# Sweep-level time series at raw/minute/hour/day resolution. Written by the
+# collector thread and read by the analytics window, hence the shared connection.
+rollups = Rollups(store.connect('process_rollups.db', check_same_thread=False))
+ANALYTICS_WINDOW = timedelta(days=7)
+
+# First/last seen, runtime and users per executable, for the unused-license
+# report. Its own connection: the collector writes while the UI reads.
+usage_index = UsageIndex(store.connect('process_rollups.db', check_same_thread=False))
+UNUSED_LICENSE_DAYS = 60  # Licensed executables idle this long are reported
+# Other records of when programs last ran (process accounting, WMI), cached for ten minutes
+last_run = LastExecutionResolver(default_providers(usage_index))
+
+# Bounds on in-memory state: processes not seen for PROCESS_TTL are dropped, and
+# both stores are capped with least-recently-updated eviction
+PROCESS_TTL = timedelta(days=1)
+MAX_TRACKED_PROCESSES = 20000
+MAX_HOURLY_ENTRIES = 24 * 90
+ENERGY_ROW_TTL = timedelta(days=90)  # Totals of processes not seen for this long are dropped
+# Only changed records are appended to the process_state/ log; state is
+# rebuilt by replaying it on startup. A record's last-seen time moves every
+# sweep, so on its own it doesn't count as a change (ProcessRecord.fingerprint).
+state_log = ChangeLog()
+saved_state = state_log.load()
+registry.load(saved_state.get('processes', {}))
+state_log.remember('processes', registry.records)
+hourly_data.update(saved_state.get('hourly_data', {}))
+if saved_state.get('process_data'):
+    state_log.sync_store('process_data', {})  # Retire records from the old PID-keyed layout
+
+retention = RetentionManager()
+retention.track('processes', registry.records, lambda record: record.last_execution_time, ttl=PROCESS_TTL, max_entries=MAX_TRACKED_PROCESSES)
+retention.track('hourly_data', hourly_data, lambda entry: entry['time'], max_entries=MAX_HOURLY_ENTRIES)
+
+# Reads /proc directly on Linux; keeps per-process state for CPU and I/O deltas
+process_source = default_sampler()
+capture_writer = None
+if CAPTURE_FILE is not None:
+    capture_writer = CaptureWriter(CAPTURE_FILE)
+    process_source = RecordingSampler(process_source, capture_writer)
+CPU_COUNT = psutil.cpu_count() or 1
+# Energy and CO2 per process and application, integrated over the time
+# between samples from CPU-time deltas and kept across restarts. A
+# process's carbon footprint is its running total from here.
+energy = EnergyLedger(store.connect('process_rollups.db', check_same_thread=False), power_model, CPU_COUNT)
+retention.track_table(energy.conn, 'energy_processes', 'last_seen', ttl=ENERGY_ROW_TTL)
+
+def past_sightings():
+    # What the scanner remembers from before the usage index existed: saved
+    # process records (current and the old PID-keyed layout) and the
+    # applications in the energy ledger
+    for record in registry.records.values():
+        yield record.name, record.username, license_catalog.get(record.name), datetime.fromtimestamp(record.first_seen), record.last_execution_time
+    for info in saved_state.get('process_data', {}).values():
+        if isinstance(info.get('last_execution_time'), datetime):
+            yield info.get('name'), info.get('username'), license_catalog.get(info.get('name')), info['last_execution_time'], info['last_execution_time']
+    for name, last_seen in energy.conn.execute('SELECT name, last_seen FROM energy_apps'):
+        last_seen = datetime.strptime(last_seen, '%Y-%m-%d %H:%M:%S')
+        yield name, None, license_catalog.get(name), last_seen, last_seen
+
+# The index has no raw history to build itself from, so without this every
+# licensed application would look unused after an upgrade
+usage_index.backfill(past_sightings())
+
+def monitor_processes(refresh=None, lap=instrument.NULL_STAGES, source=None):
+    # refresh: process_iter attrs to re-read; the sampler reuses the rest.
+    # lap (instrument.stages()) times the sample, score, rank and usage stages.
+    # source: anything with process_iter(attrs, refresh), e.g.
+    # proc_reader.SyntheticSampler; defaults to process_source.
+    now = datetime.now()
+    registry.begin_sweep(now)
+    sweep = []
+    energy_sweep = []
+    for proc in (source or process_source).process_iter(['pid', 'ppid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username'], refresh=refresh):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
             mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
             num_threads = proc.info['num_threads']
-            cpu_percent = proc.info['cpu_percent'] / psutil.cpu_count()  # Average CPU usage across all cores
-            create_time = datetime.fromtimestamp(proc.info['create_time'])
+            cpu_percent = proc.info['cpu_percent'] / CPU_COUNT  # Average CPU usage across all cores
+            create_time = proc.info['create_time']
             username = proc.info.get('username', 'N/A')
+            io_delta = proc.info.get('io_delta', None)
+            io_bytes = io_delta.read_bytes + io_delta.write_bytes if io_delta else 0
 
-            # Calculate carbon footprint and license cost
-            carbon_footprint = get_carbon_footprint(name,cpu_percent, mem)
-            license_cost = get_license_cost(name)
-            sustainability_rating = calculate_sustainability_rating(name, mem, num_threads)
-
-            process_data[pid] = {
-                'name': name,
-                'memory_usage': mem,
-                'num_threads': num_threads,
-                'cpu_usage': cpu_percent,
-                'carbon_footprint': carbon_footprint,
-                'license_cost': license_cost,
-                'sustainability_rating': sustainability_rating,
-                'last_execution_time': current_time,
-                'create_time': create_time,
-                'username': username
-            }
+            # Carbon footprint, rating and license cost are computed for the whole sweep below
+            sweep.append((pid, create_time, name, username, mem, num_threads, cpu_percent, proc.info.get('ppid'), io_bytes))
+            energy_sweep.append((pid, create_time, name, proc.info.get('cpu_time'), proc.info['cpu_percent'], mem))
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
+    lap.mark('sample')
+
+    scores = scoring.score_sweep(
+        [proc[6] for proc in sweep],
+        [proc[4] for proc in sweep],
+        [proc[5] for proc in sweep],
+        power_model,
+    )
+    license_costs = license_catalog.get_many([proc[2] for proc in sweep])
+    accumulators = energy.update(now.timestamp(), energy_sweep)
+    lap.mark('score')
+    observed = []
+    tree_sweep = []
+    for (pid, create_time, name, username, mem, num_threads, cpu_percent, ppid, io_bytes), accumulator, sustainability_rating, license_cost in zip(sweep, accumulators, scores.rating.tolist(), license_costs):
+        carbon_footprint = accumulator.carbon_kg
+        record = registry.observe(pid, create_time, name, username, None, mem, num_threads, cpu_percent, carbon_footprint, license_cost, sustainability_rating)
+        observed.append(((pid, create_time), record))
+        tree_sweep.append((pid, create_time, ppid, record.name, record.username, license_cost, sustainability_rating, mem, num_threads, cpu_percent, io_bytes, carbon_footprint))
+    rankings.update(observed)
+    changed_apps = process_tree.update(tree_sweep)
+    app_rankings.update((key, process_tree.groups[key]) for key in changed_apps if key in process_tree.groups)
+    lap.mark('rank')
+    usage_index.record(now, [(proc[2], proc[3], license_cost) for proc, license_cost in zip(sweep, license_costs)])
+    lap.mark('usage_index')
+    sweep_totals.update(
+        cpu=sum(proc[6] for proc in sweep),
+        memory=sum(proc[4] for proc in sweep),
+        threads=sum(proc[5] for proc in sweep),
+        io=sum(proc[8] for proc in sweep),
+    )
 
 def load_license_cost_data(filename):
     with open(filename, 'r') as f:
         return json.load(f)
 
 def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
-    # Estimate power consumption
-    cpu_power_consumption = (avg_cpu_percent / 100) * CPU_POWER_CONSUMPTION_W
-    memory_power_consumption = (avg_memory_usage_mb / 1024) * MEMORY_POWER_CONSUMPTION_W_PER_GB
-    total_power_consumption_w = cpu_power_consumption + memory_power_consumption
-
-    # Convert power consumption to energy consumption (kWh)
-    # Assuming monitoring interval is 1 hour for simplicity
-    energy_consumption_kwh = total_power_consumption_w / 1000
-
-    # Convert energy consumption to carbon footprint
-    carbon_footprint_kg = energy_consumption_kwh * EMISSIONS_FACTOR_KG_CO2_PER_KWH
-    return carbon_footprint_kg
+    return scoring.carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, power_model)
 
 def get_license_cost(process_name):
-    # Load license cost data from JSON file
-    license_cost_data = load_license_cost_data(license_cost_data_file)
-    return license_cost_data.get(process_name, 0.0)
+    return license_catalog.get(process_name)
 
 def calculate_sustainability_rating(process_name, avg_memory_usage_mb, num_threads):
-    sustainability_score = 0
-    if avg_memory_usage_mb < 500:
-        sustainability_score += 1
-    if num_threads < 10:
-        sustainability_score += 1
-    return sustainability_score
-
-def update_ui():
-    monitor_processes()
-    tree.delete(*tree.get_children())
-
-    # Retrieve top 20 processes by average memory usage
-    top_processes = sorted(process_data.values(), key=lambda x: x['memory_usage'], reverse=True)[:20]
-    
-    for proc in top_processes:
-        tree.insert("", "end", values=(proc['name'], proc['memory_usage'], proc['num_threads'], proc['cpu_usage'], proc['carbon_footprint'], proc['license_cost'], proc['sustainability_rating'], proc['last_execution_time'], proc['username']))
-
-    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
-    avg_memory_usage = sum(proc['memory_usage'] for proc in top_processes) / len(top_processes)
-    avg_cpu_usage = sum(proc['cpu_usage'] for proc in top_processes) / len(top_processes)
-    total_carbon_footprint = sum(proc['carbon_footprint'] for proc in top_processes)
-
-    hourly_data[current_hour.hour] = {
-        'time' : datetime.now().replace(minute=0, second=0, microsecond=0),
-        'avg_memory_usage': avg_memory_usage,
-        'avg_cpu_usage': avg_cpu_usage,
-        'total_carbon_footprint': total_carbon_footprint
+    return scoring.sustainability_rating(avg_memory_usage_mb, num_threads)
+
+def app_rows(sweep_time):
+    # Rows for the tree mode: {sort key: application keys} and, for each of
+    # those applications, its (iid, parent iid, values) rows, parents first
+    app_tops = {key: [group.key for group in groups] for key, groups in app_rankings.tops().items()}
+    rows = {}
+    for group_key in {group_key for keys in app_tops.values() for group_key in keys}:
+        group = process_tree.groups[group_key]
+        group_iid = f'{group_key[0]}:{group_key[1]}:app'
+        group_rows = [(group_iid, '', (f'{group.name} ({len(group.members)} processes)', group.memory_usage, group.num_threads, group.cpu_usage, group.carbon_footprint,
+                                      group.license_cost, group.sustainability_rating, sweep_time, group.username))]
+        for node, parent_key in process_tree.hierarchy(group_key):
+            group_rows.append((f'{node.pid}:{node.started}', f'{parent_key[0]}:{parent_key[1]}' if parent_key is not None else group_iid,
+                               (node.name, node.memory_usage, node.num_threads, node.cpu_usage, node.carbon_footprint, node.license_cost, node.sustainability_rating, sweep_time, node.username)))
+        rows[group_key] = tuple(group_rows)
+    return app_tops, rows
+
+def collect():
+    # Runs on the collector thread at the scheduler's pace; the whole
+    # sweep's CPU time counts against the budget
+    metrics = scheduler.begin()
+    started = time.thread_time()
+    try:
+        return take_snapshot(attrs_for(metrics))
+    finally:
+        busy = sweep_totals['cpu'] / 100 if 'cpu' in sweep_totals else None
+        scheduler.end(metrics, time.thread_time() - started, sweep_totals, busy)
+
+def take_snapshot(refresh):
+    # Sweep, aggregate and persist, then hand an immutable snapshot to the UI
+    lap = instrument.stages()
+    monitor_processes(refresh, lap)
+    retention.step()
+    lap.mark('retention')
+
+    # Top 20 for every sort key; the UI picks one when a heading is clicked
+    tops = rankings.tops()
+    top_processes = tops['memory']
+
+    now = datetime.now()
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    avg_memory_usage = sum(proc.memory_usage for proc in top_processes) / len(top_processes)
+    avg_cpu_usage = sum(proc.cpu_usage for proc in top_processes) / len(top_processes)
+    # CO2 emitted by every process since the previous sweep, so the hourly
+    # buckets add up to what was actually emitted in the hour
+    rollups.add(now, avg_memory_usage, avg_cpu_usage, energy.sweep_carbon_kg)
+
+    # Keyed by the full hour so one day no longer overwrites the previous one
+    hour_avg_memory, _, hour_avg_cpu, _, hour_carbon = rollups.bucket(now, 'hour')
+    hourly_data[current_hour.strftime('%Y-%m-%d %H:%M:%S')] = {
+        'time' : current_hour,
+        'avg_memory_usage': hour_avg_memory,
+        'avg_cpu_usage': hour_avg_cpu,
+        'total_carbon_footprint': hour_carbon
     }
 
     sustainability_hourly_data[current_hour] = {
-        'avg_memory_usage': avg_memory_usage,
-        'avg_cpu_usage': avg_cpu_usage,
+        'avg_memory_usage': hour_avg_memory,
+        'avg_cpu_usage': hour_avg_cpu,
     }
+    lap.mark('rollups')
 
-    # Schedule asynchronous save to file
-    asyncio.run(process_save_to_file())
-    asyncio.run(hourdata_save_to_file())
+    save_state()
+    lap.mark('state')
 
-    root.after(5000, update_ui)  # Schedule update_ui() to run every 60 seconds
+    app_tops, apps = app_rows(now) if tree_mode else (None, None)
+    snapshot = make_snapshot(registry.records, top_processes, hourly_data, rankings=tops, app_rankings=app_tops, apps=apps)
+    lap.mark('snapshot')
+    return snapshot
+
+def update_ui():
+    global latest_snapshot
+    snapshot = collector.latest()
+    if snapshot is not None:
+        latest_snapshot = snapshot
+        show_ranking(sort_headings.current)
+
+    if chart_panel is not None:
+        chart_panel.tick()  # Appends only the newest buckets
+
+    root.after(UI_POLL_MS, update_ui)  # Poll for new snapshots; the scheduler paces the sweeps
+
+def show_ranking(sort_key):
+    if latest_snapshot is None:
+        return
+    if tree_mode:
+        if latest_snapshot.app_rankings is not None:
+            tree_rows.update(row for group_key in latest_snapshot.app_rankings[sort_key] for row in latest_snapshot.apps[group_key])
+        return
+    tree_view.update(
+        (f'{proc.pid}:{proc.started}', (proc.name, proc.memory_usage, proc.num_threads, proc.cpu_usage, proc.carbon_footprint, proc.license_cost, proc.sustainability_rating, proc.last_execution_time, proc.username))
+        for proc in latest_snapshot.rankings[sort_key]
+    )
 
 def refresh_data():
-    update_ui()
+    collector.request_sweep()
+
+def toggle_tree_mode():
+    # Flat top-20 processes, or top-20 applications that expand into their process trees
+    global tree_mode
+    tree_mode = not tree_mode
+    if tree_mode:
+        tree_view.suspend()
+        tree_rows.attach()
+    else:
+        tree_rows.detach()
+        tree_view.resume()
+    tree_button.config(text="Show Process List" if tree_mode else "Show Process Tree")
+    collector.request_sweep()
+    show_ranking(sort_headings.current)
+
+chart_panel = None  # Built on first use so startup doesn't import matplotlib
+diagnostics_window = None
+
+def show_diagnostics():
+    global diagnostics_window
+    from diagnostics import DiagnosticsWindow
+    if diagnostics_window is not None and diagnostics_window.exists():
+        diagnostics_window.lift()
+    else:
+        diagnostics_window = DiagnosticsWindow(root)
 
 def show_hourly_analytics():
-    hours = sorted(hourly_data.keys())
-    avg_memory_usage = [hourly_data[hour]['avg_memory_usage'] for hour in hours]
-    avg_cpu_usage = [hourly_data[hour]['avg_cpu_usage'] for hour in hours]
-    total_carbon_footprint = [hourly_data[hour]['total_carbon_footprint'] for hour in hours]
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(hours, total_carbon_footprint, marker='o', color='tab:green', label='Total Carbon Footprint (kg CO2)')
-    plt.xlabel('Time')
-    plt.ylabel('Total Carbon Footprint (kg CO2)')
-    plt.title('Hourly Carbon Footprint Analytics')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
-
-async def process_save_to_file():
-    async with aiofiles.open('process_data.json', 'w') as f:
-        await f.write(json.dumps(process_data, default=str, indent=4))
-
-async def hourdata_save_to_file():
-    async with aiofiles.open('hour_data_data.json', 'w') as f:
-        await f.write(json.dumps(hourly_data, default=str, indent=4))
+    global chart_panel
+    from charts import ChartPanel, TimeSeriesChart
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    # Embedded under the process list; reads rollups at screen resolution
+    chart_panel.toggle('hourly', lambda parent: TimeSeriesChart(parent, rollups, [
+        ('Total Carbon Footprint (kg CO2)', 5, 'tab:green', 'left'),
+    ], 'Hourly Carbon Footprint Analytics', ANALYTICS_WINDOW))
+
+def save_state():
+    state_log.sync_store('processes', registry.records)
+    state_log.sync_store('hourly_data', hourly_data)
 
 def show_sustainability_boxplot():
-    hours = sorted(sustainability_hourly_data.keys())
+    global chart_panel
+    from charts import BoxplotChart, ChartPanel
+    if latest_snapshot is None:
+        return
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    chart = chart_panel.toggle('sustainability', lambda parent: BoxplotChart(parent, 'Sustainability Ratings of Processes per Hour', 'Sustainability Ratings'))
+    if chart is None:
+        return
+
+    # One pass over the processes, bucketed by the hour they last ran
+    hours = {entry['time'] for entry in latest_snapshot.hourly.values()}
     ratings = {hour: [] for hour in hours}
-
-    for proc in process_data.values():
-        for hour in ratings:
-            if proc['last_execution_time'] >= hour and proc['last_execution_time'] < hour + timedelta(hours=1):
-                ratings[hour].append(proc['sustainability_rating'])
-
-    boxplot_data = [ratings[hour] for hour in hours]
-
-    plt.figure(figsize=(10, 6))
-    plt.boxplot(boxplot_data, labels=hours, vert=True, patch_artist=True)
-    plt.xlabel('Time')
-    plt.ylabel('Sustainability Ratings')
-    plt.title('Sustainability Ratings of Processes per Hour')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
-
-def check_unused_license_cost():
-    cutoff_date = datetime.now() - timedelta(days=60)
-    unused_license_cost_processes = [proc for proc in process_data.values() if proc['last_execution_time'] <= cutoff_date and proc['license_cost'] > 0]
+    for proc in latest_snapshot.processes.values():
+        hour = proc.last_execution_time.replace(minute=0, second=0, microsecond=0)
+        if hour in ratings:
+            ratings[hour].append(proc.sustainability_rating)
+    chart.draw(ratings)
+
+def check_unused_license_cost(days=UNUSED_LICENSE_DAYS):
+    # Licensed executables whose last sighting, here or in the system's own records, is older than `days`
+    unused_license_cost_processes = unused_licenses(last_run, license_catalog, usage_index, days)
+    # Name the sources that couldn't be read, so a short list isn't taken as complete
+    note = "\n\nNot included: " + "; ".join(f"{source} ({error})" for source, error in last_run.errors.items()) if last_run.errors else ""
 
     if unused_license_cost_processes:
-        message = "Processes not run in the last 60 days and incurring license costs:\n\n"
-        for proc in unused_license_cost_processes:
-            message += f"{proc['name']} - License Cost: ${proc['license_cost']}\n"
-        messagebox.showinfo("Unused License Cost Processes", message)
+        message = f"Processes not run in the last {days} days and incurring license costs:\n\n"
+        for name, license_cost, first_seen, last_seen, runtime_s, users in unused_license_cost_processes:
+            if last_seen is None:
+                message += f"{name} - License Cost: ${license_cost} - Never seen\n"
+            else:
+                message += f"{name} - License Cost: ${license_cost} - Last seen {last_seen}" + (f", {users} user(s)\n" if users is not None else " (system records)\n")
+        messagebox.showinfo("Unused License Cost Processes", message + note)
     else:
-        messagebox.showinfo("Unused License Cost Processes", "No processes found not run in the last 60 days and incurring license costs.")
+        messagebox.showinfo("Unused License Cost Processes", f"No processes found not run in the last {days} days and incurring license costs.{note}")
 
 def kill_process():
     selected_item = tree.selection()
     if selected_item:
-        item = tree.item(selected_item)
-        pid = item['values'][-1]  # Assuming the last value is the PID in your Treeview setup
+        # Rows are keyed "pid:create_time" ("pid:create_time:app" for an application's
+        # root); check the start time so a reused PID isn't killed
+        pid, started = selected_item[0].split(':')[:2]
+        pid = int(pid)
 
         try:
-            process = psutil.Process(int(pid))
+            process = psutil.Process(pid)
+            if process.create_time() != float(started):
+                raise psutil.NoSuchProcess(pid)
             process.terminate()
             messagebox.showinfo("Process Terminated", f"Process with PID {pid} has been terminated successfully.")
         except psutil.NoSuchProcess:
@@ -195,14 +391,33 @@ def kill_process():
     else:
         messagebox.showwarning("No Process Selected", "Please select a process from the list.")
 
+# Snapshot fields offered by the export dialog, with headings and SQLite-style types for Parquet
+EXPORT_COLUMNS = {
+    'name': ("Process Name", 'TEXT'),
+    'memory_usage': ("Memory Usage (MB)", 'REAL'),
+    'num_threads': ("Thread Count", 'INTEGER'),
+    'cpu_usage': ("CPU Usage (%)", 'REAL'),
+    'carbon_footprint': ("Carbon Footprint (kg CO2)", 'REAL'),
+    'license_cost': ("License Cost ($)", 'REAL'),
+    'sustainability_rating': ("Sustainability Rating", 'INTEGER'),
+    'last_execution_time': ("Last Execution Time", 'TEXT'),
+    'create_time': ("Creation Time", 'TEXT'),
+    'username': ("Username", 'TEXT'),
+}
+
 def export_to_excel():
-    df = pd.DataFrame.from_dict(process_data, orient='index')
-    df = df.reset_index().drop(columns=['index'])
-    excel_filename = 'process_data.xlsx'
-    writer = pd.ExcelWriter(excel_filename, engine='xlsxwriter')
-    df.to_excel(writer, sheet_name='Process Data', index=False)
-    writer.save()
-    messagebox.showinfo("Export to Excel", f"Process data exported successfully to {excel_filename}.")
+    if latest_snapshot is None:
+        return
+    snapshot = latest_snapshot
+
+    def start_job(path, columns, start, end):
+        rows = [tuple(value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value for value in (getattr(proc, column) for column in columns))
+                for proc in snapshot.processes.values()]
+        job = RowsExportJob(path, [EXPORT_COLUMNS[column][0] for column in columns], rows, [EXPORT_COLUMNS[column][1] for column in columns])
+        job.start()
+        return job
+
+    ExportDialog(root, [(column, heading) for column, (heading, _) in EXPORT_COLUMNS.items()], start_job, time_range=False)
 
 # Create the main window
 root = tk.Tk()
@@ -210,16 +425,38 @@ root.title("Process Monitor")
 
 # Create and pack the Treeview widget
 columns = ("Process Name", "Memory Usage (MB)", "Thread Count", "CPU Usage (%)", "Carbon Footprint (kg CO2)", "License Cost ($)", "Sustainability Rating", "Last Execution Time", "Username")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+tree_rows = TreeRows(tree, scrollbar)
+tree.column('#0', width=40, stretch=False)  # Just the expand arrows in tree mode
+
 for col in columns:
     tree.heading(col, text=col)
 
+# Clicking a numeric heading shows that key's ranking from the latest snapshot
+sort_headings = SortHeadings(tree, {
+    "Memory Usage (MB)": 'memory',
+    "Thread Count": 'threads',
+    "CPU Usage (%)": 'cpu',
+    "Carbon Footprint (kg CO2)": 'carbon',
+    "License Cost ($)": 'license_cost',
+}, show_ranking, 'memory')
+
 # Create and pack the Refresh button
 refresh_button = tk.Button(root, text="Refresh", command=refresh_data)
 refresh_button.pack(pady=10)
 
+# Create and pack the process tree toggle
+tree_button = tk.Button(root, text="Show Process Tree", command=toggle_tree_mode)
+tree_button.pack(pady=10)
+
 # Create and pack the Show Analytics button
 analytics_button = tk.Button(root, text="Show Hourly Analytics", command=show_hourly_analytics)
 analytics_button.pack(pady=10)
@@ -240,7 +477,27 @@ kill_process_button.pack(pady=10)
 export_excel_button = tk.Button(root, text="Export to Excel", command=export_to_excel)
 export_excel_button.pack(pady=10)
 
-# Initial UI update
+# Create and pack the Diagnostics button
+diagnostics_button = tk.Button(root, text="Diagnostics", command=show_diagnostics)
+diagnostics_button.pack(pady=10)
+
+def on_closing():
+    collector.stop()
+    collector.join(timeout=5)
+    state_log.close()
+    energy.close()
+    if capture_writer is not None:
+        capture_writer.close()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_closing)
+
+if METRICS_PORT is not None:
+    instrument.serve(METRICS_PORT)
+
+# Start collecting in the background, then poll for snapshots
+collector = Collector(collect, delay=scheduler.delay)
+collector.start()
 update_ui()
 
 # Start the Tkinter main loop
@@ -1,27 +1,32 @@
 import psutil
-import pandas as pd
 import json
 from datetime import datetime, timedelta
-import sqlite3
+import store
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
+from license_catalog import LicenseCatalog
+from tree_view import VirtualTree
+import scoring
+from rollups import Rollups
+from retention import RetentionManager
+from proc_reader import default_sampler
+from scheduler import SamplingScheduler, TkLoop, HISTORY_TIERS, attrs_for
 
 # Load datasets
 #carbon_footprint_data = pd.read_csv('carbon_footprint_data.csv')
-with open('license_cost_data.json') as f:
-    license_cost_data = json.load(f)
+license_catalog = LicenseCatalog('license_cost_data.json')
 
 # Convert to dictionary for faster lookups
 #carbon_footprint_dict = dict(zip(carbon_footprint_data['process_name'], carbon_footprint_data['carbon_footprint_per_mb']))
 
-# Placeholder constants for power consumption and emissions factor
-CPU_POWER_CONSUMPTION_W = 50  # Watts
-MEMORY_POWER_CONSUMPTION_W_PER_GB = 5  # Watts per GB
-EMISSIONS_FACTOR_KG_CO2_PER_KWH = 0.475  # Average emissions factor
+# Power consumption and emissions factor for this host (see power_model.json)
+power_model = scoring.load_power_model()
+CPU_POWER_CONSUMPTION_W = power_model.cpu_power_w  # Watts
+MEMORY_POWER_CONSUMPTION_W_PER_GB = power_model.memory_power_w_per_gb  # Watts per GB
+EMISSIONS_FACTOR_KG_CO2_PER_KWH = power_model.emissions_factor_kg_co2_per_kwh  # Average emissions factor
 
 # Initialize the SQLite database
-conn = sqlite3.connect('process_monitor.db')
+conn = store.connect()
 c = conn.cursor()
 
 # Create tables
@@ -35,9 +40,12 @@ c.execute('''
         carbon_footprint REAL,
         license_cost REAL,
         create_time TEXT,
-        username TEXT
+        username TEXT,
+        sample_time TEXT
     )
 ''')
+# Rows written before sample_time existed keep NULL and age out by row count only
+store.add_column_if_missing(conn, 'processes', 'sample_time', 'TEXT')
 
 c.execute('''
     CREATE TABLE IF NOT EXISTS hourly_data (
@@ -50,9 +58,39 @@ c.execute('''
 
 conn.commit()
 
-def monitor_processes():
+# Sweep-level time series at raw/minute/hour/day resolution
+rollups = Rollups(conn)
+ANALYTICS_WINDOW = timedelta(days=7)
+
+# Raw process rows are trimmed oldest-first in small chunks so writers never stall
+PROCESS_ROW_TTL = timedelta(days=90)
+MAX_PROCESS_ROWS = 5_000_000
+retention = RetentionManager()
+retention.track_table(conn, 'processes', 'sample_time', ttl=PROCESS_ROW_TTL, max_rows=MAX_PROCESS_ROWS)
+
+# Each sweep is buffered and written in one executemany() transaction
+process_writer = store.BatchWriter(conn, 'processes', ('pid', 'name', 'memory_usage', 'num_threads', 'carbon_footprint', 'license_cost', 'create_time', 'username', 'sample_time'))
+
+# Reads /proc directly on Linux and can skip the reads of metrics that aren't due
+process_source = default_sampler()
+CPU_COUNT = psutil.cpu_count() or 1
+
+# Sample on the history tiers, stretched while quiet, within 1% of a core.
+# A sweep is written at most once a minute, with the carbon scores of the
+# CPU samples in between averaged into it.
+scheduler = SamplingScheduler(HISTORY_TIERS)
+sweep_window = store.SweepWindow(key=(0, 6), average=(4,))
+
+def monitor_processes(refresh=None, source=None):
+    # refresh: process_iter attrs to re-read; the sampler reuses the rest.
+    # source: anything with process_iter(attrs, refresh), e.g.
+    # proc_reader.SyntheticSampler; defaults to process_source.
+    # Returns per-metric totals for the scheduler.
     current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'num_threads', 'create_time', 'username']):
+    sample_time = current_time.strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    cpu_total = 0.0
+    for proc in (source or process_source).process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'num_threads', 'create_time', 'username'], refresh=refresh):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
@@ -65,37 +103,30 @@ def monitor_processes():
             carbon_footprint = get_carbon_footprint(name,cpu_percent, mem)
             license_cost = get_license_cost(name)
 
-            c.execute('''
-                INSERT INTO processes (pid, name, memory_usage, num_threads, carbon_footprint, license_cost, create_time, username)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (pid, name, mem, num_threads, carbon_footprint, license_cost, create_time, username))
-            conn.commit()
+            rows.append((pid, name, mem, num_threads, carbon_footprint, license_cost, create_time, username, sample_time))
+            cpu_total += cpu_percent
 
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
 
-def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
-    # Estimate power consumption
-    cpu_power_consumption = (avg_cpu_percent / 100) * CPU_POWER_CONSUMPTION_W
-    memory_power_consumption = (avg_memory_usage_mb / 1024) * MEMORY_POWER_CONSUMPTION_W_PER_GB
-    total_power_consumption_w = cpu_power_consumption + memory_power_consumption
-
-    # Convert power consumption to energy consumption (kWh)
-    # Assuming monitoring interval is 1 hour for simplicity
-    energy_consumption_kwh = total_power_consumption_w / 1000
+    process_writer.extend(sweep_window.add(rows, current_time.timestamp()))
+    return {
+        'cpu': cpu_total,
+        'memory': sum(row[2] for row in rows),
+        'threads': sum(row[3] for row in rows),
+    }
 
-    # Convert energy consumption to carbon footprint
-    carbon_footprint_kg = energy_consumption_kwh * EMISSIONS_FACTOR_KG_CO2_PER_KWH
-    return carbon_footprint_kg
+def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
+    return scoring.carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, power_model)
 
 def get_license_cost(process_name):
-    return license_cost_data.get(process_name, 0.0)
-
-def update_ui():
-    monitor_processes()
-    for row in tree.get_children():
-        tree.delete(row)
+    return license_catalog.get(process_name)
 
+def update_ui(metrics):
+    # One sweep of the due metrics, run by ui_loop
+    totals = monitor_processes(attrs_for(metrics))
+    process_writer.flush()
+    retention.step()
     # Retrieve top 20 processes by average memory usage
     c.execute('''
         SELECT name, memory_usage, num_threads, carbon_footprint, license_cost, create_time, username
@@ -106,42 +137,32 @@ def update_ui():
     ''')
     top_processes = c.fetchall()
     
-    for row in top_processes:
-        tree.insert("", "end", values=row)
+    tree_view.update((row[0], row) for row in top_processes)
 
-    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
     avg_memory_usage = sum(row[1] for row in top_processes) / len(top_processes)
+    total_carbon_footprint = sum(row[3] for row in top_processes)
+    rollups.add(datetime.now(), avg_memory_usage, None, total_carbon_footprint)
 
-    c.execute('''
-        INSERT INTO hourly_data (hour, avg_memory_usage)
-        VALUES (?, ?)
-    ''', (current_hour, avg_memory_usage))
-    conn.commit()
+    if chart_panel is not None:
+        chart_panel.tick()  # Appends only the newest buckets
 
-    root.after(60000, update_ui)
+    return totals
 
 def refresh_data():
     # Manually refresh data when the button is pressed
-    update_ui()
+    ui_loop.run_now()
+
+chart_panel = None  # Built on first use so startup doesn't import matplotlib
 
 def show_hourly_analytics():
-    # Retrieve hourly data
-    c.execute('SELECT hour, avg_memory_usage FROM hourly_data ORDER BY hour')
-    data = c.fetchall()
-
-    hours = [row[0] for row in data]
-    avg_memory_usage = [row[1] for row in data]
-
-    # Plot the data
-    plt.figure(figsize=(10, 6))
-    plt.plot(hours, avg_memory_usage, marker='o')
-    plt.xlabel('Time')
-    plt.ylabel('Average Memory Usage (MB)')
-    plt.title('Hourly Analytics - Average Memory Usage')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+    global chart_panel
+    from charts import ChartPanel, TimeSeriesChart
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    # Embedded under the process list; reads rollups at screen resolution
+    chart_panel.toggle('hourly', lambda parent: TimeSeriesChart(parent, rollups, [
+        ('Average Memory Usage (MB)', 1, 'tab:blue', 'left'),
+    ], 'Hourly Analytics - Average Memory Usage', ANALYTICS_WINDOW))
 
 # Create the main window
 root = tk.Tk()
@@ -153,9 +174,16 @@ style.configure('Treeview', font=('Arial', 12))  # Adjust font and size as neede
 
 # Create and pack the Treeview widget
 columns = ("Process Name", "Memory Usage (MB)", "Thread Count", "Carbon Footprint (kg CO2)", "License Cost ($)", "Creation Time", "Username")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+
 for col in columns:
     tree.heading(col, text=col)
 
@@ -167,15 +195,17 @@ refresh_button.pack(pady=10)
 analytics_button = tk.Button(root, text="Show Hourly Analytics", command=show_hourly_analytics)
 analytics_button.pack(pady=10)
 
-# Initial UI update
-update_ui()
-
-# Start the Tkinter main loop
-root.mainloop()
+# Sweep now, then whenever the scheduler says a metric is due
+ui_loop = TkLoop(root, scheduler, update_ui, busy=lambda totals: totals['cpu'] / 100 / CPU_COUNT)
+ui_loop.run()
 
 # Close the database connection when the application closes
 def on_closing():
+    process_writer.flush()
     conn.close()
     root.destroy()
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
+
+# Start the Tkinter main loop
+root.mainloop()
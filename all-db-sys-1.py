@@ -1,43 +1,40 @@
 import psutil
-import pandas as pd
 import json
 from datetime import datetime, timedelta
-import sqlite3
+import store
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-import xlsxwriter
+from license_catalog import LicenseCatalog
+from tree_view import VirtualTree, SortHeadings
+from exporter import TableExportJob, PROCESS_HEADINGS
+from export_dialog import ExportDialog
+import scoring
+from rollups import Rollups
+from proc_reader import default_sampler
+from scheduler import SamplingScheduler, TkLoop, HISTORY_TIERS, attrs_for
+from retention import RetentionManager
+from usage_index import UsageIndex
+from energy import EnergyLedger
+from last_execution import LastExecutionResolver, default_providers, unused_licenses
 
 # Placeholder data (replace with actual data or functions)
 
 
 license_cost_data_file = 'license_cost_data.json'
+license_catalog = LicenseCatalog(license_cost_data_file)
 
-# Placeholder constants for power consumption and emissions factor
-CPU_POWER_CONSUMPTION_W = 50  # Watts
-MEMORY_POWER_CONSUMPTION_W_PER_GB = 5  # Watts per GB
-EMISSIONS_FACTOR_KG_CO2_PER_KWH = 0.475  # Average emissions factor
+# Power consumption and emissions factor for this host (see power_model.json)
+power_model = scoring.load_power_model()
+CPU_POWER_CONSUMPTION_W = power_model.cpu_power_w  # Watts
+MEMORY_POWER_CONSUMPTION_W_PER_GB = power_model.memory_power_w_per_gb  # Watts per GB
+EMISSIONS_FACTOR_KG_CO2_PER_KWH = power_model.emissions_factor_kg_co2_per_kwh  # Average emissions factor
 
 # Initialize the SQLite database
-conn = sqlite3.connect('process_monitor.db')
+conn = store.connect()
 c = conn.cursor()
 
 # Create tables
-c.execute('''
-    CREATE TABLE IF NOT EXISTS processes (
-        id INTEGER PRIMARY KEY,
-        pid INTEGER,
-        name TEXT,
-        memory_usage REAL,
-        num_threads INTEGER,
-        cpu_usage REAL,
-        carbon_footprint REAL,
-        license_cost REAL,
-        sustainability_rating INTEGER,
-        create_time TEXT,
-        username TEXT
-    )
-''')
+store.create_process_table(conn)
 
 c.execute('''
     CREATE TABLE IF NOT EXISTS hourly_data (
@@ -51,142 +48,169 @@ c.execute('''
 
 conn.commit()
 
+# Sweep-level time series at raw/minute/hour/day resolution
+rollups = Rollups(conn)
+ANALYTICS_WINDOW = timedelta(days=7)
+
+# Raw process rows are trimmed oldest-first in small chunks so writers never stall
+PROCESS_ROW_TTL = timedelta(days=90)
+MAX_PROCESS_ROWS = 5_000_000
+retention = RetentionManager()
+retention.track_table(conn, 'processes', 'sample_time', ttl=PROCESS_ROW_TTL, max_rows=MAX_PROCESS_ROWS)
+
+# Each sweep is buffered and written in one executemany() transaction, which
+# also folds it into the per-application aggregates and the per-executable
+# usage index
+process_columns = store.ENERGY_PROCESS_COLUMNS
+app_stats = store.AppStats(conn, process_columns)
+usage_index = UsageIndex(conn, process_columns, history_table='processes')
+
+def fold_sweep(conn, rows):
+    app_stats.update(conn, rows)
+    return usage_index.update(conn, rows)
+
+process_writer = store.BatchWriter(conn, 'processes', process_columns, on_flush=fold_sweep)
+UNUSED_LICENSE_DAYS = 60  # Licensed executables idle this long are reported
+# Other records of when programs last ran (process accounting, WMI), cached for ten minutes
+last_run = LastExecutionResolver(default_providers(usage_index))
+
 def load_license_cost_data(filename):
     with open(filename, 'r') as f:
         return json.load(f)
 
-def monitor_processes():
+# Reads /proc directly on Linux; keeps per-process state for CPU and I/O deltas
+process_source = default_sampler()
+CPU_COUNT = psutil.cpu_count() or 1
+# Energy and CO2 per process and application, integrated over the time
+# between samples and kept across restarts. Each row's carbon_kg is what the
+# process emitted since its previous sample, so sums are totals; its carbon
+# footprint stays the per-sample score.
+energy = EnergyLedger(conn, power_model, CPU_COUNT)
+retention.track_table(conn, 'energy_processes', 'last_seen', ttl=PROCESS_ROW_TTL)
+
+# Sample on the history tiers, stretched while quiet, within 1% of a core.
+# A sweep is written at most once a minute; the CPU samples and scores in
+# between are averaged and the carbon emitted summed into it.
+scheduler = SamplingScheduler(HISTORY_TIERS)
+sweep_window = store.SweepWindow(key=(0, 8), average=(4, 5), total=(11,))
+
+def monitor_processes(refresh=None, source=None):
+    # refresh: process_iter attrs to re-read; the sampler reuses the rest.
+    # source: anything with process_iter(attrs, refresh), e.g.
+    # proc_reader.SyntheticSampler; defaults to process_source.
+    # Returns per-metric totals for the scheduler.
     current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username']):
+    sample_time = current_time.strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    energy_sweep = []
+    for proc in (source or process_source).process_iter(['pid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username'], refresh=refresh):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
             mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
             num_threads = proc.info['num_threads']
-            cpu_percent = proc.info['cpu_percent'] / psutil.cpu_count()  # Average CPU usage across all cores
+            cpu_percent = proc.info['cpu_percent'] / CPU_COUNT  # Average CPU usage across all cores
             create_time = datetime.fromtimestamp(proc.info['create_time'])
             username = proc.info.get('username', 'N/A')
             
-            carbon_footprint = get_carbon_footprint(name,cpu_percent,mem)
-            license_cost = get_license_cost(name)
-            sustainability_rating = calculate_sustainability_rating(name, mem, num_threads)
-
-            c.execute('''
-                INSERT INTO processes (pid, name, memory_usage, num_threads, cpu_usage, carbon_footprint, license_cost, sustainability_rating, create_time, username)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (pid, name, mem, num_threads, cpu_percent, carbon_footprint, license_cost, sustainability_rating, create_time, username))
-            conn.commit()
+            # Carbon, rating and license cost are filled in for the whole sweep below
+            rows.append([pid, name, mem, num_threads, cpu_percent, 0.0, 0.0, 0, create_time, username, sample_time, 0.0])
+            energy_sweep.append((pid, proc.info['create_time'], name, proc.info.get('cpu_time'), proc.info['cpu_percent'], mem))
 
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
 
-def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
-    # Estimate power consumption
-    cpu_power_consumption = (avg_cpu_percent / 100) * CPU_POWER_CONSUMPTION_W
-    memory_power_consumption = (avg_memory_usage_mb / 1024) * MEMORY_POWER_CONSUMPTION_W_PER_GB
-    total_power_consumption_w = cpu_power_consumption + memory_power_consumption
-
-    # Convert power consumption to energy consumption (kWh)
-    # Assuming monitoring interval is 1 hour for simplicity
-    energy_consumption_kwh = total_power_consumption_w / 1000
+    # Score and price the whole sweep in one call each
+    scores = scoring.score_sweep([row[4] for row in rows], [row[2] for row in rows], [row[3] for row in rows], power_model)
+    license_costs = license_catalog.get_many([row[1] for row in rows])
+    accumulators = energy.update(current_time.timestamp(), energy_sweep)
+    for row, accumulator, carbon_footprint, sustainability_rating, license_cost in zip(rows, accumulators, scores.carbon_kg.tolist(), scores.rating.tolist(), license_costs):
+        row[5] = carbon_footprint
+        row[6] = license_cost
+        row[7] = sustainability_rating
+        row[11] = accumulator.interval_carbon_kg
+
+    process_writer.extend(sweep_window.add(rows, current_time.timestamp()))
+    return {
+        'cpu': sum(row[4] for row in rows),
+        'memory': sum(row[2] for row in rows),
+        'threads': sum(row[3] for row in rows),
+    }
 
-    # Convert energy consumption to carbon footprint
-    carbon_footprint_kg = energy_consumption_kwh * EMISSIONS_FACTOR_KG_CO2_PER_KWH
-    return carbon_footprint_kg
+def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
+    return scoring.carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, power_model)
 
 def get_license_cost(process_name):
-    # Load license cost data from JSON file
-    license_cost_data = load_license_cost_data(license_cost_data_file)
-    return license_cost_data.get(process_name, 0.0)
+    return license_catalog.get(process_name)
 
 def calculate_sustainability_rating(process_name, avg_memory_usage_mb, num_threads):
-    # Example sustainability rating calculation based on memory usage and thread count
-    sustainability_score = 0
-    if avg_memory_usage_mb < 500:
-        sustainability_score += 1
-    if num_threads < 10:
-        sustainability_score += 1
-    
-    return sustainability_score
-
-def update_ui():
-    monitor_processes()
-    for row in tree.get_children():
-        tree.delete(row)
+    return scoring.sustainability_rating(avg_memory_usage_mb, num_threads)
+
+def update_ui(metrics):
+    # One sweep of the due metrics, run by ui_loop
+    totals = monitor_processes(attrs_for(metrics))
+    process_writer.flush()
+    retention.step()
 
     # Retrieve top 20 processes by average memory usage
-    c.execute('''
-        SELECT name, memory_usage, num_threads, cpu_usage, carbon_footprint, license_cost, sustainability_rating, create_time, username
-        FROM processes
-        GROUP BY name
-        ORDER BY AVG(memory_usage) DESC
-        LIMIT 20
-    ''')
-    top_processes = c.fetchall()
-    
-    for row in top_processes:
-        tree.insert("", "end", values=row)
-
-    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
+    top_processes = app_stats.top_by_memory(20)
+
+    if sort_headings.current == 'memory':
+        tree_view.update((row[0], row) for row in top_processes)
+    else:
+        show_ranking(sort_headings.current)
+
     avg_memory_usage = sum(row[1] for row in top_processes) / len(top_processes)
     avg_cpu_usage = sum(row[3] for row in top_processes) / len(top_processes)  # Average CPU usage across all processes
+    # CO2 every process emitted since the previous sweep, not just the top 20
+    rollups.add(datetime.now(), avg_memory_usage, avg_cpu_usage, energy.sweep_carbon_kg)
 
-    c.execute('''
-        INSERT INTO hourly_data (hour, avg_memory_usage, avg_cpu_usage)
-        VALUES (?, ?, ?)
-    ''', (current_hour, avg_memory_usage, avg_cpu_usage))
-    conn.commit()
+    if chart_panel is not None:
+        chart_panel.tick()  # Appends only the newest buckets
 
-    root.after(60000, update_ui)
+    return totals
+
+def show_ranking(sort_key):
+    # An indexed read of app_stats for the clicked heading's key
+    tree_view.update((row[0], row) for row in app_stats.top(sort_key, 20))
 
 def refresh_data():
     # Manually refresh data when the button is pressed
-    update_ui()
-
-def check_unused_license_cost():
-    # Check for processes not run in the last 60 days and incurring license costs
-    cutoff_date = datetime.now() - timedelta(days=60)
-    c.execute('''
-        SELECT name, license_cost
-        FROM processes
-        WHERE create_time <= ?
-        AND license_cost > 0
-    ''', (cutoff_date,))
-    unused_license_cost_processes = c.fetchall()
+    ui_loop.run_now()
+
+def check_unused_license_cost(days=UNUSED_LICENSE_DAYS):
+    # Licensed executables whose last sighting, here or in the system's own records, is older than `days`
+    unused_license_cost_processes = unused_licenses(last_run, license_catalog, usage_index, days)
+    # Name the sources that couldn't be read, so a short list isn't taken as complete
+    note = "\n\nNot included: " + "; ".join(f"{source} ({error})" for source, error in last_run.errors.items()) if last_run.errors else ""
 
     if unused_license_cost_processes:
         # Create a message with process names and license costs
-        message = "Processes not run in the last 60 days and incurring license costs:\n\n"
-        for process in unused_license_cost_processes:
-            message += f"{process[0]} - License Cost: ${process[1]}\n"
+        message = f"Processes not run in the last {days} days and incurring license costs:\n\n"
+        for name, license_cost, first_seen, last_seen, runtime_s, users in unused_license_cost_processes:
+            if last_seen is None:
+                message += f"{name} - License Cost: ${license_cost} - Never seen\n"
+            else:
+                message += f"{name} - License Cost: ${license_cost} - Last seen {last_seen}" + (f", {users} user(s)\n" if users is not None else " (system records)\n")
 
         # Show popup message box with the results
-        messagebox.showinfo("Unused License Cost Processes", message)
+        messagebox.showinfo("Unused License Cost Processes", message + note)
     else:
-        messagebox.showinfo("Unused License Cost Processes", "No processes found not run in the last 60 days and incurring license costs.")
+        messagebox.showinfo("Unused License Cost Processes", f"No processes found not run in the last {days} days and incurring license costs.{note}")
 
 
+chart_panel = None  # Built on first use so startup doesn't import matplotlib
+
 def show_hourly_analytics():
-    # Retrieve hourly data
-    c.execute('SELECT hour, avg_memory_usage, avg_cpu_usage FROM hourly_data ORDER BY hour')
-    data = c.fetchall()
-
-    hours = [row[0] for row in data]
-    avg_memory_usage = [row[1] for row in data]
-    avg_cpu_usage = [row[2] for row in data]
-
-    # Plot the data
-    plt.figure(figsize=(10, 6))
-    plt.plot(hours, avg_memory_usage, marker='o', label='Average Memory Usage (MB)')
-    plt.plot(hours, avg_cpu_usage, marker='o', label='Average CPU Usage (%)')
-    plt.xlabel('Time')
-    plt.ylabel('Usage')
-    plt.title('Hourly Analytics - Memory and CPU Usage')
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+    global chart_panel
+    from charts import ChartPanel, TimeSeriesChart
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    # Embedded under the process list; reads rollups at screen resolution
+    chart_panel.toggle('hourly', lambda parent: TimeSeriesChart(parent, rollups, [
+        ('Average Memory Usage (MB)', 1, 'tab:blue', 'left'),
+        ('Average CPU Usage (%)', 3, 'tab:orange', 'right'),
+    ], 'Hourly Analytics - Memory and CPU Usage', ANALYTICS_WINDOW))
 
 def kill_process():
     # Get the selected process from the Treeview
@@ -205,28 +229,17 @@ def kill_process():
         messagebox.showwarning("No Process Selected", "Please select a process from the list.")
 
 def export_to_excel():
-    # Retrieve all process data
-    c.execute('''
-        SELECT name, memory_usage, num_threads, cpu_usage, carbon_footprint, license_cost, sustainability_rating, create_time, username
-        FROM processes
-        ORDER BY create_time DESC
-    ''')
-    data = c.fetchall()
-
-    # Create a Pandas DataFrame from the retrieved data
-    df = pd.DataFrame(data, columns=["Process Name", "Memory Usage (MB)", "Thread Count", "CPU Usage (%)", "Carbon Footprint (kg CO2)", "License Cost ($)", "Sustainability Rating", "Creation Time", "Username"])
-
-    # Create a Pandas Excel writer using XlsxWriter as the engine
-    excel_filename = 'process_data.xlsx'
-    writer = pd.ExcelWriter(excel_filename, engine='xlsxwriter')
-
-    # Convert the dataframe to an XlsxWriter Excel object
-    df.to_excel(writer, sheet_name='Process Data', index=False)
-
-    # Close the Pandas Excel writer and output the Excel file
-    writer.save()
-
-    messagebox.showinfo("Export to Excel", f"Process data exported successfully to {excel_filename}.")
+    # Streams the processes table from disk in a background job
+    def start_job(path, columns, start, end):
+        for bound in (start, end):
+            if bound is not None:
+                datetime.strptime(bound, '%Y-%m-%d %H:%M:%S')  # ValueError is shown by the dialog
+        process_writer.flush()
+        job = TableExportJob(store.DB_FILE, path, columns=columns, start=start, end=end)
+        job.start()
+        return job
+
+    ExportDialog(root, [(column, heading) for column, heading in PROCESS_HEADINGS.items() if column != 'pid'], start_job)
 
 # Create the main window
 root = tk.Tk()
@@ -238,12 +251,28 @@ style.configure('Treeview', font=('Arial', 12))  # Adjust font and size as neede
 
 # Create and pack the Treeview widget
 columns = ("Process Name", "Memory Usage (MB)", "Thread Count", "CPU Usage (%)", "Carbon Footprint (kg CO2)", "License Cost ($)", "Sustainability Rating", "Creation Time", "Username")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+
 for col in columns:
     tree.heading(col, text=col)
 
+# Clicking a numeric heading re-ranks by that column
+sort_headings = SortHeadings(tree, {
+    "Memory Usage (MB)": 'memory',
+    "Thread Count": 'threads',
+    "CPU Usage (%)": 'cpu',
+    "Carbon Footprint (kg CO2)": 'carbon',
+    "License Cost ($)": 'license_cost',
+}, show_ranking, 'memory')
+
 # Create and pack the Refresh button
 refresh_button = tk.Button(root, text="Refresh", command=refresh_data)
 refresh_button.pack(pady=10)
@@ -264,15 +293,18 @@ kill_process_button.pack(pady=10)
 export_excel_button = tk.Button(root, text="Export to Excel", command=export_to_excel)
 export_excel_button.pack(pady=10)
 
-# Initial UI update
-update_ui()
-
-# Start the Tkinter main loop
-root.mainloop()
+# Sweep now, then whenever the scheduler says a metric is due
+ui_loop = TkLoop(root, scheduler, update_ui, busy=lambda totals: totals['cpu'] / 100)
+ui_loop.run()
 
 # Close the database connection when the application closes
 def on_closing():
+    process_writer.flush()
+    energy.close()
     conn.close()
     root.destroy()
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
+
+# Start the Tkinter main loop
+root.mainloop()
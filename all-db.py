@@ -1,27 +1,32 @@
 import psutil
-import pandas as pd
 import json
 from datetime import datetime, timedelta
-import sqlite3
+import store
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
+from license_catalog import LicenseCatalog
+from tree_view import VirtualTree
+import scoring
+from rollups import Rollups
+from retention import RetentionManager
+from proc_reader import default_sampler
+from scheduler import SamplingScheduler, TkLoop, HISTORY_TIERS, attrs_for
 
 # Load datasets
 #carbon_footprint_data = pd.read_csv('carbon_footprint_data.csv')
-with open('license_cost_data.json') as f:
-    license_cost_data = json.load(f)
+license_catalog = LicenseCatalog('license_cost_data.json')
 
 # Convert to dictionary for faster lookups
 #carbon_footprint_dict = dict(zip(carbon_footprint_data['process_name'], carbon_footprint_data['carbon_footprint_per_mb']))
 
-# Placeholder constants for power consumption and emissions factor
-CPU_POWER_CONSUMPTION_W = 50  # Watts
-MEMORY_POWER_CONSUMPTION_W_PER_GB = 5  # Watts per GB
-EMISSIONS_FACTOR_KG_CO2_PER_KWH = 0.475  # Average emissions factor
+# Power consumption and emissions factor for this host (see power_model.json)
+power_model = scoring.load_power_model()
+CPU_POWER_CONSUMPTION_W = power_model.cpu_power_w  # Watts
+MEMORY_POWER_CONSUMPTION_W_PER_GB = power_model.memory_power_w_per_gb  # Watts per GB
+EMISSIONS_FACTOR_KG_CO2_PER_KWH = power_model.emissions_factor_kg_co2_per_kwh  # Average emissions factor
 
 # Initialize the SQLite database
-conn = sqlite3.connect('process_monitor.db')
+conn = store.connect()
 c = conn.cursor()
 
 # Create tables
@@ -54,17 +59,46 @@ c.execute('''
 
 conn.commit()
 
-def monitor_processes():
+# Sweep-level time series at raw/minute/hour/day resolution
+rollups = Rollups(conn)
+ANALYTICS_WINDOW = timedelta(days=7)
+
+# Raw process rows are trimmed oldest-first in small chunks so writers never stall
+PROCESS_ROW_TTL = timedelta(days=90)
+MAX_PROCESS_ROWS = 5_000_000
+retention = RetentionManager()
+retention.track_table(conn, 'processes', 'last_used', ttl=PROCESS_ROW_TTL, max_rows=MAX_PROCESS_ROWS)
+
+# Reads /proc directly on Linux; keeps per-process state for CPU and I/O deltas
+process_source = default_sampler()
+CPU_COUNT = psutil.cpu_count() or 1
+
+# Sample on the history tiers, stretched while quiet, within 1% of a core.
+# A sweep is written at most once a minute; the CPU samples in between are
+# averaged and the disk I/O deltas summed into it.
+scheduler = SamplingScheduler(HISTORY_TIERS)
+sweep_window = store.SweepWindow(key=(0, 10), average=(2, 7), total=(4, 5))
+
+# Each sweep is buffered and written in one executemany() transaction
+process_writer = store.BatchWriter(conn, 'processes', ('pid', 'name', 'cpu_percent', 'memory_usage', 'disk_read', 'disk_write', 'num_threads', 'carbon_footprint', 'license_cost', 'last_used', 'create_time', 'username'))
+
+def monitor_processes(refresh=None, source=None):
+    # refresh: process_iter attrs to re-read; the sampler reuses the rest.
+    # source: anything with process_iter(attrs, refresh), e.g.
+    # proc_reader.SyntheticSampler; defaults to process_source.
+    # Returns per-metric totals for the scheduler.
     current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'io_counters', 'num_threads', 'create_time', 'username']):
+    rows = []
+    for proc in (source or process_source).process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'io_counters', 'num_threads', 'create_time', 'username'], refresh=refresh):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
             cpu_percent = proc.info['cpu_percent']
             mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
-            io_counters = proc.info.get('io_counters', None)
-            disk_read = io_counters.read_bytes if io_counters else 0
-            disk_write = io_counters.write_bytes if io_counters else 0
+            # Bytes since the previous sweep, so summing samples gives the real total
+            io_delta = proc.info.get('io_delta', None)
+            disk_read = io_delta.read_bytes if io_delta else 0
+            disk_write = io_delta.write_bytes if io_delta else 0
             num_threads = proc.info['num_threads']
             create_time = datetime.fromtimestamp(proc.info['create_time'])
             username = proc.info.get('username', 'N/A')
@@ -73,36 +107,30 @@ def monitor_processes():
             carbon_footprint = get_carbon_footprint(name, cpu_percent, mem)
             license_cost = get_license_cost(name)
 
-            c.execute('''
-                INSERT INTO processes (pid, name, cpu_percent, memory_usage, disk_read, disk_write, num_threads, carbon_footprint, license_cost, last_used, create_time, username)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (pid, name, cpu_percent, mem, disk_read, disk_write, num_threads, carbon_footprint, license_cost, last_used, create_time, username))
-            conn.commit()
+            rows.append((pid, name, cpu_percent, mem, disk_read, disk_write, num_threads, carbon_footprint, license_cost, last_used, create_time, username))
 
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
 
-def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
-    # Estimate power consumption
-    cpu_power_consumption = (avg_cpu_percent / 100) * CPU_POWER_CONSUMPTION_W
-    memory_power_consumption = (avg_memory_usage_mb / 1024) * MEMORY_POWER_CONSUMPTION_W_PER_GB
-    total_power_consumption_w = cpu_power_consumption + memory_power_consumption
-
-    # Convert power consumption to energy consumption (kWh)
-    energy_consumption_kwh = total_power_consumption_w / 1000
+    process_writer.extend(sweep_window.add(rows, current_time.timestamp()))
+    return {
+        'cpu': sum(row[2] for row in rows),
+        'memory': sum(row[3] for row in rows),
+        'io': sum(row[4] + row[5] for row in rows),
+        'threads': sum(row[6] for row in rows),
+    }
 
-    # Convert energy consumption to carbon footprint
-    carbon_footprint_kg = energy_consumption_kwh * EMISSIONS_FACTOR_KG_CO2_PER_KWH
-    return carbon_footprint_kg
+def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
+    return scoring.carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, power_model)
 
 def get_license_cost(process_name):
-    return license_cost_data.get(process_name, 0.0)
-
-def update_ui():
-    monitor_processes()
-    for row in tree.get_children():
-        tree.delete(row)
+    return license_catalog.get(process_name)
 
+def update_ui(metrics):
+    # One sweep of the due metrics, run by ui_loop
+    totals = monitor_processes(attrs_for(metrics))
+    process_writer.flush()
+    retention.step()
     # Retrieve top 20 processes by average memory usage
     c.execute('''
         SELECT name, AVG(memory_usage), AVG(cpu_percent), SUM(disk_read), SUM(disk_write), AVG(num_threads), AVG(carbon_footprint), license_cost, MAX(last_used), create_time, username
@@ -113,51 +141,34 @@ def update_ui():
     ''')
     top_processes = c.fetchall()
     
-    for row in top_processes:
-        tree.insert("", "end", values=row)
+    tree_view.update((row[0], row) for row in top_processes)
 
-    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
     avg_memory_usage = sum(row[1] for row in top_processes) / len(top_processes)
+    avg_cpu_usage = sum(row[2] for row in top_processes) / len(top_processes)
     total_carbon_footprint = sum(row[6] for row in top_processes)
+    rollups.add(datetime.now(), avg_memory_usage, avg_cpu_usage, total_carbon_footprint)
 
-    c.execute('''
-        INSERT INTO hourly_data (hour, avg_memory_usage, total_carbon_footprint)
-        VALUES (?, ?, ?)
-    ''', (current_hour, avg_memory_usage, total_carbon_footprint))
-    conn.commit()
+    if chart_panel is not None:
+        chart_panel.tick()  # Appends only the newest buckets
 
-    root.after(60, update_ui)
+    return totals
 
 def refresh_data():
     # Manually refresh data when the button is pressed
-    update_ui()
-
-def show_hourly_analytics():
-    # Retrieve hourly data
-    c.execute('SELECT hour, avg_memory_usage, total_carbon_footprint FROM hourly_data ORDER BY hour')
-    data = c.fetchall()
-
-    hours = [row[0] for row in data]
-    avg_memory_usage = [row[1] for row in data]
-    total_carbon_footprint = [row[2] for row in data]
-
-    # Plot the data
-    fig, ax1 = plt.subplots()
+    ui_loop.run_now()
 
-    color = 'tab:blue'
-    ax1.set_xlabel('Time')
-    ax1.set_ylabel('Average Memory Usage (MB)', color=color)
-    ax1.plot(hours, avg_memory_usage, color=color)
-    ax1.tick_params(axis='y', labelcolor=color)
+chart_panel = None  # Built on first use so startup doesn't import matplotlib
 
-    ax2 = ax1.twinx()  
-    color = 'tab:red'
-    ax2.set_ylabel('Total Carbon Footprint (kg CO2)', color=color)
-    ax2.plot(hours, total_carbon_footprint, color=color)
-    ax2.tick_params(axis='y', labelcolor=color)
-
-    fig.tight_layout()
-    plt.show()
+def show_hourly_analytics():
+    global chart_panel
+    from charts import ChartPanel, TimeSeriesChart
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    # Embedded under the process list; reads rollups at screen resolution
+    chart_panel.toggle('hourly', lambda parent: TimeSeriesChart(parent, rollups, [
+        ('Average Memory Usage (MB)', 1, 'tab:blue', 'left'),
+        ('Total Carbon Footprint (kg CO2)', 5, 'tab:red', 'right'),
+    ], 'Hourly Analytics - Memory and Carbon Footprint', ANALYTICS_WINDOW))
 
 # Create the main window
 root = tk.Tk()
@@ -165,9 +176,16 @@ root.title("Process Monitor")
 
 # Create and pack the Treeview widget
 columns = ("Process Name", "Memory Usage (MB)", "CPU Usage (%)", "Disk Read (Bytes)", "Disk Write (Bytes)", "Thread Count", "Carbon Footprint (kg CO2)", "License Cost ($)", "Last Used", "Creation Time", "Username")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+
 for col in columns:
     tree.heading(col, text=col)
 
@@ -179,15 +197,17 @@ refresh_button.pack(pady=10)
 analytics_button = tk.Button(root, text="Show Hourly Analytics", command=show_hourly_analytics)
 analytics_button.pack(pady=10)
 
-# Initial UI update
-update_ui()
-
-# Start the Tkinter main loop
-root.mainloop()
+# Sweep now, then whenever the scheduler says a metric is due
+ui_loop = TkLoop(root, scheduler, update_ui, busy=lambda totals: totals['cpu'] / 100 / CPU_COUNT)
+ui_loop.run()
 
 # Close the database connection when the application closes
 def on_closing():
+    process_writer.flush()
     conn.close()
     root.destroy()
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
+
+# Start the Tkinter main loop
+root.mainloop()
@@ -1,130 +1,186 @@
 import psutil
-import pandas as pd
 import json
 from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
+from license_catalog import LicenseCatalog
+from ring_buffer import RingBuffer
 from collections import defaultdict
+from tree_view import VirtualTree, SortHeadings
+from topk import TopKIndex
+from retention import RetentionManager, touch
+from registry import ProcessRegistry
+from proc_reader import default_sampler
+from scheduler import SamplingScheduler, TkLoop, attrs_for
+import scoring
 
 # Load datasets
-with open('license_cost_data.json') as f:
-    license_cost_data = json.load(f)
-
-# Placeholder constants for power consumption and emissions factor
-CPU_POWER_CONSUMPTION_W = 50  # Watts
-MEMORY_POWER_CONSUMPTION_W_PER_GB = 5  # Watts per GB
-EMISSIONS_FACTOR_KG_CO2_PER_KWH = 0.475  # Average emissions factor
-
-# Initialize data structures
+license_catalog = LicenseCatalog('license_cost_data.json')
+
+# Power consumption and emissions factor for this host (see power_model.json)
+power_model = scoring.load_power_model()
+CPU_POWER_CONSUMPTION_W = power_model.cpu_power_w  # Watts
+MEMORY_POWER_CONSUMPTION_W_PER_GB = power_model.memory_power_w_per_gb  # Watts per GB
+EMISSIONS_FACTOR_KG_CO2_PER_KWH = power_model.emissions_factor_kg_co2_per_kwh  # Average emissions factor
+
+# Samples kept per metric for each application; older ones are overwritten
+HISTORY_CAPACITY = 720
+
+# Names not seen for PROCESS_TTL are dropped; at most MAX_TRACKED_PROCESSES are kept
+PROCESS_TTL = timedelta(days=30)
+MAX_TRACKED_PROCESSES = 20000
+MAX_HOURLY_ENTRIES = 24 * 90
+# Individual processes are only needed while they run
+EXITED_PROCESS_TTL = timedelta(hours=1)
+
+# Initialize data structures. registry holds one record per running process,
+# keyed by (pid, create_time); process_usage holds per-application history,
+# one sample per sweep summed over all of the application's processes.
+registry = ProcessRegistry()
 process_usage = {}
-hourly_data = defaultdict(lambda: {'memory_usage': [], 'carbon_footprint': []})
-
-def monitor_processes():
+hourly_data = defaultdict(lambda: {'time': datetime.now().replace(minute=0, second=0, microsecond=0), 'samples': 0, 'memory_sum': 0.0, 'carbon_sum': 0.0})
+
+# Top 20 applications per sort key, updated from each sweep's samples. The
+# ring buffers keep running sums, so every key is O(1) per application.
+rankings = TopKIndex(process_usage, {
+    'memory': lambda usage: usage['mem_usage'].mean(),
+    'cpu': lambda usage: usage['cpu_usage'].mean(),
+    'carbon': lambda usage: get_carbon_footprint(None, usage['cpu_usage'].mean(), usage['mem_usage'].mean()),
+    'license_cost': lambda usage: usage['license_cost'],
+    'threads': lambda usage: usage['num_threads'].mean(),
+}, k=20)
+
+retention = RetentionManager()
+retention.track('process_usage', process_usage, lambda info: info['last_used'], ttl=PROCESS_TTL, max_entries=MAX_TRACKED_PROCESSES)
+retention.track('processes', registry.records, lambda record: record.last_execution_time, ttl=EXITED_PROCESS_TTL, max_entries=MAX_TRACKED_PROCESSES)
+retention.track('hourly_data', hourly_data, lambda entry: entry['time'], max_entries=MAX_HOURLY_ENTRIES)
+
+# Reads /proc directly on Linux; keeps per-process state for CPU and I/O deltas
+process_source = default_sampler()
+CPU_COUNT = psutil.cpu_count() or 1
+
+# Per-metric sweep tiers, stretched while quiet, within 1% of a core
+scheduler = SamplingScheduler()
+
+def monitor_processes(refresh=None, source=None):
+    # refresh: process_iter attrs to re-read; the sampler reuses the rest.
+    # source: anything with process_iter(attrs, refresh), e.g.
+    # proc_reader.SyntheticSampler; defaults to process_source.
+    # Returns per-metric totals for the scheduler.
     current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'io_counters', 'num_threads', 'create_time', 'username']):
+    timestamp = registry.begin_sweep(current_time)
+    disk_io = defaultdict(lambda: [0, 0])
+    totals = {'cpu': 0.0, 'memory': 0.0, 'threads': 0, 'io': 0}
+    for proc in (source or process_source).process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'io_counters', 'num_threads', 'create_time', 'username'], refresh=refresh):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
             cpu_percent = proc.info['cpu_percent']
             mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
-            io_counters = proc.info.get('io_counters', None)
-            disk_read = io_counters.read_bytes if io_counters else 0
-            disk_write = io_counters.write_bytes if io_counters else 0
+            # Bytes since the previous sweep, so summing samples gives the real total
+            io_delta = proc.info.get('io_delta', None)
+            if io_delta:
+                disk_io[name][0] += io_delta.read_bytes
+                disk_io[name][1] += io_delta.write_bytes
+                totals['io'] += io_delta.read_bytes + io_delta.write_bytes
             num_threads = proc.info['num_threads']
-            create_time = datetime.fromtimestamp(proc.info['create_time'])
             username = proc.info.get('username', 'N/A')
-
-            if name not in process_usage:
-                process_usage[name] = {'pid': pid, 'last_used': current_time, 'mem_usage': [], 'cpu_usage': [], 'disk_read': [], 'disk_write': [], 'num_threads': [], 'create_time': create_time, 'username': username}
-            process_usage[name]['last_used'] = current_time
-            process_usage[name]['mem_usage'].append((current_time, mem))
-            process_usage[name]['cpu_usage'].append((current_time, cpu_percent))
-            process_usage[name]['disk_read'].append((current_time, disk_read))
-            process_usage[name]['disk_write'].append((current_time, disk_write))
-            process_usage[name]['num_threads'].append((current_time, num_threads))
+            registry.observe(pid, proc.info['create_time'], name, username, None, mem, num_threads, cpu_percent)
+            totals['cpu'] += cpu_percent
+            totals['memory'] += mem
+            totals['threads'] += num_threads
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
 
+    # One history sample per application, summed over its running processes
+    apps = registry.apps()
+    license_costs = license_catalog.get_many(list(apps))
+    for (name, app), license_cost in zip(apps.items(), license_costs):
+        usage = process_usage.get(name)
+        if usage is None:
+            usage = {'last_used': current_time, 'instances': 0, 'mem_usage': RingBuffer(HISTORY_CAPACITY), 'cpu_usage': RingBuffer(HISTORY_CAPACITY), 'disk_read': RingBuffer(HISTORY_CAPACITY), 'disk_write': RingBuffer(HISTORY_CAPACITY), 'num_threads': RingBuffer(HISTORY_CAPACITY), 'create_time': app.started, 'username': app.username}
+        touch(process_usage, name, usage)  # Keeps process_usage in least-recently-used order
+        usage['last_used'] = current_time
+        usage['instances'] = app.instances
+        usage['create_time'] = app.started
+        usage['license_cost'] = license_cost
+        usage['mem_usage'].append(timestamp, app.memory_usage)
+        usage['cpu_usage'].append(timestamp, app.cpu_usage)
+        usage['disk_read'].append(timestamp, disk_io[name][0])
+        usage['disk_write'].append(timestamp, disk_io[name][1])
+        usage['num_threads'].append(timestamp, app.num_threads)
+    rankings.update((name, process_usage[name]) for name in apps)
+    return totals
+
 def remove_unused_processes(threshold_days=30):
-    current_time = datetime.now()
-    unused_processes = []
-    for name, info in process_usage.items():
-        if current_time - info['last_used'] > timedelta(days=threshold_days):
-            unused_processes.append(name)
-    for name in unused_processes:
-        del process_usage[name]
+    return retention.expire('process_usage', timedelta(days=threshold_days))
 
 def get_carbon_footprint(process_name, avg_cpu_percent, avg_memory_usage_mb):
-    # Estimate power consumption
-    cpu_power_consumption = (avg_cpu_percent / 100) * CPU_POWER_CONSUMPTION_W
-    memory_power_consumption = (avg_memory_usage_mb / 1024) * MEMORY_POWER_CONSUMPTION_W_PER_GB
-    total_power_consumption_w = cpu_power_consumption + memory_power_consumption
-
-    # Convert power consumption to energy consumption (kWh)
-    # Assuming monitoring interval is 1 hour for simplicity
-    energy_consumption_kwh = total_power_consumption_w / 1000
-
-    # Convert energy consumption to carbon footprint
-    carbon_footprint_kg = energy_consumption_kwh * EMISSIONS_FACTOR_KG_CO2_PER_KWH
-    return carbon_footprint_kg
+    return scoring.carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, power_model)
 
 def get_license_cost(process_name):
-    return license_cost_data.get(process_name, 0.0)
-
-def update_ui():
-    monitor_processes()
-    for row in tree.get_children():
-        tree.delete(row)
-
-    # Sort processes by average memory usage and select the top 20
-    top_processes = sorted(process_usage.items(), key=lambda item: sum([mem for _, mem in item[1]['mem_usage']]) / len(item[1]['mem_usage']), reverse=True)[:20]
-    
-    for name, info in top_processes:
-        avg_memory_usage = sum([mem for _, mem in info['mem_usage']]) / len(info['mem_usage'])
-        avg_cpu_usage = sum([cpu for _, cpu in info['cpu_usage']]) / len(info['cpu_usage'])
-        total_disk_read = sum([read for _, read in info['disk_read']])
-        total_disk_write = sum([write for _, write in info['disk_write']])
-        avg_threads = sum([threads for _, threads in info['num_threads']]) / len(info['num_threads'])
+    return license_catalog.get(process_name)
+
+def ranking_rows(sort_key):
+    rows = []
+    for name, info in rankings.top(sort_key):
+        avg_memory_usage = info['mem_usage'].mean()
+        avg_cpu_usage = info['cpu_usage'].mean()
+        total_disk_read = info['disk_read'].sum()
+        total_disk_write = info['disk_write'].sum()
+        avg_threads = info['num_threads'].mean()
         carbon_footprint = get_carbon_footprint(name, avg_cpu_usage, avg_memory_usage)
         license_cost = get_license_cost(name)
         last_used = info['last_used'].strftime('%Y-%m-%d %H:%M:%S')
         
-        tree.insert("", "end", values=(name, avg_memory_usage, avg_cpu_usage, total_disk_read, total_disk_write, avg_threads, carbon_footprint, license_cost, last_used, info['create_time'].strftime('%Y-%m-%d %H:%M:%S'), info['username']))
-    
-    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
-    hourly_data[current_hour]['memory_usage'].append(avg_memory_usage)
-    hourly_data[current_hour]['carbon_footprint'].append(carbon_footprint)
+        rows.append((name, (name, avg_memory_usage, avg_cpu_usage, total_disk_read, total_disk_write, avg_threads, carbon_footprint, license_cost, last_used, datetime.fromtimestamp(info['create_time']).strftime('%Y-%m-%d %H:%M:%S'), info['username'])))
+    return rows
+
+def show_ranking(sort_key):
+    tree_view.update(ranking_rows(sort_key))
+
+def update_ui(metrics):
+    # One sweep of the due metrics, run by ui_loop
+    totals = monitor_processes(attrs_for(metrics))
+    retention.step()
+    show_ranking(sort_headings.current)
+
+    # The hourly series samples the last row of the memory ranking, whichever
+    # ranking is shown; nothing is ranked before the first usable sweep
+    top_processes = rankings.top('memory')
+    if top_processes:
+        name, info = top_processes[-1]
+        avg_memory_usage = info['mem_usage'].mean()
+        carbon_footprint = get_carbon_footprint(name, info['cpu_usage'].mean(), avg_memory_usage)
+
+        # Running sums keep each hour's entry a fixed size however often we tick
+        current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        hour_entry = hourly_data[current_hour]
+        hour_entry['samples'] += 1
+        hour_entry['memory_sum'] += avg_memory_usage
+        hour_entry['carbon_sum'] += carbon_footprint
     
-    root.after(5, update_ui)
+    if chart_panel is not None:
+        chart_panel.tick()  # Appends only the newest buckets
+
+    return totals
 
 def refresh_data():
     # Manually refresh data when the button is pressed
-    update_ui()
-
-def show_hourly_analytics():
-    # Calculate hourly averages
-    hours = sorted(hourly_data.keys())
-    avg_memory_usage = [sum(hourly_data[hour]['memory_usage']) / len(hourly_data[hour]['memory_usage']) for hour in hours]
-    total_carbon_footprint = [sum(hourly_data[hour]['carbon_footprint']) for hour in hours]
+    ui_loop.run_now()
 
-    # Plot the data
-    fig, ax1 = plt.subplots()
+chart_panel = None  # Built on first use so startup doesn't import matplotlib
 
-    color = 'tab:blue'
-    ax1.set_xlabel('Time')
-    ax1.set_ylabel('Average Memory Usage (MB)', color=color)
-    ax1.plot(hours, avg_memory_usage, color=color)
-    ax1.tick_params(axis='y', labelcolor=color)
-
-    ax2 = ax1.twinx()  
-    color = 'tab:red'
-    ax2.set_ylabel('Total Carbon Footprint (kg CO2)', color=color)
-    ax2.plot(hours, total_carbon_footprint, color=color)
-    ax2.tick_params(axis='y', labelcolor=color)
-
-    fig.tight_layout()
-    plt.show()
+def show_hourly_analytics():
+    global chart_panel
+    from charts import ChartPanel, HourlySeries, TimeSeriesChart
+    if chart_panel is None:
+        chart_panel = ChartPanel(root)
+    # Embedded under the process list; hourly_data already holds one entry per hour
+    chart_panel.toggle('hourly', lambda parent: TimeSeriesChart(parent, HourlySeries(hourly_data), [
+        ('Average Memory Usage (MB)', 1, 'tab:blue', 'left'),
+        ('Total Carbon Footprint (kg CO2)', 5, 'tab:red', 'right'),
+    ], 'Hourly Analytics - Memory and Carbon Footprint', timedelta(days=90)))
 
 # Create the main window
 root = tk.Tk()
@@ -132,12 +188,28 @@ root.title("Process Monitor")
 
 # Create and pack the Treeview widget
 columns = ("Process Name", "Memory Usage (MB)", "CPU Usage (%)", "Disk Read (Bytes)", "Disk Write (Bytes)", "Thread Count", "Carbon Footprint (kg CO2)", "License Cost ($)", "Last Used", "Creation Time", "Username")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+
 for col in columns:
     tree.heading(col, text=col)
 
+# Clicking a numeric heading shows that key's ranking without re-sorting
+sort_headings = SortHeadings(tree, {
+    "Memory Usage (MB)": 'memory',
+    "CPU Usage (%)": 'cpu',
+    "Thread Count": 'threads',
+    "Carbon Footprint (kg CO2)": 'carbon',
+    "License Cost ($)": 'license_cost',
+}, show_ranking, 'memory')
+
 # Create and pack the Refresh button
 refresh_button = tk.Button(root, text="Refresh", command=refresh_data)
 refresh_button.pack(pady=10)
@@ -146,8 +218,9 @@ refresh_button.pack(pady=10)
 analytics_button = tk.Button(root, text="Show Hourly Analytics", command=show_hourly_analytics)
 analytics_button.pack(pady=10)
 
-# Initial UI update
-update_ui()
+# Sweep now, then whenever the scheduler says a metric is due
+ui_loop = TkLoop(root, scheduler, update_ui, busy=lambda totals: totals['cpu'] / 100 / CPU_COUNT)
+ui_loop.run()
 
 # Start the Tkinter main loop
 root.mainloop()
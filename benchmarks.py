@@ -0,0 +1,635 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import psutil
+
+import capture
+import energy
+import exporter
+import fleet
+import headless
+import instrument
+import last_execution
+import proc_reader
+import process_tree
+import registry
+import scheduler
+import scoring
+import store
+import topk
+import usage_index
+from license_catalog import LicenseCatalog, LICENSE_COST_DATA_FILE
+
+# Synthetic benchmarks for the collector hot paths. Run with:
+#   python benchmarks.py
+# The regression suite runs the collector's stages over synthetic 1k, 10k
+# and 50k-process tables and compares them with a saved baseline:
+#   python benchmarks.py --suite --save-baseline   # on a known-good tree
+#   python benchmarks.py --suite                   # exits 1 on a regression
+
+BASELINE_FILE = 'benchmark_baseline.json'
+SUITE_SIZES = (1000, 10000, 50000)
+REGRESSION_THRESHOLD = 0.25  # Fail when a stage is more than 25% slower than its baseline
+MIN_REGRESSION_MS = 0.5  # ...and slower by at least this much, so sub-millisecond noise doesn't fail the run
+
+def synthetic_sweep(num_processes=5000, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    names = [f'proc_{i}.exe' for i in range(num_processes // 10 or 1)]
+    return [
+        (pid, rng.choice(names), rng.uniform(1, 2048), rng.randint(1, 64), rng.uniform(0, 100),
+         rng.uniform(0, 0.05), 0.0, rng.randint(0, 2), now, 'user', now)
+        for pid in range(1, num_processes + 1)
+    ]
+
+
+def bench_ingest(num_processes=5000, sweeps=3):
+    rows = synthetic_sweep(num_processes)
+    insert = f"INSERT INTO processes ({', '.join(store.PROCESS_COLUMNS)}) VALUES ({', '.join('?' for _ in store.PROCESS_COLUMNS)})"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: one INSERT + commit per process on a default-journal database
+        conn = sqlite3.connect(os.path.join(tmp, 'before.db'))
+        conn.execute(store.PROCESS_SCHEMA)
+        start = time.perf_counter()
+        for _ in range(sweeps):
+            for row in rows:
+                conn.execute(insert, row)
+                conn.commit()
+        results['per-row commit'] = num_processes * sweeps / (time.perf_counter() - start)
+        conn.close()
+
+        # After: WAL + one executemany() transaction per sweep
+        conn = store.connect(os.path.join(tmp, 'after.db'))
+        conn.execute(store.PROCESS_SCHEMA)
+        writer = store.BatchWriter(conn, 'processes', store.PROCESS_COLUMNS)
+        start = time.perf_counter()
+        for _ in range(sweeps):
+            writer.extend(rows)
+            writer.flush()
+        results['batched WAL'] = num_processes * sweeps / (time.perf_counter() - start)
+        conn.close()
+    return results
+
+
+def bench_scoring(num_processes=5000, repeats=20):
+    rng = random.Random(0)
+    cpu = [rng.uniform(0, 100) for _ in range(num_processes)]
+    mem = [rng.uniform(1, 2048) for _ in range(num_processes)]
+    threads = [rng.randint(1, 64) for _ in range(num_processes)]
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for c, m, t in zip(cpu, mem, threads):
+            scoring.carbon_footprint(c, m)
+            scoring.sustainability_rating(m, t)
+    results['scalar per process'] = num_processes * repeats / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        scoring.score_sweep(cpu, mem, threads)
+    results['score_sweep'] = num_processes * repeats / (time.perf_counter() - start)
+    return results
+
+
+LEGACY_TOP_QUERY = '''
+    SELECT name, memory_usage, num_threads, cpu_usage, carbon_footprint, license_cost, sustainability_rating, create_time, username
+    FROM processes
+    GROUP BY name
+    ORDER BY AVG(memory_usage) DESC
+    LIMIT 20
+'''
+
+
+# What an accurate unused-license check costs without the usage index:
+# every licensed application's last sample, grouped over the whole history
+LEGACY_UNUSED_QUERY = '''
+    SELECT name, MAX(license_cost), MAX(sample_time)
+    FROM processes
+    WHERE license_cost > 0
+    GROUP BY name
+    HAVING MAX(sample_time) <= ?
+'''
+
+
+def time_ms(fn, repeats=5):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_top_query(sizes=(1_000_000, 10_000_000), sweep_size=5000):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = store.connect(os.path.join(tmp, 'history.db'))
+        store.create_process_table(conn)
+        app_stats = store.AppStats(conn, store.PROCESS_COLUMNS)
+        writer = store.BatchWriter(conn, 'processes', store.PROCESS_COLUMNS, on_flush=app_stats.update)
+        sweep = synthetic_sweep(sweep_size)
+        written = 0
+        for size in sorted(sizes):
+            while written < size:
+                writer.extend(sweep[:size - written])
+                writer.flush()
+                written += min(sweep_size, size - written)
+            results[f'GROUP BY @ {size:,} rows'] = time_ms(lambda: conn.execute(LEGACY_TOP_QUERY).fetchall(), repeats=3)
+            results[f'app_stats @ {size:,} rows'] = time_ms(lambda: app_stats.top_by_memory(20))
+        conn.close()
+    return results
+
+
+def bench_unused_license(size=1_000_000, sweep_size=5000):
+    # History spanning 100 days, with a tenth of the applications licensed
+    # and half of those last run more than 60 days ago
+    results = {}
+    rng = random.Random(0)
+    names = [f'proc_{i}.exe' for i in range(500)]
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = store.connect(os.path.join(tmp, 'history.db'))
+        store.create_process_table(conn)
+        index = usage_index.UsageIndex(conn, store.PROCESS_COLUMNS)
+        writer = store.BatchWriter(conn, 'processes', store.PROCESS_COLUMNS, on_flush=index.update)
+        sweeps = size // sweep_size
+        start = time.perf_counter()
+        for sweep in range(sweeps):
+            sample_time = (now - timedelta(days=100) + timedelta(days=100) * sweep / sweeps).strftime('%Y-%m-%d %H:%M:%S')
+            running = names if sweep < sweeps // 3 else names[25:]
+            rows = []
+            for pid in range(sweep_size):
+                i = rng.randrange(len(running))
+                rows.append((pid, running[i], 100.0, 4, 1.0, 0.001, 149.0 if (i + len(names) - len(running)) < 50 else 0.0, 1, sample_time, 'user', sample_time))
+            writer.extend(rows)
+            writer.flush()
+        results['ingest with index, rows/s'] = size / (time.perf_counter() - start)
+        cutoff = (now - timedelta(days=60)).strftime('%Y-%m-%d %H:%M:%S')
+        results['GROUP BY history, ms'] = time_ms(lambda: conn.execute(LEGACY_UNUSED_QUERY, (cutoff,)).fetchall(), repeats=3)
+        results['usage index, ms'] = time_ms(lambda: index.unused(60, now))
+        results['unused licensed apps'] = len(index.unused(60, now))
+        conn.close()
+    return results
+
+
+def bench_last_execution(records=200_000, programs=50):
+    # Resolving a catalog of `programs` names from a process-accounting file:
+    # the first read of the file, a lookup once it is summarized, and a cached resolve
+    rng = random.Random(0)
+    names = [f'prog{i}' for i in range(programs)]
+    record = struct.Struct(last_execution.ACCT_V3.format('<'))
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'pacct')
+        with open(path, 'wb') as f:
+            f.write(b''.join(record.pack(0, last_execution.ACCT_VERSION, 0, 0, 1000, 1000, pid, 1, now - rng.randrange(86400 * 90),
+                                         float(rng.randrange(100 * 3600)), *([0] * 8), rng.choice(names + ['bash', 'sh', 'python3']).encode())
+                             for pid in range(records)))
+        provider = last_execution.PacctProvider([path], background=False)
+        resolver = last_execution.LastExecutionResolver([provider])
+        return {
+            'first read': time_ms(lambda: last_execution.PacctProvider([path], background=False).lookup(names), repeats=3),
+            'summarized': time_ms(lambda: provider.lookup(names), repeats=3),
+            'cached': time_ms(lambda: resolver.resolve(names), repeats=3),
+        }
+
+
+def bench_startup(runs=3):
+    # Wall time for `python headless.py --count 1` and the first-sample time it reports
+    here = os.path.dirname(os.path.abspath(__file__))
+    wall, first_sample = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, os.path.join(here, 'headless.py'), '--count', '1', '--store', os.path.join(tmp, f'{i}.db')],
+                cwd=here, capture_output=True, text=True, check=True).stdout
+            wall.append((time.perf_counter() - start) * 1000)
+            first_sample.append(float(output.split(', ')[-1].split(' ms')[0]))
+    return {
+        'first sample (in-process)': statistics.median(first_sample),
+        'process wall time': statistics.median(wall),
+    }
+
+
+def bench_sweep(repeats=20):
+    # One process sweep on this host: psutil.process_iter against the /proc
+    # reader, and sweeps that only re-read what the scheduler's CPU tier needs
+    attrs = ['pid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username', 'io_counters']
+    sampler = proc_reader.ProcSampler()
+    count = len(sampler.sample())
+    list(psutil.process_iter(attrs))
+    psutil_sampler = proc_reader.PsutilSampler()
+    list(psutil_sampler.process_iter(attrs))
+    return {
+        f'psutil ({count} processes)': time_ms(lambda: list(psutil.process_iter(attrs)), repeats),
+        f'proc_reader ({count} processes)': time_ms(sampler.sample, repeats),
+        'proc_reader, CPU tier only': time_ms(lambda: sampler.sample(scheduler.attrs_for({'cpu'})), repeats),
+        'psutil sampler, CPU tier only': time_ms(lambda: list(psutil_sampler.process_iter(attrs, refresh=scheduler.attrs_for({'cpu'}))), repeats),
+    }
+
+
+def bench_fleet(hosts=500, sweeps=5, num_processes=200):
+    # Simulated agents and the aggregator on localhost, same process
+    with tempfile.TemporaryDirectory() as tmp:
+        aggregator = fleet.Aggregator(tmp)
+        server = fleet.serve(aggregator, port=0)
+        start = time.perf_counter()
+        totals = fleet.simulate(f'http://127.0.0.1:{server.server_port}', hosts, sweeps, num_processes)
+        aggregator.drain()
+        elapsed = time.perf_counter() - start
+        query_ms = time_ms(lambda: aggregator.top_apps(20))
+        waste_ms = time_ms(lambda: aggregator.license_waste(60))
+        server.shutdown()
+        aggregator.close()
+    return {
+        f'process rows/s ({hosts} hosts)': totals['rows'] / elapsed,
+        'host sweeps/s': hosts * sweeps / elapsed,
+        'KB on the wire per sweep': totals['bytes_sent'] / 1024 / (hosts * sweeps),
+        'rows sent (delta) / total %': totals['rows_sent'] / totals['rows'] * 100,
+        'fleet top-20 query ms': query_ms,
+        'license waste query ms': waste_ms,
+    }
+
+
+def bench_registry(num_processes=20000):
+    # Resident bytes per tracked process: the old per-PID dict against a
+    # registry record, with names and usernames arriving as fresh strings
+    # each time as they do from a sweep
+    rng = random.Random(0)
+    now = datetime.now()
+    samples = [(pid, now.timestamp() - rng.uniform(0, 86400), f'proc_{rng.randrange(200)}.exe', f'user{rng.randrange(5)}',
+                rng.uniform(1, 2048), rng.randint(1, 64), rng.uniform(0, 100), rng.uniform(0, 0.05), rng.choice((0.0, 149.0)), rng.randint(0, 2))
+               for pid in range(num_processes)]
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del kept
+        return size / num_processes
+
+    def legacy():
+        return {pid: {
+            'name': ''.join(name), 'memory_usage': mem, 'num_threads': threads, 'cpu_usage': cpu, 'carbon_footprint': carbon,
+            'license_cost': cost, 'sustainability_rating': rating, 'last_execution_time': datetime.now(),
+            'create_time': datetime.fromtimestamp(started), 'username': ''.join(user),
+        } for pid, started, name, user, mem, threads, cpu, carbon, cost, rating in samples}
+
+    def records():
+        processes = registry.ProcessRegistry()
+        processes.begin_sweep(now)
+        for pid, started, name, user, mem, threads, cpu, carbon, cost, rating in samples:
+            processes.observe(pid, started, ''.join(name), ''.join(user), None, mem, threads, cpu, carbon, cost, rating)
+        return processes
+
+    return {
+        'dict per PID': measure(legacy),
+        'ProcessRegistry': measure(records),
+    }
+
+
+def bench_topk(num_processes=20000, sweeps=10):
+    # Per-sweep cost of ranking the registry by all five sort keys: sorting
+    # every record per key against feeding the sweep to a TopKIndex, plus
+    # what a heading click costs once the rankings exist
+    rng = random.Random(0)
+    processes = registry.ProcessRegistry()
+    rankings = topk.TopKIndex(processes.records, registry.SORT_KEYS)
+    base = [(pid, 1.0e9 + pid, f'proc_{rng.randrange(200)}.exe', rng.uniform(1, 2048), rng.randint(1, 64), rng.uniform(0, 100),
+             rng.uniform(0, 0.05), rng.choice((0.0, 149.0))) for pid in range(num_processes)]
+    sorted_ms, index_ms = [], []
+    for sweep in range(sweeps):
+        processes.begin_sweep(datetime.fromtimestamp(1.7e9 + sweep))
+        observed = []
+        for pid, started, name, mem, threads, cpu, carbon, cost in base:
+            jitter = rng.uniform(0.9, 1.1)
+            record = processes.observe(pid, started, name, 'user', None, mem * jitter, threads, cpu * jitter, carbon * jitter, cost, 1)
+            observed.append(((pid, started), record))
+
+        start = time.perf_counter()
+        for value in registry.SORT_KEYS.values():
+            sorted(processes.records.values(), key=value, reverse=True)[:20]
+        sorted_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        rankings.update(observed)
+        rankings.tops()
+        index_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'sorted(), 5 keys per sweep': statistics.median(sorted_ms),
+        'TopKIndex, 5 keys per sweep': statistics.median(index_ms),
+        'sorted(), heading click': statistics.median(sorted_ms) / len(registry.SORT_KEYS),
+        'TopKIndex, heading click': time_ms(lambda: rankings.top('cpu'), repeats=100),
+    }
+
+
+def bench_process_tree(num_processes=20000, sweeps=10):
+    # Per-sweep cost of rolling processes up to applications with ~2% of
+    # processes starting and exiting and ~10% changing metrics: rebuilding
+    # every application from scratch against ProcessTree.update()
+    rng = random.Random(0)
+    names = [f'app_{i}.exe' for i in range(200)]
+    costs = {name: rng.choice((0.0, 0.0, 0.0, 149.0)) for name in names}
+
+    def spawn(pid, started, ppid):
+        name = rng.choice(names)
+        return [pid, started, ppid, name, 'user', costs[name], 1, rng.uniform(1, 2048), rng.randint(1, 64), rng.uniform(0, 100), 0, rng.uniform(0, 0.05)]
+
+    live = [spawn(1, 1.0, 0)]
+    for pid in range(2, num_processes + 1):
+        live.append(spawn(pid, float(pid), rng.choice(live)[0]))
+    next_pid = num_processes + 1
+    tree = process_tree.ProcessTree()
+    tree.update([tuple(proc) for proc in live])
+    rebuild_ms, update_ms, changed = [], [], []
+    for sweep in range(sweeps):
+        churn = num_processes // 50
+        for i in sorted(rng.sample(range(1, len(live)), churn), reverse=True):
+            del live[i]
+        for _ in range(churn):
+            live.append(spawn(next_pid, float(next_pid), rng.choice(live)[0]))
+            next_pid += 1
+        for proc in rng.sample(live, num_processes // 10):
+            proc[7] *= rng.uniform(0.9, 1.1)
+            proc[9] = rng.uniform(0, 100)
+        rows = [tuple(proc) for proc in live]
+
+        start = time.perf_counter()
+        process_tree.ProcessTree().update(rows)
+        rebuild_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        changed.append(len(tree.update(rows)))
+        update_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'rebuild per sweep (ms)': statistics.median(rebuild_ms),
+        'incremental per sweep (ms)': statistics.median(update_ms),
+        'applications': len(tree.groups),
+        'changed per sweep': statistics.median(changed),
+    }
+
+
+def bench_instrument(calls=200_000):
+    # Per-call cost of the instrumentation hooks, off (the default) and on
+    def hooks():
+        start = time.perf_counter()
+        for _ in range(calls):
+            with instrument.timed('render_seconds', view='list'):
+                pass
+            instrument.inc('rows_written_total', 1, destination='processes')
+        return (time.perf_counter() - start) / calls * 1e9
+
+    instrument.disable()
+    off = hooks()
+    instrument.enable()
+    try:
+        on = hooks()
+    finally:
+        instrument.disable()
+    return {'timed() + inc(), disabled': off, 'timed() + inc(), enabled': on}
+
+
+def bench_capture(num_processes=2000, sweeps=100, interval_s=5.0):
+    # Capture size and cost per sweep, and how much faster than real time a
+    # capture replays through the headless pipeline into a fresh database
+    source = proc_reader.SyntheticSampler(num_processes, interval_s=interval_s)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.capture.gz')
+        writer = capture.CaptureWriter(path)
+        start = time.perf_counter()
+        capture.record(writer, source, interval=0, count=sweeps, clock=lambda: source.now)
+        record_s = time.perf_counter() - start
+        writer.close()
+        size = os.path.getsize(path)
+
+        reader = capture.CaptureReader(path)
+        start = time.perf_counter()
+        for _ in reader:
+            pass
+        decode_s = time.perf_counter() - start
+        reader.close()
+
+        replayed = capture.ReplaySampler(path)
+        collector = headless.HeadlessCollector(os.path.join(tmp, 'replay.db'), process_source=replayed)
+        start = time.perf_counter()
+        capture.replay(replayed, collector, speed=0)
+        replay_s = time.perf_counter() - start
+        collector.close()
+        replayed.close()
+    return {
+        'bytes per process-sweep': size / (sweeps * num_processes),
+        'record per sweep (ms)': record_s / sweeps * 1000,
+        'decode per sweep (ms)': decode_s / sweeps * 1000,
+        'replay per sweep (ms)': replay_s / sweeps * 1000,
+        'replay speed (x real time)': sweeps * interval_s / replay_s,
+    }
+
+
+def bench_energy(sizes=(1000, 10000, 50000), sweeps=10):
+    # Per-process cost of integrating energy each sweep, which should not
+    # grow with the table, and of reading an application's total
+    results = {}
+    for size in sizes:
+        source = proc_reader.SyntheticSampler(size)
+        ledger = energy.EnergyLedger(sqlite3.connect(':memory:'), cpu_count=8, flush_every_s=float('inf'))
+        costs = []
+        for _ in range(sweeps + 1):
+            sweep = [(info['pid'], info['create_time'], info['name'], info['cpu_time'], info['cpu_percent'], info['memory_info'].rss / (1024 ** 2))
+                     for info in source.sample()]
+            start = time.perf_counter()
+            ledger.update(source.now, sweep)
+            costs.append((time.perf_counter() - start) / size * 1e9)
+        results[f'update per process @{size} (ns)'] = statistics.median(costs[1:])  # The first sweep only sets baselines
+        start = time.perf_counter()
+        for name in proc_reader.SYNTHETIC_NAMES:
+            ledger.app(name)
+        results[f'app total read @{size} (ns)'] = (time.perf_counter() - start) / len(proc_reader.SYNTHETIC_NAMES) * 1e9
+    return results
+
+
+def suite_stages(num_processes, sweeps=5, seed=0):
+    # {stage: median ms} for one table size. Every stage runs on the same
+    # synthetic sweeps; advancing the table is not timed.
+    source = proc_reader.SyntheticSampler(num_processes, seed=seed, auto_advance=False)
+    license_catalog = LicenseCatalog(LICENSE_COST_DATA_FILE)
+    power_model = scoring.load_power_model()
+    timings = {stage: [] for stage in ('sweep', 'scoring', 'persistence', 'top_n', 'render', 'export')}
+    render = suite_renderer()
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = store.connect(os.path.join(tmp, 'suite.db'))
+        store.create_process_table(conn)
+        app_stats = store.AppStats(conn, store.PROCESS_COLUMNS)
+        usage = usage_index.UsageIndex(conn, store.PROCESS_COLUMNS)
+
+        def fold(conn, rows):
+            app_stats.update(conn, rows)
+            return usage.update(conn, rows)
+
+        writer = store.BatchWriter(conn, 'processes', store.PROCESS_COLUMNS, max_rows=len(source.processes) * 2, on_flush=fold)
+        for sweep in range(sweeps + 1):  # The first sweep warms caches and isn't counted
+            source.advance()
+            start = time.perf_counter()
+            rows = headless.monitor_processes(license_catalog, power_model, source)
+            sweep_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            scoring.score_sweep([row[4] for row in rows], [row[2] for row in rows], [row[3] for row in rows], power_model)
+            license_catalog.get_many([row[1] for row in rows])
+            scoring_ms = (time.perf_counter() - start) * 1000
+
+            # Distinct sample times, so usage_index sees one sweep per flush
+            sample_time = datetime.fromtimestamp(source.now).strftime('%Y-%m-%d %H:%M:%S')
+            for row in rows:
+                row[10] = sample_time
+            start = time.perf_counter()
+            writer.extend(rows)
+            writer.flush()
+            persistence_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for sort_key in store.AppStats.SORT_KEYS:
+                app_stats.top(sort_key, 20)
+            top_n_ms = (time.perf_counter() - start) * 1000
+
+            render_ms = None
+            if render is not None:
+                start = time.perf_counter()
+                render(rows)
+                render_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            exporter.export(os.path.join(tmp, 'export.csv'), store.PROCESS_COLUMNS,
+                            exporter.query_chunks(conn, 'processes', store.PROCESS_COLUMNS, 'sample_time', start=sample_time))
+            export_ms = (time.perf_counter() - start) * 1000
+
+            if sweep:
+                for stage, ms in (('sweep', sweep_ms), ('scoring', scoring_ms), ('persistence', persistence_ms),
+                                  ('top_n', top_n_ms), ('render', render_ms), ('export', export_ms)):
+                    if ms is not None:
+                        timings[stage].append(ms)
+        conn.close()
+    return {stage: statistics.median(samples) for stage, samples in timings.items() if samples}
+
+
+def suite_renderer():
+    # VirtualTree.update over every row of a sweep, or None without a display
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        from tree_view import VirtualTree
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    tree = ttk.Treeview(root, columns=store.PROCESS_COLUMNS, show='headings', height=30)
+    view = VirtualTree(tree)
+    return lambda rows: (view.update((f'{row[0]}:{row[8]}', row) for row in rows), root.update_idletasks())
+
+
+def run_suite(sizes=SUITE_SIZES):
+    # {'stage@size': ms}
+    results = {}
+    for size in sizes:
+        for stage, ms in suite_stages(size).items():
+            results[f'{stage}@{size}'] = ms
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # [(name, baseline ms, current ms)] for stages past the threshold
+    regressions = []
+    for name, ms in results.items():
+        before = baseline.get(name)
+        if before is not None and ms > before * (1 + threshold) and ms - before >= MIN_REGRESSION_MS:
+            regressions.append((name, before, ms))
+    return regressions
+
+
+def suite_main(args):
+    results = run_suite(args.sizes)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        report(f'Suite baseline saved to {args.baseline}', results, 'ms')
+        return 0
+    try:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        report(f'Suite ({args.baseline} not found; run with --save-baseline first)', results, 'ms')
+        return 0
+    print('Suite against baseline')
+    for name, ms in results.items():
+        before = baseline.get(name)
+        change = f'{(ms / before - 1) * 100:+.1f}%' if before else 'new'
+        print(f'  {name:<28} {ms:>14,.3f} ms  {change}')
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    for name, before, ms in regressions:
+        print(f'REGRESSION {name}: {before:,.3f} ms -> {ms:,.3f} ms')
+    return 1 if regressions else 0
+
+
+def report(title, results, unit):
+    print(title)
+    for label, value in results.items():
+        precision = 3 if unit == 'ms' or abs(value) < 100 else 0
+        print(f"  {label:<28} {value:>14,.{precision}f} {unit}")
+
+
+BENCHMARKS = {
+    'ingest': ('SQLite ingestion, 5,000-process sweep', bench_ingest, 'rows/s'),
+    'scoring': ('Footprint scoring, 5,000-process sweep', bench_scoring, 'processes/s'),
+    'top_query': ('Top-20 by average memory', bench_top_query, 'ms'),
+    'startup': ('Headless startup to first sample', bench_startup, 'ms'),
+    'sweep': ('Process sweep, psutil vs /proc reader', bench_sweep, 'ms'),
+    'registry': ('Resident memory per tracked process', bench_registry, 'bytes'),
+    'fleet': ('Fleet ingestion, 500 simulated hosts on localhost', bench_fleet, ''),
+    'topk': ('Top-20 rankings, 20,000 processes', bench_topk, 'ms'),
+    'unused_license': ('Unused-license report, 1,000,000 history rows', bench_unused_license, ''),
+    'last_execution': ('Last-execution lookup, 50 programs over 200,000 pacct records', bench_last_execution, 'ms'),
+    'process_tree': ('Application rollup, 20,000 processes', bench_process_tree, ''),
+    'instrument': ('Self-instrumentation hooks', bench_instrument, 'ns/call'),
+    'capture': ('Record and replay, 2,000 processes at 5 s sweeps', bench_capture, ''),
+    'energy': ('Energy and CO2 accumulators', bench_energy, ''),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the collector's hot paths.")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--suite', action='store_true', help="run the regression suite instead")
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=list(SUITE_SIZES),
+                        help="suite table sizes (default: 1000,10000,50000)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f"suite baseline file (default: {BASELINE_FILE})")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f"allowed slowdown per stage as a fraction (default: {REGRESSION_THRESHOLD})")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    # python benchmarks.py [name ...]; runs everything by default
+    args = parse_args()
+    if args.suite:
+        sys.exit(suite_main(args))
+    for name in args.names or BENCHMARKS:
+        title, bench, unit = BENCHMARKS[name]
+        report(title, bench(), unit)
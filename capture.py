@@ -0,0 +1,326 @@
+import argparse
+import gzip
+import json
+import socket
+import time
+from datetime import datetime
+
+import psutil
+
+import scoring
+import store
+from proc_reader import default_sampler, SampledProcess, SyntheticSampler, MemoryInfo, IoCounters
+from license_catalog import LICENSE_COST_DATA_FILE
+
+# Record-and-replay of raw sweeps. The recorder writes what process_iter
+# returned, before any scoring, to a gzip-compressed capture file; the
+# replayer feeds a capture back through headless.HeadlessCollector (the same
+# scoring, storage, usage index and rollups as a live run) with the captured
+# timestamps, up to 1000x faster than it was recorded. Use it to take an
+# incident home from a production box, to backfill a fresh database, or to
+# re-score old history with a new power model or license catalog:
+#   python capture.py record incident.capture.gz --count 720
+#   python capture.py replay incident.capture.gz --store replay.db --power-model new_model.json
+#   python capture.py info incident.capture.gz
+#
+# Format: JSON lines. The first line is a header; then one line per sweep
+# holding only what changed since the previous sweep:
+#   {"t": epoch seconds, "r": [row, ...], "x": [[pid, create_time], ...], "s": [string, ...]}
+# r: processes that are new or whose row changed; x: processes that exited;
+# s: names and usernames first seen in this sweep. Rows refer to strings by
+# their index in the order they were introduced. Every line is flushed, so a
+# capture cut short by a crash is readable up to its last complete sweep.
+
+FORMAT = 'ecoscanner-capture'
+VERSION = 2  # 2 added cpu_time; version 1 rows read with cpu_time None
+FIELDS = ('pid', 'create_time', 'ppid', 'name', 'username', 'rss', 'vms', 'num_threads', 'cpu_percent', 'read_bytes', 'write_bytes', 'cpu_time')
+# process_iter attrs a recording always asks for, whatever its caller wants
+CAPTURE_ATTRS = frozenset(('pid', 'ppid', 'name', 'create_time', 'memory_info', 'num_threads', 'cpu_percent', 'cpu_times', 'username', 'io_counters'))
+COMPRESS_LEVEL = 6
+DEFAULT_SPEED = 1000.0  # Replay 1000x faster than real time; 0 means as fast as possible
+RECORD_INTERVAL = 5.0
+
+
+class CaptureWriter:
+    # Appends sweeps to a capture file, delta-encoded against the previous sweep
+
+    def __init__(self, path, compresslevel=COMPRESS_LEVEL):
+        self.path = path
+        self.file = gzip.open(path, 'wt', compresslevel=compresslevel, encoding='utf-8')
+        self.strings = {None: None}  # string -> index
+        self.previous = {}  # (pid, create_time) -> row
+        self.sweeps = 0
+        self.rows = 0  # Rows written, after delta encoding
+        header = {'format': FORMAT, 'version': VERSION, 'fields': FIELDS,
+                  'host': socket.gethostname(), 'cpu_count': psutil.cpu_count() or 1, 'started': time.time()}
+        self.file.write(json.dumps(header) + '\n')
+
+    def _intern(self, value, new):
+        index = self.strings.get(value)
+        if index is None and value is not None:
+            index = self.strings[value] = len(self.strings) - 1
+            new.append(value)
+        return index
+
+    def write(self, when, infos):
+        # when: epoch seconds; infos: process_iter info dicts
+        new = []
+        rows = {}
+        for info in infos:
+            memory = info.get('memory_info')
+            io = info.get('io_counters')
+            cpu = info.get('cpu_percent')
+            cpu_time = info.get('cpu_time')
+            row = (info['pid'], info['create_time'], info.get('ppid'),
+                   self._intern(info.get('name'), new), self._intern(info.get('username'), new),
+                   memory.rss if memory else None, memory.vms if memory else None,
+                   info.get('num_threads'), round(cpu, 2) if cpu is not None else None,
+                   io.read_bytes if io else None, io.write_bytes if io else None,
+                   round(cpu_time, 2) if cpu_time is not None else None)
+            rows[(row[0], row[1])] = row
+        previous = self.previous
+        record = {'t': round(when, 3), 'r': [row for key, row in rows.items() if previous.get(key) != row]}
+        gone = [list(key) for key in previous.keys() - rows.keys()]
+        if gone:
+            record['x'] = gone
+        if new:
+            record['s'] = new
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+        self.previous = rows
+        self.sweeps += 1
+        self.rows += len(record['r'])
+
+    def close(self):
+        self.file.close()
+
+
+class CaptureReader:
+    # Iterates a capture as (epoch seconds, {(pid, create_time): info dict}).
+    # The dict and the info dicts in it are reused from sweep to sweep, with
+    # only the changed processes replaced; copy them to keep a sweep. io_delta
+    # is rebuilt from the cumulative counters, as the samplers do.
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'rt', encoding='utf-8')
+        self.header = json.loads(self.file.readline())
+        if self.header.get('format') != FORMAT:
+            raise ValueError(f"{path} is not a capture file")
+        if self.header.get('version', 0) > VERSION:
+            raise ValueError(f"{path} is capture version {self.header['version']}; this reader supports up to {VERSION}")
+        self.strings = []
+        self.processes = {}
+        self.sweeps = 0
+        self.truncated = False
+
+    def __iter__(self):
+        strings = self.strings
+        processes = self.processes
+        with_delta = []  # Keys whose io_delta covers the previous sweep only
+        try:
+            for line in self.file:
+                record = json.loads(line)
+                strings.extend(record.get('s', ()))
+                for key in with_delta:
+                    info = processes.get(key)
+                    if info is not None:
+                        info['io_delta'] = None
+                with_delta = []
+                for pid, started in record.get('x', ()):
+                    processes.pop((pid, started), None)
+                for row in record['r']:
+                    pid, started, ppid, name, username, rss, vms, threads, cpu, read_bytes, write_bytes = row[:11]
+                    key = (pid, started)
+                    old = processes.get(key)
+                    io = IoCounters(read_bytes, write_bytes) if read_bytes is not None else None
+                    delta = None
+                    if io is not None and old is not None and old['io_counters'] is not None:
+                        delta = IoCounters(max(0, io.read_bytes - old['io_counters'].read_bytes),
+                                           max(0, io.write_bytes - old['io_counters'].write_bytes))
+                        with_delta.append(key)
+                    processes[key] = {
+                        'pid': pid,
+                        'ppid': ppid,
+                        'name': strings[name] if name is not None else None,
+                        'create_time': started,
+                        'memory_info': MemoryInfo(rss, vms) if rss is not None else None,
+                        'num_threads': threads,
+                        'cpu_percent': cpu,
+                        'cpu_time': row[11] if len(row) > 11 else None,
+                        'username': strings[username] if username is not None else None,
+                        'io_counters': io,
+                        'io_delta': delta,
+                    }
+                self.sweeps += 1
+                yield record['t'], processes
+        except (EOFError, ValueError):
+            # Cut off mid-write (e.g. the recorder was killed); stop at the last complete sweep
+            self.truncated = True
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingSampler:
+    # Wraps any sampler and writes every sweep that passes through
+    # process_iter() to a CaptureWriter, unchanged. Drop-in for the
+    # process_source of EcoScanner or headless.
+
+    def __init__(self, source, writer, clock=time.time):
+        self.source = source
+        self.writer = writer
+        self.clock = clock
+
+    def process_iter(self, attrs=None, refresh=None):
+        procs = list(self.source.process_iter(CAPTURE_ATTRS.union(attrs or ()), refresh=refresh))
+        self.writer.write(self.clock(), [proc.info for proc in procs])
+        return iter(procs)
+
+
+class ReplaySampler:
+    # The sampler interface over a capture: each advance() moves to the next
+    # recorded sweep and sets `now` to when it was taken; process_iter()
+    # yields that sweep. cpu_count is the recording host's, since cpu_percent
+    # is relative to its cores.
+
+    def __init__(self, path):
+        self.reader = CaptureReader(path)
+        self.cpu_count = self.reader.header.get('cpu_count')
+        self._sweeps = iter(self.reader)
+        self.now = None
+        self.processes = {}
+
+    def advance(self):
+        # False once the capture is exhausted
+        try:
+            self.now, self.processes = next(self._sweeps)
+        except StopIteration:
+            return False
+        return True
+
+    def process_iter(self, attrs=None, refresh=None):
+        for info in self.processes.values():
+            yield SampledProcess(info['pid'], info)
+
+    def close(self):
+        self.reader.close()
+
+
+def record(writer, source=None, interval=RECORD_INTERVAL, count=None, clock=time.time):
+    # Capture only: sample every `interval` seconds, no database
+    recorder = RecordingSampler(source or default_sampler(), writer, clock)
+    while count is None or writer.sweeps < count:
+        started = time.monotonic()
+        for _ in recorder.process_iter():
+            pass
+        if count is not None and writer.sweeps >= count:
+            break
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def replay(source, collector, speed=DEFAULT_SPEED, count=None):
+    # Feeds a ReplaySampler's sweeps through collector.sweep(), stamped with
+    # the captured times and spaced at 1/speed of the captured gaps (speed 0:
+    # no waiting). A sweep that takes longer than its slot just runs late.
+    # Returns the number of sweeps replayed.
+    first = None
+    wall_start = time.monotonic()
+    sweeps = 0
+    while (count is None or sweeps < count) and source.advance():
+        if first is None:
+            first = source.now
+        elif speed:
+            wait = (source.now - first) / speed - (time.monotonic() - wall_start)
+            if wait > 0:
+                time.sleep(wait)
+        collector.sweep(now=datetime.fromtimestamp(source.now))
+        sweeps += 1
+    return sweeps
+
+
+def info(path):
+    reader = CaptureReader(path)
+    try:
+        first = last = None
+        processes = 0
+        keys = set()
+        for when, table in reader:
+            first = when if first is None else first
+            last = when
+            processes += len(table)
+            keys.update(table)
+    finally:
+        reader.close()
+    header = reader.header
+    print(f"{path}: host {header.get('host')}, {header.get('cpu_count')} CPUs")
+    sweeps = reader.sweeps
+    if sweeps:
+        print(f"  {sweeps} sweeps, {datetime.fromtimestamp(first):%Y-%m-%d %H:%M:%S} to {datetime.fromtimestamp(last):%Y-%m-%d %H:%M:%S}")
+        print(f"  {processes / sweeps:,.0f} processes per sweep, {len(keys):,} distinct")
+    else:
+        print("  no sweeps")
+    if reader.truncated:
+        print("  truncated: the last sweep was incomplete and was skipped")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Record sweeps to a capture file, or replay one into a database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    recorder = commands.add_parser('record', help="capture sweeps of this host")
+    recorder.add_argument('capture', help="capture file to write (gzip)")
+    recorder.add_argument('--interval', type=float, default=RECORD_INTERVAL, help=f"seconds between sweeps (default: {RECORD_INTERVAL})")
+    recorder.add_argument('--count', type=int, default=None, help="stop after this many sweeps")
+    recorder.add_argument('--synthetic', type=int, default=None, metavar='N', help="record a synthetic table of N processes instead of this host")
+
+    replayer = commands.add_parser('replay', help="score and store a capture")
+    replayer.add_argument('capture', help="capture file to read")
+    replayer.add_argument('--store', default=store.DB_FILE, help=f"SQLite database path (default: {store.DB_FILE})")
+    replayer.add_argument('--license-file', default=LICENSE_COST_DATA_FILE, help=f"license cost catalog (default: {LICENSE_COST_DATA_FILE})")
+    replayer.add_argument('--power-model', default=scoring.POWER_MODEL_FILE, help=f"per-host power model (default: {scoring.POWER_MODEL_FILE})")
+    replayer.add_argument('--speed', type=float, default=DEFAULT_SPEED, help=f"times real time, 0 for as fast as possible (default: {DEFAULT_SPEED:g})")
+    replayer.add_argument('--count', type=int, default=None, help="stop after this many sweeps")
+
+    inspector = commands.add_parser('info', help="summarize a capture")
+    inspector.add_argument('capture', help="capture file to read")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'info':
+        info(args.capture)
+    elif args.command == 'record':
+        writer = CaptureWriter(args.capture)
+        try:
+            if args.synthetic:
+                # Stamped with the table's simulated time, so a replay spans interval_s per sweep
+                source = SyntheticSampler(args.synthetic)
+                record(writer, source, args.interval, args.count, clock=lambda: source.now)
+            else:
+                record(writer, None, args.interval, args.count)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
+        print(f"{writer.sweeps} sweeps written to {args.capture}")
+    else:
+        import headless  # Only replay needs the collector and its database
+        source = ReplaySampler(args.capture)
+        collector = headless.HeadlessCollector(args.store, args.license_file, args.power_model, source)
+        started = time.monotonic()
+        try:
+            sweeps = replay(source, collector, args.speed, args.count)
+        except KeyboardInterrupt:
+            sweeps = collector.sweeps
+        finally:
+            collector.close()
+            source.close()
+        print(f"{sweeps} sweeps replayed into {args.store} in {time.monotonic() - started:.1f} s")
+        if source.reader.truncated:
+            print("The capture was truncated; its incomplete last sweep was skipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import time
+import tkinter as tk
+from datetime import datetime, timedelta
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+
+# Analytics charts embedded in the main window. The scanners import this
+# module the first time a chart is shown, so startup doesn't pay for
+# matplotlib.
+
+RELOAD_DELAY_MS = 200  # Debounce for pan/zoom re-queries
+MIN_POINTS = 50
+BOX_WIDTH_PX = 25
+TICK_EVERY_S = 1.0  # Scanners that poll every few ms still redraw at most this often
+
+
+def canvas_width(canvas):
+    # Pixel width, falling back to the figure size before the widget is mapped
+    width = canvas.get_tk_widget().winfo_width()
+    return width if width > 1 else int(canvas.figure.bbox.width)
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps `threshold` points, choosing in
+    # each bucket the one that forms the largest triangle with the point kept
+    # before it and the average of the next bucket. Peaks and dips survive,
+    # unlike plain decimation. x must be sorted.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end >= next_end:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return x[kept], y[kept]
+
+
+class HourlySeries:
+    # Rollups-style series()/pick_resolution() over an in-memory dict of
+    # hourly running sums ({'time', 'samples', 'memory_sum', 'carbon_sum'}),
+    # for scanners without a rollup database
+
+    def __init__(self, hourly_data):
+        self.hourly_data = hourly_data
+
+    def pick_resolution(self, start, end, max_points=500):
+        return 'hour'
+
+    def series(self, start=None, end=None, resolution=None, max_points=500):
+        # Same row layout as Rollups.series(); CPU isn't tracked per hour here
+        rows = []
+        for entry in list(self.hourly_data.values()):
+            when = entry['time']
+            if (start is None or when >= start) and (end is None or when <= end) and entry['samples']:
+                average = entry['memory_sum'] / entry['samples']
+                rows.append((when, average, average, 0.0, 0.0, entry['carbon_sum']))
+        rows.sort()
+        return rows
+
+
+class TimeSeriesChart:
+    # Line chart over a Rollups-style source. The initial window is queried
+    # at the coarsest resolution that fits the canvas width and then reduced
+    # to one point per pixel with LTTB. tick() re-reads only the newest
+    # bucket(s) and appends them. Panning or zooming with the toolbar
+    # re-queries just the visible range; the chart follows new data again
+    # once the right edge is back at the latest point.
+    # lines: [(label, column in series() rows, color, 'left' | 'right')]
+
+    def __init__(self, parent, source, lines, title, window=timedelta(days=7)):
+        self.source = source
+        self.lines = lines
+        self.window = window
+        self.frame = tk.Frame(parent)
+        self.figure = Figure(figsize=(10, 4))
+        self.ax = self.figure.add_subplot()
+        self.axes = {'left': self.ax}
+        if any(axis == 'right' for _, _, _, axis in lines):
+            self.axes['right'] = self.ax.twinx()
+        self.artists = []
+        for label, column, color, axis in lines:
+            artist, = self.axes[axis].plot([], [], color=color, label=label)
+            self.axes[axis].set_ylabel(label, color=color)
+            self.artists.append(artist)
+        self.ax.set_title(title)
+        self.ax.grid(True)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(self.ax.xaxis.get_major_locator()))
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.frame)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.frame, pack_toolbar=False)
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        self.resolution = None
+        self.follow = True
+        self._setting_limits = False
+        self._reload_job = None
+        self._ticked_at = 0.0
+        self.ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+        now = datetime.now()
+        self.load(now - window, now)
+
+    def max_points(self):
+        return max(MIN_POINTS, canvas_width(self.canvas))
+
+    def load(self, start, end):
+        # Replace every line with the [start, end] range at screen resolution
+        max_points = self.max_points()
+        self.resolution = self.source.pick_resolution(start, end, max_points)
+        rows = self.source.series(start, end, self.resolution, max_points)
+        x = np.array([mdates.date2num(row[0]) for row in rows], dtype=float)
+        for artist, (_, column, _, _) in zip(self.artists, self.lines):
+            y = np.array([row[column] if row[column] is not None else np.nan for row in rows], dtype=float)
+            artist.set_data(*lttb(x, y, max_points))
+        self._set_xlim(mdates.date2num(start), mdates.date2num(end))
+        self._autoscale_y()
+        self.canvas.draw_idle()
+
+    def tick(self):
+        # Append buckets newer than the last plotted point; the last bucket
+        # itself is re-read because it is still accumulating samples
+        if not self.follow or not self.frame.winfo_ismapped() or time.monotonic() - self._ticked_at < TICK_EVERY_S:
+            return
+        self._ticked_at = time.monotonic()
+        last = self.artists[0].get_xdata()
+        since = mdates.num2date(last[-1]).replace(tzinfo=None) if len(last) else datetime.now() - self.window
+        rows = self.source.series(since, None, self.resolution)
+        if not rows:
+            return
+        first_new = mdates.date2num(rows[0][0])
+        new_x = np.array([mdates.date2num(row[0]) for row in rows], dtype=float)
+        max_points = self.max_points()
+        for artist, (_, column, _, _) in zip(self.artists, self.lines):
+            x, y = np.asarray(artist.get_xdata(), dtype=float), np.asarray(artist.get_ydata(), dtype=float)
+            keep = x < first_new
+            new_y = np.array([row[column] if row[column] is not None else np.nan for row in rows], dtype=float)
+            x, y = np.concatenate((x[keep], new_x)), np.concatenate((y[keep], new_y))
+            if len(x) > 2 * max_points:
+                x, y = lttb(x, y, max_points)
+            artist.set_data(x, y)
+        now = mdates.date2num(datetime.now())
+        self._set_xlim(now - self.window / timedelta(days=1), now)
+        self._autoscale_y()
+        self.canvas.draw_idle()
+
+    def _set_xlim(self, left, right):
+        self._setting_limits = True
+        try:
+            self.ax.set_xlim(left, right)
+        finally:
+            self._setting_limits = False
+
+    def _autoscale_y(self):
+        for ax in self.axes.values():
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+
+    def _on_xlim_changed(self, ax):
+        if self._setting_limits:
+            return
+        # User pan/zoom: debounce, then re-query only what is visible
+        if self._reload_job is not None:
+            self.frame.after_cancel(self._reload_job)
+        self._reload_job = self.frame.after(RELOAD_DELAY_MS, self._reload_visible)
+
+    def _reload_visible(self):
+        self._reload_job = None
+        left, right = self.ax.get_xlim()
+        start = mdates.num2date(left).replace(tzinfo=None)
+        end = mdates.num2date(right).replace(tzinfo=None)
+        self.follow = end >= datetime.now() - timedelta(minutes=1)
+        self.load(start, end)
+
+
+class BoxplotChart:
+    # Embedded box plot of per-hour value groups; only the most recent hours
+    # that fit the canvas width are drawn
+
+    def __init__(self, parent, title, ylabel):
+        self.frame = tk.Frame(parent)
+        self.figure = Figure(figsize=(10, 4))
+        self.ax = self.figure.add_subplot()
+        self.title = title
+        self.ylabel = ylabel
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def draw(self, groups):
+        # groups: {hour: [values]}
+        boxes = max(1, canvas_width(self.canvas) // BOX_WIDTH_PX)
+        hours = sorted(groups)[-boxes:]
+        self.ax.clear()
+        self.ax.boxplot([groups[hour] for hour in hours], vert=True, patch_artist=True)
+        self.ax.set_xticks(range(1, len(hours) + 1), labels=[hour.strftime('%m-%d %H:00') for hour in hours])
+        self.ax.set_xlabel('Time')
+        self.ax.set_ylabel(self.ylabel)
+        self.ax.set_title(self.title)
+        self.ax.tick_params(axis='x', labelrotation=45)
+        self.ax.grid(True)
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def tick(self):
+        pass
+
+
+class ChartPanel:
+    # Area under the process list that shows one chart at a time. toggle()
+    # builds a chart on first use and hides it on a second click.
+
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent)
+        self.charts = {}
+        self.current = None
+
+    def toggle(self, name, factory):
+        if self.current == name:
+            self.charts[name].frame.pack_forget()
+            self.frame.pack_forget()
+            self.current = None
+            return None
+        if self.current is not None:
+            self.charts[self.current].frame.pack_forget()
+        if not self.frame.winfo_ismapped():
+            self.frame.pack(fill=tk.BOTH, expand=True)
+        chart = self.charts.get(name)
+        if chart is None:
+            chart = self.charts[name] = factory(self.frame)
+        chart.frame.pack(fill=tk.BOTH, expand=True)
+        self.current = name
+        return chart
+
+    def tick(self):
+        if self.current is not None:
+            self.charts[self.current].tick()
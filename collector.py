@@ -0,0 +1,88 @@
+import queue
+import threading
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+import instrument
+
+# Immutable result of one sweep, handed from the collector thread to the UI
+# rankings maps each sort key to its top processes, so the UI can switch keys
+# without sorting; app_rankings / apps do the same for applications in tree mode
+Snapshot = namedtuple('Snapshot', ['taken_at', 'processes', 'top_processes', 'hourly', 'rankings', 'app_rankings', 'apps'])
+
+
+def freeze(mapping):
+    # Shallow-copy a dict into a read-only view so the UI can't race the collector
+    return MappingProxyType(dict(mapping))
+
+
+class Collector(threading.Thread):
+    # Runs sweep() every `interval` seconds off the Tk main loop and publishes
+    # the resulting Snapshot on a queue. Only the newest snapshot is kept: if
+    # the UI falls behind, stale ones are dropped instead of piling up.
+    # delay, if given, is called after each sweep for the seconds to wait
+    # instead (e.g. SamplingScheduler.delay).
+
+    def __init__(self, sweep, interval=5.0, delay=None):
+        super().__init__(name='collector', daemon=True)
+        self.sweep = sweep
+        self.interval = interval
+        self.delay = delay
+        self.snapshots = queue.Queue(maxsize=1)
+        instrument.gauge_callback('queue_depth', self.snapshots.qsize, queue='snapshots')
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                snapshot = self.sweep()
+            except Exception as e:
+                print(f"Error during process sweep: {e}")
+            else:
+                instrument.inc('sweeps_total')
+                if snapshot is not None:
+                    self._publish(snapshot)
+            self._wake.wait(self.delay() if self.delay is not None else self.interval)
+            self._wake.clear()
+
+    def _publish(self, snapshot):
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def request_sweep(self):
+        # Ask for a sweep now instead of waiting for the next interval
+        self._wake.set()
+
+    def latest(self):
+        # Newest snapshot published since the last call, or None
+        snapshot = None
+        while True:
+            try:
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+
+def make_snapshot(processes, top_processes, hourly, taken_at=None, rankings=None, app_rankings=None, apps=None):
+    return Snapshot(
+        taken_at=taken_at or datetime.now(),
+        processes=freeze(processes),
+        top_processes=tuple(top_processes),
+        hourly=freeze(hourly),
+        rankings=freeze({key: tuple(ranked) for key, ranked in (rankings or {}).items()}),
+        app_rankings=freeze({key: tuple(ranked) for key, ranked in app_rankings.items()}) if app_rankings is not None else None,
+        apps=freeze(apps) if apps is not None else None,
+    )
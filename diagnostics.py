@@ -0,0 +1,59 @@
+import tkinter as tk
+from tkinter import ttk
+
+import instrument
+
+REFRESH_MS = 1000
+
+
+class DiagnosticsWindow:
+    # The monitor's own metrics (instrument.Registry.summary()) in a
+    # Toplevel, refreshed every REFRESH_MS while it is open. Opening it turns
+    # instrumentation on; it stays on after the window is closed.
+
+    def __init__(self, root):
+        self.root = root
+        self.registry = instrument.enable()
+        self.window = tk.Toplevel(root)
+        self.window.title("Diagnostics")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = tk.Frame(self.window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(frame, columns=("Metric", "Value"), show="headings", height=20)
+        tree.heading("Metric", text="Metric")
+        tree.heading("Value", text="Value")
+        tree.column("Metric", width=360)
+        tree.column("Value", width=360)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(fill=tk.BOTH, expand=True)
+        # A plain Treeview: a few dozen rows, and its updates shouldn't show
+        # up in render_seconds
+        self.tree = tree
+        self._job = None
+        self.refresh()
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+        tree = self.tree
+        for index, (metric, value) in enumerate(self.registry.summary()):
+            if tree.exists(metric):
+                tree.set(metric, "Value", value)
+            else:
+                tree.insert('', index, iid=metric, values=(metric, value))
+        self._job = self.root.after(REFRESH_MS, self.refresh)
+
+    def exists(self):
+        return self.window.winfo_exists()
+
+    def lift(self):
+        self.window.lift()
+
+    def close(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        self.window.destroy()
@@ -0,0 +1,224 @@
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import instrument
+import scoring
+
+# Running energy and CO2 totals per process and per application, integrated
+# over the real time between samples instead of scoring each sample as if
+# it covered an hour. CPU energy comes from the process's CPU-time delta
+# (user + system seconds, the samplers' 'cpu_time'); where a source has no
+# CPU time, the sampled CPU% over the gap stands in. Memory energy is the
+# average of the two samples' resident size over the gap. Each sample is a
+# dict lookup and a few additions; reading a total is a lookup too.
+#
+# Totals are written to SQLite every FLUSH_EVERY_S and on close(), together
+# with each process's last CPU time and sample time. After a restart a
+# process that is still running picks up from those, so the CPU time it used
+# while nothing was watching is still counted. Applications not seen since
+# the previous flush are dropped from memory then, and reloaded from their
+# row if they come back.
+
+FLUSH_EVERY_S = 60.0
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+EnergyTotals = namedtuple('EnergyTotals', ['cpu_seconds', 'energy_kwh', 'carbon_kg'])
+
+
+class Accumulator:
+    # One process: its last sample and what it has used since it was first seen
+    __slots__ = ('name', 'cpu_time', 'memory_mb', 'sampled_at', 'cpu_seconds', 'energy_kwh', 'carbon_kg', 'interval_carbon_kg')
+
+    def __init__(self, name, cpu_time, memory_mb, sampled_at, cpu_seconds=0.0, energy_kwh=0.0, carbon_kg=0.0):
+        self.name = name
+        self.cpu_time = cpu_time
+        self.memory_mb = memory_mb
+        self.sampled_at = sampled_at
+        self.cpu_seconds = cpu_seconds
+        self.energy_kwh = energy_kwh
+        self.carbon_kg = carbon_kg
+        self.interval_carbon_kg = 0.0  # Added by the latest sample
+
+    def totals(self):
+        return EnergyTotals(self.cpu_seconds, self.energy_kwh, self.carbon_kg)
+
+
+class EnergyLedger:
+    # update() takes one sweep; process() and app() read the totals, from
+    # memory for live processes and known applications, otherwise from the
+    # tables. Applications are keyed by executable name, like app_stats.
+    # energy_processes keeps one row per process ever seen; track its
+    # last_seen column (indexed) with RetentionManager.track_table to age
+    # rows out.
+
+    PROCESS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS energy_processes (
+            pid INTEGER NOT NULL,
+            create_time REAL NOT NULL,
+            name TEXT,
+            cpu_time REAL,
+            memory_mb REAL NOT NULL,
+            sampled_at REAL NOT NULL,
+            cpu_seconds REAL NOT NULL,
+            energy_kwh REAL NOT NULL,
+            carbon_kg REAL NOT NULL,
+            last_seen TEXT NOT NULL,
+            PRIMARY KEY (pid, create_time)
+        )
+    '''
+    APP_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS energy_apps (
+            name TEXT PRIMARY KEY,
+            cpu_seconds REAL NOT NULL,
+            energy_kwh REAL NOT NULL,
+            carbon_kg REAL NOT NULL,
+            last_seen TEXT NOT NULL
+        )
+    '''
+    INDEXES = (
+        'CREATE INDEX IF NOT EXISTS idx_energy_processes_last_seen ON energy_processes (last_seen)',
+    )
+    PROCESS_UPSERT = '''
+        INSERT OR REPLACE INTO energy_processes (pid, create_time, name, cpu_time, memory_mb, sampled_at, cpu_seconds, energy_kwh, carbon_kg, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    APP_UPSERT = '''
+        INSERT OR REPLACE INTO energy_apps (name, cpu_seconds, energy_kwh, carbon_kg, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, conn, model=scoring.DEFAULT_POWER_MODEL, cpu_count=1, flush_every_s=FLUSH_EVERY_S):
+        self.conn = conn
+        self.model = model
+        self.cpu_count = cpu_count
+        self.flush_every_s = flush_every_s
+        self.processes = {}  # (pid, create_time) -> Accumulator, live processes only
+        self.apps = {}  # name -> [cpu_seconds, energy_kwh, carbon_kg], seen since the last flush
+        self.sweep_carbon_kg = 0.0  # Emitted by all processes since the previous sweep
+        self._retired = {}  # key -> Accumulator, exited since the last flush
+        self._dirty_apps = set()
+        self._flushed_at = time.monotonic()
+        with conn:
+            conn.execute(self.PROCESS_SCHEMA)
+            conn.execute(self.APP_SCHEMA)
+            for statement in self.INDEXES:
+                conn.execute(statement)
+        # Processes that started after this can't have a saved row, and are
+        # counted from their start rather than from when they were first seen
+        self.previous_sweep = conn.execute('SELECT MAX(sampled_at) FROM energy_processes').fetchone()[0]
+
+    def _resume(self, key):
+        row = self.conn.execute('''
+            SELECT name, cpu_time, memory_mb, sampled_at, cpu_seconds, energy_kwh, carbon_kg
+            FROM energy_processes WHERE pid = ? AND create_time = ?
+        ''', key).fetchone()
+        return Accumulator(*row) if row is not None else None
+
+    def _app(self, name):
+        totals = self.apps.get(name)
+        if totals is None:
+            row = self.conn.execute('SELECT cpu_seconds, energy_kwh, carbon_kg FROM energy_apps WHERE name = ?', (name,)).fetchone()
+            totals = self.apps[name] = list(row) if row is not None else [0.0, 0.0, 0.0]
+        return totals
+
+    def update(self, now, sweep):
+        # now: epoch seconds of the sweep; sweep: (pid, create_time, name,
+        # cpu_time, cpu_percent, memory_mb) for every live process, with
+        # cpu_time the user + system seconds (None if unknown) and
+        # cpu_percent relative to one core, as psutil reports it. Returns
+        # the Accumulators in sweep order.
+        processes = self.processes
+        previous_sweep = self.previous_sweep
+        model = self.model
+        cpu_count = self.cpu_count
+        emissions_factor = model.emissions_factor_kg_co2_per_kwh
+        energy_kwh = scoring.interval_energy_kwh
+        dirty_apps = self._dirty_apps
+        accumulators = []
+        sweep_carbon_kg = 0.0
+        for pid, create_time, name, cpu_time, cpu_percent, memory_mb in sweep:
+            key = (pid, create_time)
+            acc = processes.get(key)
+            if acc is None:
+                if previous_sweep is not None and create_time > previous_sweep:
+                    # Started since the last sweep: count it from its start
+                    acc = Accumulator(name, 0.0, memory_mb, create_time)
+                else:
+                    acc = self._resume(key) if previous_sweep is not None else None
+                    if acc is None:
+                        # Running before we were; only what follows is counted
+                        acc = Accumulator(name, cpu_time, memory_mb, now)
+                processes[key] = acc
+            elapsed = now - acc.sampled_at
+            acc.interval_carbon_kg = 0.0
+            if elapsed > 0:
+                if cpu_time is not None and acc.cpu_time is not None:
+                    cpu_seconds = max(0.0, cpu_time - acc.cpu_time)
+                else:
+                    cpu_seconds = (cpu_percent or 0.0) / 100 * elapsed
+                kwh = energy_kwh(cpu_seconds, (acc.memory_mb + memory_mb) / 2, elapsed, cpu_count, model)
+                carbon = kwh * emissions_factor
+                acc.cpu_seconds += cpu_seconds
+                acc.energy_kwh += kwh
+                acc.carbon_kg += carbon
+                acc.interval_carbon_kg = carbon
+                sweep_carbon_kg += carbon
+                if name is not None:
+                    app = self._app(name)
+                    app[0] += cpu_seconds
+                    app[1] += kwh
+                    app[2] += carbon
+                    dirty_apps.add(name)
+            acc.name = name
+            acc.cpu_time = cpu_time
+            acc.memory_mb = memory_mb
+            acc.sampled_at = now
+            accumulators.append(acc)
+
+        if len(processes) > len(accumulators):
+            seen = {(entry[0], entry[1]) for entry in sweep}
+            for key in [key for key in processes if key not in seen]:
+                self._retired[key] = processes.pop(key)
+        self.sweep_carbon_kg = sweep_carbon_kg
+        self.previous_sweep = now
+        if time.monotonic() - self._flushed_at >= self.flush_every_s:
+            self.flush()
+        return accumulators
+
+    def process(self, pid, create_time):
+        # EnergyTotals of one process, live or not; None if never seen
+        key = (pid, create_time)
+        acc = self.processes.get(key)
+        if acc is None:
+            acc = self._retired.get(key) or self._resume(key)
+        return acc.totals() if acc is not None else None
+
+    def app(self, name):
+        # EnergyTotals of every process ever seen with this executable name
+        totals = self.apps.get(name)
+        if totals is None:
+            row = self.conn.execute('SELECT cpu_seconds, energy_kwh, carbon_kg FROM energy_apps WHERE name = ?', (name,)).fetchone()
+            return EnergyTotals(*row) if row is not None else None
+        return EnergyTotals(*totals)
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+        if self.previous_sweep is None:
+            return
+        last_seen = datetime.fromtimestamp(self.previous_sweep).strftime(TIME_FORMAT)
+        rows = [(key[0], key[1], acc.name, acc.cpu_time, acc.memory_mb, acc.sampled_at, acc.cpu_seconds, acc.energy_kwh, acc.carbon_kg,
+                 last_seen if acc.sampled_at == self.previous_sweep else datetime.fromtimestamp(acc.sampled_at).strftime(TIME_FORMAT))
+                for key, acc in list(self.processes.items()) + list(self._retired.items())]
+        apps = [(name,) + tuple(self.apps[name]) + (last_seen,) for name in self._dirty_apps]
+        with instrument.timed('db_commit_seconds', table='energy'), self.conn:
+            self.conn.executemany(self.PROCESS_UPSERT, rows)
+            self.conn.executemany(self.APP_UPSERT, apps)
+        instrument.inc('rows_written_total', len(rows) + len(apps), destination='energy')
+        self._retired = {}
+        # Everything is saved now; keep only the applications still running
+        self.apps = {name: self.apps[name] for name in self._dirty_apps}
+        self._dirty_apps = set()
+
+    def close(self):
+        self.flush()
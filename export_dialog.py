@@ -0,0 +1,110 @@
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from exporter import FORMATS
+
+POLL_MS = 200
+
+
+class ExportDialog:
+    # Export options (format, file, time range, columns) with a progress bar
+    # and Cancel. start_job(path, columns, start, end) must return a started
+    # exporter.ExportJob; the dialog only polls it, so the UI stays live.
+
+    def __init__(self, root, columns, start_job, filename='process_data.xlsx', time_range=True):
+        self.root = root
+        self.start_job = start_job
+        self.job = None
+        self.window = tk.Toplevel(root)
+        self.window.title("Export")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        options = tk.Frame(self.window)
+        options.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(options, text="File").grid(row=0, column=0, sticky=tk.W)
+        self.filename = tk.StringVar(value=filename)
+        tk.Entry(options, textvariable=self.filename, width=40).grid(row=0, column=1, sticky=tk.EW)
+        tk.Label(options, text="Format").grid(row=1, column=0, sticky=tk.W)
+        self.format = tk.StringVar(value=os.path.splitext(filename)[1].lstrip('.') or FORMATS[0])
+        ttk.Combobox(options, textvariable=self.format, values=FORMATS, state='readonly', width=10).grid(row=1, column=1, sticky=tk.W)
+        self.format.trace_add('write', self._on_format)
+        self.start = tk.StringVar()
+        self.end = tk.StringVar()
+        if time_range:
+            tk.Label(options, text="From (YYYY-MM-DD HH:MM:SS)").grid(row=2, column=0, sticky=tk.W)
+            tk.Entry(options, textvariable=self.start).grid(row=2, column=1, sticky=tk.EW)
+            tk.Label(options, text="To").grid(row=3, column=0, sticky=tk.W)
+            tk.Entry(options, textvariable=self.end).grid(row=3, column=1, sticky=tk.EW)
+
+        column_frame = tk.LabelFrame(self.window, text="Columns")
+        column_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.columns = []
+        for i, (column, heading) in enumerate(columns):
+            selected = tk.BooleanVar(value=True)
+            tk.Checkbutton(column_frame, text=heading, variable=selected).grid(row=i // 2, column=i % 2, sticky=tk.W)
+            self.columns.append((column, selected))
+
+        self.progress = ttk.Progressbar(self.window, length=300, mode='determinate', maximum=1.0)
+        self.progress.pack(fill=tk.X, padx=10, pady=5)
+        self.status = tk.Label(self.window, text="")
+        self.status.pack()
+
+        buttons = tk.Frame(self.window)
+        buttons.pack(pady=5)
+        self.export_button = tk.Button(buttons, text="Export", command=self.export)
+        self.export_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+    def _on_format(self, *args):
+        base = os.path.splitext(self.filename.get())[0]
+        self.filename.set(f'{base}.{self.format.get()}')
+
+    def export(self):
+        columns = [column for column, selected in self.columns if selected.get()]
+        if not columns:
+            messagebox.showwarning("Export", "Select at least one column.", parent=self.window)
+            return
+        try:
+            self.job = self.start_job(self.filename.get(), columns, self.start.get() or None, self.end.get() or None)
+        except ValueError as e:
+            messagebox.showerror("Export", str(e), parent=self.window)
+            return
+        self.export_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress.config(mode='indeterminate')
+        self.progress.start()
+        self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        if not self.window.winfo_exists():
+            return  # Closed mid-export; close() already cancelled the job
+        job = self.job
+        fraction = job.progress()
+        if fraction is not None and str(self.progress.cget('mode')) == 'indeterminate':
+            self.progress.stop()
+            self.progress.config(mode='determinate')
+        if fraction is not None:
+            self.progress['value'] = fraction
+        self.status.config(text=f"{job.rows_written:,} of {job.total_rows:,} rows" if job.total_rows is not None else "Counting rows...")
+        if not job.done:
+            self.root.after(POLL_MS, self._poll)
+            return
+        self.export_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if job.error is not None:
+            messagebox.showerror("Export", f"Export failed: {job.error}", parent=self.window)
+        elif job.cancelled:
+            self.status.config(text="Export cancelled")
+        else:
+            messagebox.showinfo("Export", f"Process data exported successfully to {job.path}.", parent=self.window)
+            self.close()
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def close(self):
+        self.cancel()
+        self.window.destroy()
@@ -0,0 +1,294 @@
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+
+import instrument
+import store
+
+# Streaming export of process history to XLSX, CSV or Parquet. Rows are read
+# from a cursor in chunks and written as they arrive, so memory stays flat
+# regardless of table size. Run from a GUI through TableExportJob, or with:
+#   python exporter.py process_data.csv --start "2024-01-01 00:00:00"
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+CHUNK_ROWS = 5000
+XLSX_MAX_ROWS = 1_048_576  # Per sheet, including the header
+SHEET_NAME = 'Process Data'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Column -> heading for the processes table in store.PROCESS_SCHEMA
+PROCESS_HEADINGS = {
+    'name': "Process Name",
+    'memory_usage': "Memory Usage (MB)",
+    'num_threads': "Thread Count",
+    'cpu_usage': "CPU Usage (%)",
+    'carbon_footprint': "Carbon Footprint (kg CO2)",
+    'carbon_kg': "Carbon Emitted (kg CO2)",
+    'license_cost': "License Cost ($)",
+    'sustainability_rating': "Sustainability Rating",
+    'create_time': "Creation Time",
+    'username': "Username",
+    'sample_time': "Sample Time",
+    'pid': "PID",
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def format_for(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported export format: {extension or path}")
+    return extension
+
+
+def _time_range(time_column, start, end):
+    # WHERE clause and parameters for an inclusive [start, end] range
+    where, params = [], []
+    if time_column is not None:
+        for operator, bound in (('>=', start), ('<=', end)):
+            if bound is not None:
+                where.append(f'{time_column} {operator} ?')
+                params.append(bound.strftime(TIME_FORMAT) if hasattr(bound, 'strftime') else bound)
+    return (' WHERE ' + ' AND '.join(where) if where else ''), params
+
+
+def query_chunks(conn, table, columns, time_column=None, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    # Yields lists of at most chunk_rows rows. With a time column the scan
+    # follows its index, so a range only reads the rows it returns.
+    where, params = _time_range(time_column, start, end)
+    sql = f"SELECT {', '.join(columns)} FROM {table}{where}"
+    sql += f' ORDER BY {time_column}' if time_column is not None else ' ORDER BY rowid'
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        yield rows
+
+
+def count_rows(conn, table, time_column=None, start=None, end=None):
+    where, params = _time_range(time_column, start, end)
+    sql = f'SELECT COUNT(*) FROM {table}{where}'
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def column_types(conn, table, columns):
+    # Declared SQLite type per column, used for the Parquet schema
+    declared = {row[1]: (row[2] or '').upper() for row in conn.execute(f'PRAGMA table_info({table})')}
+    return [declared.get(column, '') for column in columns]
+
+
+class CsvSink:
+    def __init__(self, path, headings, types):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(headings)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxSink:
+    # constant_memory flushes each row to disk once the next one starts, so
+    # the workbook never holds more than a row in memory. Rows past the sheet
+    # limit continue on "Process Data 2", "Process Data 3", ...
+
+    def __init__(self, path, headings, types):
+        import xlsxwriter
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.headings = headings
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        name = SHEET_NAME if self.sheets == 1 else f'{SHEET_NAME} {self.sheets}'
+        self.sheet = self.workbook.add_worksheet(name)
+        self.sheet.write_row(0, 0, self.headings)
+        self.row = 1
+
+    def write(self, rows):
+        for values in rows:
+            if self.row >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.write_row(self.row, 0, values)
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class ParquetSink:
+    # One row group per chunk
+    ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64'}
+
+    def __init__(self, path, headings, types):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([(heading, getattr(pa, self.ARROW_TYPES.get(declared, 'string'))()) for heading, declared in zip(headings, types)])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = [[] for _ in self.schema]
+        for values in rows:
+            for column, value in zip(columns, values):
+                column.append(value)
+        arrays = [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+SINKS = {'xlsx': XlsxSink, 'csv': CsvSink, 'parquet': ParquetSink}
+
+
+def export(path, headings, chunks, types=None, fmt=None, progress=None, cancel=None):
+    # Writes every chunk to path; returns the number of rows. The file is
+    # built under a temporary name and only moved into place once complete,
+    # so a cancelled or failed export never leaves a truncated file behind.
+    fmt = fmt or format_for(path)
+    types = types or [''] * len(headings)
+    partial = path + '.partial'
+    sink = SINKS[fmt](partial, list(headings), types)
+    rows_written = 0
+    try:
+        for rows in chunks:
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled(path)
+            with instrument.timed('export_seconds', format=fmt):
+                sink.write(rows)
+            rows_written += len(rows)
+            instrument.inc('rows_written_total', len(rows), destination=f'export_{fmt}')
+            if progress is not None:
+                progress(rows_written)
+    except BaseException:
+        sink.close()
+        os.remove(partial)
+        raise
+    sink.close()
+    os.replace(partial, path)
+    return rows_written
+
+
+class ExportJob(threading.Thread):
+    # Runs an export off the UI thread. The UI polls progress() and done;
+    # cancel() stops it after the current chunk. error holds the exception
+    # if the export failed. read() -> (total, chunks, types) runs on the job's
+    # thread; on_close(), if given, runs there once the export has finished.
+
+    def __init__(self, path, headings, read, fmt=None, on_close=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.headings = list(headings)
+        self.read = read
+        self.on_close = on_close
+        self.fmt = fmt or format_for(path)
+        self.total_rows = None
+        self.rows_written = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self):
+        # Fraction complete, or None until the row count is known
+        if not self.total_rows:
+            return 1.0 if self.done else None
+        return min(1.0, self.rows_written / self.total_rows)
+
+    def _set_rows_written(self, rows):
+        self.rows_written = rows
+
+    def run(self):
+        try:
+            self.total_rows, chunks, types = self.read()
+            export(self.path, self.headings, chunks, types, self.fmt, self._set_rows_written, self._cancel)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+            self.done = True
+
+
+class TableExportJob(ExportJob):
+    # One table, optionally limited to a time range, read through its own
+    # connection (WAL lets it run while the collector keeps writing)
+
+    def __init__(self, db_path, path, table='processes', columns=None, time_column='sample_time', start=None, end=None,
+                 fmt=None, headings=PROCESS_HEADINGS, chunk_rows=CHUNK_ROWS):
+        self.columns = list(columns or [column for column in headings if column != 'pid'])
+        super().__init__(path, [headings.get(column, column) for column in self.columns], self._read, fmt, self._close)
+        self.db_path = db_path
+        self.table = table
+        self.time_column = time_column
+        self.start_time = start
+        self.end_time = end
+        self.chunk_rows = chunk_rows
+        self.conn = None
+
+    def _read(self):
+        self.conn = sqlite3.connect(self.db_path)
+        total = count_rows(self.conn, self.table, self.time_column, self.start_time, self.end_time)
+        chunks = query_chunks(self.conn, self.table, self.columns, self.time_column, self.start_time, self.end_time, self.chunk_rows)
+        return total, chunks, column_types(self.conn, self.table, self.columns)
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class RowsExportJob(ExportJob):
+    # Rows already in memory, e.g. the latest snapshot
+
+    def __init__(self, path, headings, rows, types=None, fmt=None, chunk_rows=CHUNK_ROWS):
+        super().__init__(path, headings, self._read, fmt)
+        self.rows = rows
+        self.types = types
+        self.chunk_rows = chunk_rows
+
+    def _read(self):
+        rows = self.rows
+        return len(rows), (rows[i:i + self.chunk_rows] for i in range(0, len(rows), self.chunk_rows)), self.types
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export process history without loading it into memory.")
+    parser.add_argument('output', help="destination file; format from the extension (.xlsx, .csv, .parquet)")
+    parser.add_argument('--store', default=store.DB_FILE, help=f"SQLite database path (default: {store.DB_FILE})")
+    parser.add_argument('--start', default=None, help="first sample time, e.g. '2024-01-01 00:00:00'")
+    parser.add_argument('--end', default=None, help="last sample time")
+    parser.add_argument('--columns', default=None, help="comma-separated column names (default: all)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    columns = args.columns.split(',') if args.columns else None
+    job = TableExportJob(args.store, args.output, columns=columns, start=args.start, end=args.end)
+    job.run()
+    if job.error is not None:
+        raise SystemExit(f"Export failed: {job.error}")
+    print(f"Exported {job.rows_written:,} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,579 @@
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import store
+from retention import RetentionManager
+
+# Fleet mode: agents on each machine push batched, compressed sweep deltas
+# over HTTP to one aggregator, which writes them into host-partitioned
+# copies of the all-db-sys-1.py schema. Run with:
+#   python fleet.py aggregator --bind 0.0.0.0 --port 8765 --dir fleet
+#   python fleet.py agent --aggregator http://aggregator:8765 --interval 60
+#   python fleet.py simulate --aggregator http://127.0.0.1:8765 --hosts 500
+
+FLEET_DIR = 'fleet'
+DEFAULT_PORT = 8765
+SHARDS = 4
+BATCH_SWEEPS = 5
+MAX_PENDING_SWEEPS = 1000
+MAX_BODY_BYTES = 16 * 1024 * 1024  # Compressed, as sent
+MAX_BATCH_BYTES = 64 * 1024 * 1024  # After decompression
+PROCESS_ROW_TTL = timedelta(days=90)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Raw rows are the processes table with the reporting host in front
+FLEET_COLUMNS = ('host',) + store.PROCESS_COLUMNS
+FLEET_SCHEMA = store.PROCESS_SCHEMA.replace('id INTEGER PRIMARY KEY,', 'id INTEGER PRIMARY KEY,\n        host TEXT NOT NULL,')
+FLEET_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_processes_host_time ON processes (host, sample_time)',
+    'CREATE INDEX IF NOT EXISTS idx_processes_sample_time ON processes (sample_time)',
+)
+
+
+def shard_for(host, shards):
+    # Stable across runs, unlike hash()
+    return zlib.crc32(host.encode('utf-8')) % shards
+
+
+class DeltaEncoder:
+    # Agent side. Each sweep is sent as the processes that are new or whose
+    # quantized values changed since the last sweep, plus the keys of the
+    # processes that exited. Processes are keyed by (pid, create_time), so a
+    # reused PID is a new process. Memory and CPU are compared at 0.1
+    # resolution; below that a process counts as unchanged and the aggregator
+    # repeats the last values it was sent.
+
+    def __init__(self):
+        self.sent = {}  # (pid, create_time) -> quantized signature
+        self.seq = 0
+
+    def reset(self):
+        # Next sweep goes out in full
+        self.sent = {}
+
+    def encode(self, rows):
+        full = not self.sent
+        changed = []
+        current = {}
+        for row in rows:
+            create_time = str(row[8])
+            key = (row[0], create_time)
+            signature = (row[1], round(row[2], 1), row[3], round(row[4], 1), row[6], row[7], row[9])
+            current[key] = signature
+            if self.sent.get(key) != signature:
+                changed.append([row[0], row[1], round(row[2], 1), row[3], round(row[4], 1), row[5], row[6], row[7], create_time, row[9]])
+        gone = [list(key) for key in self.sent if key not in current]
+        self.sent = current
+        self.seq += 1
+        sample_time = rows[0][10] if rows else datetime.now().strftime(TIME_FORMAT)
+        return {'q': self.seq, 't': sample_time, 'f': int(full), 'c': changed, 'g': gone}
+
+
+class FleetAgent:
+    # Buffers encoded sweeps and pushes them as one deflate-compressed JSON
+    # body every batch_sweeps sweeps. Unsent sweeps are kept and retried; if
+    # the backlog reaches max_pending it is dropped and the next sweep is
+    # sent in full, first in the batch. A 409 from the aggregator (it lost this host's
+    # state, e.g. after a restart) also triggers a full sweep. Each agent
+    # sends a random session id so the aggregator can tell a restarted agent,
+    # whose sweep numbers start over, from a retried batch.
+
+    def __init__(self, url, host=None, batch_sweeps=BATCH_SWEEPS, max_pending=MAX_PENDING_SWEEPS, timeout=10.0):
+        url = urlparse(url)
+        self.address = (url.hostname, url.port or DEFAULT_PORT)
+        self._connection = None  # Kept open between pushes
+        self.host = host or socket.gethostname()
+        self.session = random.getrandbits(63)
+        self.batch_sweeps = batch_sweeps
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.encoder = DeltaEncoder()
+        self.pending = []
+        self.bytes_sent = 0
+        self.rows_sent = 0
+
+    def add_sweep(self, rows):
+        if len(self.pending) >= self.max_pending:
+            # Older deltas would leave a gap before the full sweep
+            self.pending = []
+            self.encoder.reset()
+        self.pending.append(self.encoder.encode(rows))
+        if len(self.pending) >= self.batch_sweeps:
+            return self.push()
+        return False
+
+    def push(self):
+        if not self.pending:
+            return True
+        body = zlib.compress(json.dumps({'h': self.host, 'i': self.session, 's': self.pending}, separators=(',', ':')).encode('utf-8'))
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(*self.address, timeout=self.timeout)
+            self._connection.request('POST', '/ingest', body, {'Content-Type': 'application/json', 'Content-Encoding': 'deflate'})
+            response = self._connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Aggregator unreachable; keep the batch for the next push
+            self._connection.close()
+            self._connection = None
+            return False
+        if response.status == 409:
+            # Aggregator has no base for these deltas; start over with a full sweep
+            self.pending = []
+            self.encoder.reset()
+            return False
+        if response.status != 200:
+            return False
+        self.bytes_sent += len(body)
+        self.rows_sent += sum(len(sweep['c']) for sweep in self.pending)
+        self.pending = []
+        return True
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class ResyncNeeded(Exception):
+    pass
+
+
+class HostState:
+    __slots__ = ('lock', 'session', 'seq', 'live')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = None
+        self.seq = 0
+        self.live = {}  # (pid, create_time) -> last row sent by the agent
+
+    def apply(self, host, session, sweeps):
+        # Materialize every sweep in the batch as full processes rows. The
+        # batch is applied to copies, kept only if every sweep in it is valid.
+        rows = []
+        with self.lock:
+            if session != self.session:
+                # Restarted agent: its sweep numbers start over
+                seq = 0
+                live = {}
+            else:
+                seq = self.seq
+                live = dict(self.live)
+            for sweep in sweeps:
+                if sweep['q'] <= seq:
+                    continue  # Retried batch we already ingested, full sweeps included
+                if sweep['f']:
+                    live = {}
+                elif sweep['q'] != seq + 1:
+                    raise ResyncNeeded(host)
+                for key in sweep['g']:
+                    live.pop(tuple(key), None)
+                for row in sweep['c']:
+                    live[(row[0], row[8])] = row
+                seq = sweep['q']
+                sample_time = sweep['t']
+                rows.extend([host] + row + [sample_time] for row in live.values())
+            self.session = session
+            self.seq = seq
+            self.live = live
+        return rows
+
+
+class HostAppStats:
+    # app_stats keyed by (host, name); same running aggregates as
+    # store.AppStats, folded in from each flushed batch
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS app_stats (
+            host TEXT NOT NULL,
+            name TEXT NOT NULL,
+            sample_count INTEGER NOT NULL,
+            memory_sum REAL NOT NULL,
+            memory_max REAL NOT NULL,
+            threads_sum REAL NOT NULL,
+            cpu_sum REAL NOT NULL,
+            carbon_sum REAL NOT NULL,
+            license_cost REAL,
+            last_seen TEXT,
+            PRIMARY KEY (host, name)
+        )
+    '''
+    UPSERT = '''
+        INSERT INTO app_stats (host, name, sample_count, memory_sum, memory_max, threads_sum, cpu_sum, carbon_sum, license_cost, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(host, name) DO UPDATE SET
+            sample_count = sample_count + excluded.sample_count,
+            memory_sum = memory_sum + excluded.memory_sum,
+            memory_max = MAX(memory_max, excluded.memory_max),
+            threads_sum = threads_sum + excluded.threads_sum,
+            cpu_sum = cpu_sum + excluded.cpu_sum,
+            carbon_sum = carbon_sum + excluded.carbon_sum,
+            license_cost = excluded.license_cost,
+            last_seen = MAX(last_seen, excluded.last_seen)
+    '''
+
+    def __init__(self, conn):
+        with conn:
+            conn.execute(self.SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_app_stats_license ON app_stats (license_cost, last_seen)')
+
+    def update(self, conn, rows):
+        # rows are in FLEET_COLUMNS layout
+        aggregates = {}
+        for host, pid, name, memory, threads, cpu, carbon, license_cost, rating, create_time, username, sample_time in rows:
+            if name is None:
+                continue
+            entry = aggregates.get((host, name))
+            if entry is None:
+                aggregates[(host, name)] = [host, name, 1, memory, memory, threads, cpu, carbon, license_cost, sample_time]
+            else:
+                entry[2] += 1
+                entry[3] += memory
+                entry[4] = max(entry[4], memory)
+                entry[5] += threads
+                entry[6] += cpu
+                entry[7] += carbon
+                entry[8] = license_cost
+                entry[9] = max(entry[9], sample_time)
+        conn.executemany(self.UPSERT, list(aggregates.values()))
+
+
+class Shard(threading.Thread):
+    # One SQLite file holding a subset of hosts, with its own writer thread,
+    # so shards ingest in parallel instead of queueing on one write lock
+
+    def __init__(self, path, retention_every_s=60.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.queue = queue.Queue(maxsize=64)  # Bounded so a flood of agents backs up into HTTP
+        self.conn = store.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(FLEET_SCHEMA)
+        store.create_indexes(self.conn, FLEET_INDEXES)
+        self.app_stats = HostAppStats(self.conn)
+        self.writer = store.BatchWriter(self.conn, 'processes', FLEET_COLUMNS, max_rows=50000, on_flush=self.app_stats.update)
+        self.retention = RetentionManager()
+        self.retention.track_table(self.conn, 'processes', 'sample_time', ttl=PROCESS_ROW_TTL)
+        self.retention_every_s = retention_every_s
+        self._retained_at = time.monotonic()
+
+    def run(self):
+        while True:
+            rows = self.queue.get()
+            try:
+                if rows is None:
+                    break
+                self.writer.extend(rows)
+                if self.queue.empty():
+                    self.writer.flush()
+                    if time.monotonic() - self._retained_at >= self.retention_every_s:
+                        self.retention.step()
+                        self._retained_at = time.monotonic()
+            except sqlite3.OperationalError as e:
+                # Busy or out of space: the writer keeps its rows for the next
+                # batch, within its retry and size limits
+                print(f"Error writing to {self.path}: {e}")
+            except Exception as e:
+                # Rows SQLite rejects would fail every retry; drop them so the
+                # thread keeps draining the queue
+                print(f"Error writing to {self.path}, dropped {len(self.writer.rows)} rows: {e}")
+                self.writer.rows = []
+            finally:
+                self.queue.task_done()
+        self.writer.flush()
+        self.conn.close()
+
+    def read(self, sql, params=()):
+        # Separate connection per query; WAL lets it run alongside the writer
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+class Aggregator:
+    TOP_KEYS = {'memory': 'memory', 'cpu': 'cpu', 'carbon': 'carbon'}
+
+    def __init__(self, directory=FLEET_DIR, shards=SHARDS):
+        os.makedirs(directory, exist_ok=True)
+        self.shards = [Shard(os.path.join(directory, f'shard-{i}.db')) for i in range(shards)]
+        for shard in self.shards:
+            shard.start()
+        self.hosts = {}
+        self._hosts_lock = threading.Lock()
+        self.rows_ingested = 0
+        self.batches_ingested = 0
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            with self._hosts_lock:
+                state = self.hosts.setdefault(host, HostState())
+        return state
+
+    def ingest(self, body):
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(body, MAX_BATCH_BYTES)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f'batch over {MAX_BATCH_BYTES} bytes')
+        batch = json.loads(data)
+        host = batch['h']
+        rows = self._host(host).apply(host, batch.get('i'), batch['s'])
+        if rows:
+            self.shards[shard_for(host, len(self.shards))].queue.put(rows)
+        self.rows_ingested += len(rows)
+        self.batches_ingested += 1
+        return len(rows)
+
+    def drain(self):
+        # Block until everything queued so far is committed
+        for shard in self.shards:
+            shard.queue.join()
+
+    def top_apps(self, limit=20, key='memory'):
+        # [(name, hosts, avg_memory, max_memory, avg_cpu, total_carbon)] across every shard
+        merged = {}
+        for shard in self.shards:
+            for name, hosts, count, memory_sum, memory_max, cpu_sum, carbon_sum in shard.read('''
+                SELECT name, COUNT(*), SUM(sample_count), SUM(memory_sum), MAX(memory_max), SUM(cpu_sum), SUM(carbon_sum)
+                FROM app_stats GROUP BY name
+            '''):
+                entry = merged.setdefault(name, [0, 0, 0.0, 0.0, 0.0, 0.0])
+                entry[0] += hosts
+                entry[1] += count
+                entry[2] += memory_sum
+                entry[3] = max(entry[3], memory_max)
+                entry[4] += cpu_sum
+                entry[5] += carbon_sum
+        results = [(name, hosts, memory_sum / count, memory_max, cpu_sum / count, carbon_sum)
+                   for name, (hosts, count, memory_sum, memory_max, cpu_sum, carbon_sum) in merged.items()]
+        column = {'memory': 2, 'cpu': 4, 'carbon': 5}[key]
+        results.sort(key=lambda row: row[column], reverse=True)
+        return results[:limit]
+
+    def license_waste(self, days=60, now=None):
+        # [(name, idle_hosts, wasted_cost)]: licensed applications not seen on a host for `days`
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime(TIME_FORMAT)
+        merged = {}
+        for shard in self.shards:
+            for name, hosts, cost in shard.read('''
+                SELECT name, COUNT(*), SUM(license_cost) FROM app_stats
+                WHERE license_cost > 0 AND last_seen < ?
+                GROUP BY name
+            ''', (cutoff,)):
+                entry = merged.setdefault(name, [0, 0.0])
+                entry[0] += hosts
+                entry[1] += cost
+        return sorted(((name, hosts, cost) for name, (hosts, cost) in merged.items()), key=lambda row: row[2], reverse=True)
+
+    def close(self):
+        for shard in self.shards:
+            shard.queue.put(None)
+        for shard in self.shards:
+            shard.join()
+
+
+class AggregatorHandler(BaseHTTPRequestHandler):
+    # POST /ingest, GET /top?limit=20&by=memory, GET /license-waste?days=60
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != '/ingest':
+            return self._reply(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY_BYTES:
+            # The body is left unread, so the connection can't be reused
+            self.close_connection = True
+            return self._reply(413 if length > 0 else 400, {'error': 'bad Content-Length'})
+        body = self.rfile.read(length)
+        try:
+            rows = self.server.aggregator.ingest(body)
+        except ResyncNeeded:
+            return self._reply(409, {'error': 'resync'})
+        except (ValueError, KeyError, TypeError, zlib.error):
+            return self._reply(400, {'error': 'malformed batch'})
+        self._reply(200, {'rows': rows})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        aggregator = self.server.aggregator
+        try:
+            if url.path == '/top':
+                key = query.get('by', 'memory')
+                if key not in Aggregator.TOP_KEYS:
+                    return self._reply(400, {'error': f'unknown sort key {key}'})
+                return self._reply(200, aggregator.top_apps(int(query.get('limit', 20)), key))
+            if url.path == '/license-waste':
+                return self._reply(200, aggregator.license_waste(int(query.get('days', 60))))
+        except ValueError as e:
+            return self._reply(400, {'error': str(e)})
+        self._reply(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        pass  # One line per agent push is too much noise
+
+
+def serve(aggregator, host='127.0.0.1', port=DEFAULT_PORT):
+    # Returns the running server; port=0 picks a free port (server.server_port)
+    server = ThreadingHTTPServer((host, port), AggregatorHandler)
+    server.daemon_threads = True
+    server.aggregator = aggregator
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SimulatedHost:
+    # Synthetic sweeps for load testing: a fixed pool of application names,
+    # some process churn and some value drift between sweeps
+
+    def __init__(self, host, num_processes=200, churn=0.05, drift=0.3, seed=None):
+        self.host = host
+        self.rng = random.Random(seed if seed is not None else host)
+        self.churn = churn
+        self.drift = drift
+        self.next_pid = 1
+        self.processes = [self._new_process() for _ in range(num_processes)]
+
+    def _new_process(self):
+        rng = self.rng
+        pid = self.next_pid
+        self.next_pid += 1
+        license_cost = rng.choice((0.0, 0.0, 0.0, 149.0, 499.0))
+        return [pid, f'app_{rng.randrange(100)}.exe', rng.uniform(1, 2048), rng.randint(1, 64), rng.uniform(0, 100),
+                rng.uniform(0, 0.05), license_cost, rng.randint(0, 2), f'2024-01-01 00:00:{pid % 60:02d}', 'user']
+
+    def sweep(self):
+        rng = self.rng
+        for i, process in enumerate(self.processes):
+            if rng.random() < self.churn:
+                self.processes[i] = self._new_process()
+            elif rng.random() < self.drift:
+                process[2] = max(1.0, process[2] + rng.uniform(-50, 50))
+                process[4] = rng.uniform(0, 100)
+        sample_time = datetime.now().strftime(TIME_FORMAT)
+        return [tuple(process) + (sample_time,) for process in self.processes]
+
+
+def simulate(url, hosts=500, sweeps=5, num_processes=200, batch_sweeps=BATCH_SWEEPS, workers=32):
+    # Drives `hosts` simulated agents against an aggregator; returns totals
+    agents = [(SimulatedHost(f'host-{i:04d}', num_processes), FleetAgent(url, f'host-{i:04d}', batch_sweeps)) for i in range(hosts)]
+
+    def run(pair):
+        simulated, agent = pair
+        for _ in range(sweeps):
+            agent.add_sweep(simulated.sweep())
+        agent.push()
+        agent.close()
+        return agent.bytes_sent, agent.rows_sent
+
+    with ThreadPoolExecutor(workers) as pool:
+        totals = list(pool.map(run, agents))
+    return {
+        'hosts': hosts,
+        'rows': hosts * sweeps * num_processes,
+        'rows_sent': sum(rows for _, rows in totals),
+        'bytes_sent': sum(sent for sent, _ in totals),
+    }
+
+
+def run_agent(url, interval, batch_sweeps, count=None):
+    # Same sweep and scoring as headless.py, pushed to the aggregator instead of a local store
+    import headless
+    import scoring
+    from license_catalog import LicenseCatalog, LICENSE_COST_DATA_FILE
+    from proc_reader import default_sampler
+
+    license_catalog = LicenseCatalog(LICENSE_COST_DATA_FILE)
+    power_model = scoring.load_power_model()
+    process_source = default_sampler()
+    agent = FleetAgent(url, batch_sweeps=batch_sweeps)
+    sweeps = 0
+    try:
+        while count is None or sweeps < count:
+            started = time.monotonic()
+            agent.add_sweep(headless.monitor_processes(license_catalog, power_model, process_source))
+            sweeps += 1
+            if count is None or sweeps < count:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        agent.push()
+        agent.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fleet agent and aggregator.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    aggregator = commands.add_parser('aggregator', help="receive samples from agents")
+    aggregator.add_argument('--bind', default='127.0.0.1', help="address to listen on; agents aren't authenticated, so only use 0.0.0.0 on a trusted network")
+    aggregator.add_argument('--port', type=int, default=DEFAULT_PORT)
+    aggregator.add_argument('--dir', default=FLEET_DIR, help=f"directory for shard databases (default: {FLEET_DIR})")
+    aggregator.add_argument('--shards', type=int, default=SHARDS)
+    agent = commands.add_parser('agent', help="sample this machine and push to an aggregator")
+    agent.add_argument('--aggregator', required=True, help="e.g. http://aggregator:8765")
+    agent.add_argument('--interval', type=float, default=60.0)
+    agent.add_argument('--batch', type=int, default=BATCH_SWEEPS, help="sweeps per push")
+    agent.add_argument('--count', type=int, default=None, help="stop after this many sweeps")
+    sim = commands.add_parser('simulate', help="push synthetic sweeps from many fake hosts")
+    sim.add_argument('--aggregator', required=True)
+    sim.add_argument('--hosts', type=int, default=500)
+    sim.add_argument('--sweeps', type=int, default=5)
+    sim.add_argument('--processes', type=int, default=200)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'aggregator':
+        aggregator = Aggregator(args.dir, args.shards)
+        server = serve(aggregator, args.bind, args.port)
+        print(f"Aggregator listening on {args.bind}:{server.server_port}", flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            aggregator.close()
+    elif args.command == 'agent':
+        try:
+            run_agent(args.aggregator, args.interval, args.batch, args.count)
+        except KeyboardInterrupt:
+            pass
+    else:
+        start = time.perf_counter()
+        totals = simulate(args.aggregator, args.hosts, args.sweeps, args.processes)
+        elapsed = time.perf_counter() - start
+        print(f"{totals['hosts']} hosts, {totals['rows']:,} process samples in {elapsed:.1f} s "
+              f"({totals['rows'] / elapsed:,.0f} rows/s, {totals['bytes_sent'] / 1024:,.0f} KB sent)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import time
+
+# Taken before the heavier imports so the first-sample time includes them
+STARTED_AT = time.perf_counter()
+
+import argparse
+from datetime import datetime, timedelta
+
+import psutil
+
+import scoring
+import store
+from proc_reader import default_sampler, SyntheticSampler
+from capture import CaptureWriter, RecordingSampler
+from energy import EnergyLedger
+from scheduler import SamplingScheduler, HISTORY_TIERS, CPU_BUDGET, attrs_for
+import instrument
+from license_catalog import LicenseCatalog, LICENSE_COST_DATA_FILE
+from retention import RetentionManager
+from rollups import Rollups
+from usage_index import UsageIndex
+
+# Display-less collector: the same sweep, scoring and persistence as
+# all-db-sys-1.py, without Tk, pandas or matplotlib. Run with:
+#   python headless.py --store process_monitor.db
+# Sweeps follow the adaptive scheduler unless --interval fixes the period.
+# Adaptive sweeps are written at most every store.PERSIST_EVERY_S, with the
+# CPU samples and scores in between averaged and the carbon emitted summed
+# into them.
+
+PROCESS_ROW_TTL = timedelta(days=90)
+MAX_PROCESS_ROWS = 5_000_000
+
+
+def monitor_processes(license_catalog, power_model, process_source, refresh=None, current_time=None, energy=None):
+    # process_source: anything with process_iter(attrs, refresh), e.g. a
+    # proc_reader sampler, SyntheticSampler or capture.ReplaySampler.
+    # current_time stamps the rows (default: now); a replayed sweep passes
+    # the time it was captured, and brings the capturing host's cpu_count.
+    # Rows are in store.PROCESS_COLUMNS layout. With an energy.EnergyLedger
+    # they also carry carbon_kg (store.ENERGY_PROCESS_COLUMNS): the CO2 the
+    # process emitted since its previous sample, so summing it gives real
+    # totals. carbon_footprint is always the per-sample score.
+    current_time = current_time or datetime.now()
+    sample_time = current_time.strftime('%Y-%m-%d %H:%M:%S')
+    cpu_count = getattr(process_source, 'cpu_count', None) or psutil.cpu_count() or 1
+    rows = []
+    energy_sweep = []
+    for proc in process_source.process_iter(['pid', 'name', 'memory_info', 'num_threads', 'cpu_percent', 'create_time', 'username'], refresh=refresh):
+        try:
+            pid = proc.info['pid']
+            name = proc.info['name']
+            mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
+            num_threads = proc.info['num_threads']
+            cpu_percent = proc.info['cpu_percent'] / cpu_count  # Average CPU usage across all cores
+            create_time = datetime.fromtimestamp(proc.info['create_time'])
+            username = proc.info.get('username', 'N/A')
+            rows.append([pid, name, mem, num_threads, cpu_percent, 0.0, 0.0, 0, create_time, username, sample_time])
+            energy_sweep.append((pid, proc.info['create_time'], name, proc.info.get('cpu_time'), proc.info['cpu_percent'], mem))
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, TypeError, AttributeError):
+            pass
+
+    scores = scoring.score_sweep([row[4] for row in rows], [row[2] for row in rows], [row[3] for row in rows], power_model)
+    license_costs = license_catalog.get_many([row[1] for row in rows])
+    for row, carbon_footprint, sustainability_rating, license_cost in zip(rows, scores.carbon_kg.tolist(), scores.rating.tolist(), license_costs):
+        row[5] = carbon_footprint
+        row[6] = license_cost
+        row[7] = sustainability_rating
+    if energy is not None:
+        for row, accumulator in zip(rows, energy.update(current_time.timestamp(), energy_sweep)):
+            row.append(accumulator.interval_carbon_kg)
+    return rows
+
+
+class HeadlessCollector:
+
+    def __init__(self, store_path=store.DB_FILE, license_file=LICENSE_COST_DATA_FILE, power_model_file=scoring.POWER_MODEL_FILE, process_source=None):
+        self.conn = store.connect(store_path)
+        store.create_process_table(self.conn)
+        self.app_stats = store.AppStats(self.conn, store.ENERGY_PROCESS_COLUMNS)
+        self.usage_index = UsageIndex(self.conn, store.ENERGY_PROCESS_COLUMNS, history_table='processes')
+        self.writer = store.BatchWriter(self.conn, 'processes', store.ENERGY_PROCESS_COLUMNS, on_flush=self._fold)
+        self.rollups = Rollups(self.conn)
+        self.retention = RetentionManager()
+        self.retention.track_table(self.conn, 'processes', 'sample_time', ttl=PROCESS_ROW_TTL, max_rows=MAX_PROCESS_ROWS)
+        self.license_catalog = LicenseCatalog(license_file)
+        self.power_model = scoring.load_power_model(power_model_file)
+        self.process_source = process_source or default_sampler()
+        cpu_count = getattr(self.process_source, 'cpu_count', None) or psutil.cpu_count() or 1
+        self.energy = EnergyLedger(self.conn, self.power_model, cpu_count)
+        self.retention.track_table(self.conn, 'energy_processes', 'last_seen', ttl=PROCESS_ROW_TTL)
+        self.sweeps = 0
+        self.totals = {}  # Per-metric totals of the last sweep
+        self.window = store.SweepWindow(key=(0, 8), average=(4, 5), total=(11,))
+
+    def _fold(self, conn, rows):
+        self.app_stats.update(conn, rows)
+        return self.usage_index.update(conn, rows)
+
+    def sweep(self, refresh=None, now=None):
+        # now: when the sweep was taken, if not just now (a replay)
+        lap = instrument.stages()
+        rows = monitor_processes(self.license_catalog, self.power_model, self.process_source, refresh, now, self.energy)
+        lap.mark('sample')
+        self.totals = {
+            'cpu': sum(row[4] for row in rows),
+            'memory': sum(row[2] for row in rows),
+            'threads': sum(row[3] for row in rows),
+        }
+        self.writer.extend(self.window.add(rows, (now or datetime.now()).timestamp()))
+        self.writer.flush()
+        lap.mark('persist')
+
+        # Same series the GUI records: averages over the top 20 by memory,
+        # and the CO2 every process emitted since the previous sweep
+        top_processes = self.app_stats.top_by_memory(20)
+        if top_processes:
+            avg_memory_usage = sum(row[1] for row in top_processes) / len(top_processes)
+            avg_cpu_usage = sum(row[3] for row in top_processes) / len(top_processes)
+            self.rollups.add(now or datetime.now(), avg_memory_usage, avg_cpu_usage, self.energy.sweep_carbon_kg)
+        lap.mark('rollups')
+
+        self.retention.step(now)
+        lap.mark('retention')
+        self.sweeps += 1
+        instrument.inc('sweeps_total')
+        return len(rows)
+
+    def run(self, interval=None, count=None, budget=CPU_BUDGET):
+        # A fixed interval in seconds, or None for the adaptive scheduler
+        scheduler = SamplingScheduler(HISTORY_TIERS, budget=budget) if interval is None else None
+        if interval is not None:
+            self.window.every = 0.0  # Write every sweep at the period asked for
+        while count is None or self.sweeps < count:
+            started = time.monotonic()
+            if scheduler is not None:
+                metrics = scheduler.begin()
+                cpu_started = time.thread_time()
+                processes = self.sweep(attrs_for(metrics))
+                scheduler.end(metrics, time.thread_time() - cpu_started, self.totals, self.totals['cpu'] / 100)
+            else:
+                processes = self.sweep()
+            if self.sweeps == 1:
+                print(f"First sample: {processes} processes, {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms after startup", flush=True)
+            if count is not None and self.sweeps >= count:
+                break
+            if scheduler is not None:
+                time.sleep(scheduler.delay())
+            else:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def close(self):
+        self.writer.flush()
+        self.energy.close()
+        self.conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Collect process samples without a GUI.")
+    parser.add_argument('--interval', type=float, default=None, help="fixed seconds between sweeps (default: adaptive)")
+    parser.add_argument('--cpu-budget', type=float, default=CPU_BUDGET, help=f"adaptive mode: share of one core to stay under (default: {CPU_BUDGET})")
+    parser.add_argument('--store', default=store.DB_FILE, help=f"SQLite database path (default: {store.DB_FILE})")
+    parser.add_argument('--license-file', default=LICENSE_COST_DATA_FILE, help=f"license cost catalog (default: {LICENSE_COST_DATA_FILE})")
+    parser.add_argument('--power-model', default=scoring.POWER_MODEL_FILE, help=f"per-host power model (default: {scoring.POWER_MODEL_FILE})")
+    parser.add_argument('--count', type=int, default=None, help="stop after this many sweeps")
+    parser.add_argument('--synthetic', type=int, default=None, metavar='N', help="sample a synthetic table of N processes instead of this host")
+    parser.add_argument('--record', default=None, metavar='CAPTURE', help="also write every sweep to this capture file (see capture.py)")
+    parser.add_argument('--metrics-port', type=int, default=None, help=f"serve the collector's own metrics on 127.0.0.1 at this port (e.g. {instrument.DEFAULT_PORT})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics_port is not None:
+        instrument.serve(args.metrics_port)
+    process_source = SyntheticSampler(args.synthetic) if args.synthetic else default_sampler()
+    writer = None
+    if args.record:
+        writer = CaptureWriter(args.record)
+        process_source = RecordingSampler(process_source, writer)
+    collector = HeadlessCollector(args.store, args.license_file, args.power_model, process_source)
+    try:
+        collector.run(args.interval, args.count, args.cpu_budget)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+        if writer is not None:
+            writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+import bisect
+import inspect
+import threading
+import time
+import weakref
+
+import psutil
+
+# Self-instrumentation: how long the monitor's own stages take, what it
+# writes and how much memory it holds, in Prometheus text format. Off until
+# enable() is called; until then every hook is one global check and a
+# return. Scrape a running collector with:
+#   curl http://127.0.0.1:9464/metrics
+
+DEFAULT_PORT = 9464
+PREFIX = 'ecoscanner_'
+# Seconds; wide enough for a 50 us render and a multi-second sweep
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'sweep_stage_seconds': 'Time spent in each stage of a sweep',
+    'db_commit_seconds': 'Time to write and commit one batch',
+    'render_seconds': 'Time to update a Treeview',
+    'export_seconds': 'Time to write one export chunk',
+    'rows_written_total': 'Rows written, by destination',
+    'queue_depth': 'Items waiting in a queue or buffer',
+    'resident_memory_bytes': 'Resident set size of this process',
+    'sweeps_total': 'Completed sweeps',
+    'sweep_interval_seconds': 'Current sampling interval per metric tier',
+}
+
+_registry = None  # Set by enable()
+_callbacks = {}  # (name, labels) -> [reference to fn], for gauges read at scrape time
+_callbacks_lock = threading.Lock()
+
+
+class Histogram:
+    # Prometheus-style histogram: counts per upper bound, plus sum and count
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    # Histograms, counters and gauges keyed by (name, labels), plus the
+    # gauge_callback() gauges, which are only read when scraped
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, value, labels):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount, labels):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, labels):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    def samples(self):
+        # [(name, labels, value)] of counters and gauges, callbacks evaluated now
+        with self.lock:
+            values = list(self.counters.items()) + list(self.gauges.items())
+        with _callbacks_lock:
+            callbacks = [(key, list(refs)) for key, refs in _callbacks.items()]
+        for key, refs in callbacks:
+            total = None
+            for ref in refs:
+                fn = ref()
+                if fn is None:
+                    continue  # Its object is gone; dropped at the next registration
+                try:
+                    value = fn()
+                except Exception:
+                    continue
+                total = value if total is None else total + value
+            if total is not None:
+                values.append((key, total))
+        return [(name, labels, value) for (name, labels), value in values]
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {PREFIX}{name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        for name, labels, value in sorted(self.samples(), key=lambda sample: (sample[0], sample[1])):
+            describe(name, 'counter' if name.endswith('_total') else 'gauge')
+            lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+        with self.lock:
+            histograms = sorted((key, (list(h.cumulative()), h.sum, h.count)) for key, h in self.histograms.items())
+        for (name, labels), (buckets, total, count) in histograms:
+            describe(name, 'histogram')
+            for bound, cumulative in buckets:
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels + (("le", "+Inf" if bound == float("inf") else repr(bound)),))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        # [(metric, value)] rows for the diagnostics panel
+        rows = [(f'{name}{_labels(labels)}', value) for name, labels, value in sorted(self.samples(), key=lambda sample: (sample[0], sample[1]))]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            for (name, labels), histogram in histograms:
+                mean = histogram.sum / histogram.count if histogram.count else 0.0
+                rows.append((f'{name}{_labels(labels)}', f'n={histogram.count} mean={mean * 1000:.2f} ms p95<={histogram.quantile(0.95) * 1000:g} ms'))
+        return rows
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class _Timer:
+    # Context manager that observes its own duration
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry = _registry
+        if registry is not None:
+            registry.observe(self.name, time.perf_counter() - self.started, self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Stages:
+    # Times consecutive stages of one run: each mark(stage) observes the
+    # time since the previous mark (or since stages() was called)
+    __slots__ = ('name', 'last')
+
+    def __init__(self, name):
+        self.name = name
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        registry = _registry
+        if registry is not None:
+            registry.observe(self.name, now - self.last, (('stage', stage),))
+        self.last = now
+
+
+class _NullStages:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NULL_STAGES = _NullStages()
+
+
+def enable():
+    # Start recording; returns the registry. Safe to call more than once.
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+    return _registry
+
+
+def disable():
+    # Stop recording and drop what was recorded
+    global _registry
+    _registry = None
+
+
+def enabled():
+    return _registry is not None
+
+
+def registry():
+    return _registry
+
+
+def timed(name, **labels):
+    # with instrument.timed('sweep_stage_seconds', stage='sample'): ...
+    if _registry is None:
+        return NULL_TIMER
+    return _Timer(name, tuple(sorted(labels.items())))
+
+
+def stages(name='sweep_stage_seconds'):
+    # lap = instrument.stages(); ...; lap.mark('sample'); ...; lap.mark('score')
+    if _registry is None:
+        return NULL_STAGES
+    return _Stages(name)
+
+
+def observe(name, value, **labels):
+    if _registry is not None:
+        _registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def inc(name, amount=1, **labels):
+    if _registry is not None:
+        _registry.inc(name, amount, tuple(sorted(labels.items())))
+
+
+def gauge(name, value, **labels):
+    if _registry is not None:
+        _registry.set(name, value, tuple(sorted(labels.items())))
+
+
+def gauge_callback(name, fn, **labels):
+    # fn() is only called when scraped, so these cost nothing while disabled.
+    # A bound method is held weakly, so a gauge doesn't keep its object
+    # alive; callbacks with the same name and labels (e.g. two writers for
+    # one table) are added up.
+    ref = weakref.WeakMethod(fn) if inspect.ismethod(fn) else (lambda: fn)
+    key = (name, tuple(sorted(labels.items())))
+    with _callbacks_lock:
+        _callbacks[key] = [live for live in _callbacks.get(key, ()) if live() is not None] + [ref]
+
+
+def _rss():
+    return psutil.Process().memory_info().rss
+
+
+gauge_callback('resident_memory_bytes', _rss)
+
+
+def serve(port=DEFAULT_PORT, host='127.0.0.1'):
+    # Enables instrumentation and serves /metrics from a daemon thread.
+    # Binds to localhost only; returns the server (server.shutdown() stops it).
+    # http.server is only imported here: it pulls in mimetypes, which on
+    # import reads the registry through the winreg module.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics' or _registry is None:
+                self.send_error(404)
+                return
+            body = _registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the console
+
+    enable()
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,338 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import store
+from license_catalog import ALIASES, LICENSE_COST_DATA_FILE, LicenseCatalog, normalize
+from usage_index import TIME_FORMAT, UNUSED_DAYS, UsageIndex
+
+# Last-execution times for many programs at once, from whichever sources the
+# host has. A provider takes normalized program names and returns
+# {name: datetime} for the ones it knows about, in one pass over its source,
+# and raises if the source can't be read. LastExecutionResolver merges
+# providers, keeps going past failed ones and caches the answers. Try it with:
+#   python last_execution.py --pacct /var/log/account/pacct matlab code
+
+CACHE_TTL_S = 600
+PACCT_FILES = ('/var/log/account/pacct*', '/var/account/pacct*')
+COMM_LEN = 15  # The kernel keeps TASK_COMM_LEN - 1 characters of a command name
+
+# struct acct_v3 from <linux/acct.h>: flag, version, tty, exitcode, uid, gid,
+# pid, ppid, btime (epoch seconds), etime (float, in AHZ ticks), 8 comp_t
+# counters, comm[16]
+ACCT_V3 = '{}BBHIIIIIIf8H16s'
+ACCT_V3_SIZE = struct.calcsize(ACCT_V3.format('<'))
+ACCT_VERSION = 3
+ACCT_BYTEORDER = 0x80  # Set in the version byte when the file was written big-endian
+AHZ = 100  # Accounting ticks per second, the same on every architecture
+
+
+def read_pacct(path, offset=0):
+    # Yields (command, end time as an epoch float) for every v3 record from
+    # byte `offset` on, which must fall on a record boundary
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    if not data:
+        return
+    record = struct.Struct(ACCT_V3.format('>' if data[1] & ACCT_BYTEORDER else '<'))
+    usable = len(data) - len(data) % record.size
+    for fields in record.iter_unpack(data[:usable]):
+        if fields[1] & ~ACCT_BYTEORDER != ACCT_VERSION:
+            continue
+        yield fields[-1].split(b'\0', 1)[0].decode('utf-8', 'replace'), fields[8] + fields[9] / AHZ
+
+
+class PacctProvider:
+    # Linux process accounting (accton / psacct), including rotated and
+    # gzipped files. Each record is one exited process; its end time counts.
+    # The files are boiled down to {command: latest end time} on a background
+    # thread, so the caller (usually the UI) never waits on them: lookup()
+    # answers from the last complete summary and starts the next one. Only
+    # changed files are read again, a file that was appended to from where
+    # the last read stopped. `ready` is False until the first summary is
+    # done; `errors` holds {path: exception} for files it couldn't read.
+    name = 'pacct'
+
+    def __init__(self, patterns=PACCT_FILES, background=True):
+        self.patterns = patterns
+        self.background = background
+        self.ready = False
+        self.errors = {}
+        self.latest = {}  # Truncated command -> latest end time in any file
+        self._files = {}  # path -> (inode, bytes read, mtime, {command: latest end time})
+        self._lock = threading.Lock()
+        self._thread = None
+        if background:
+            self.refresh()  # Start early so the first report has it
+
+    def files(self):
+        return sorted(path for pattern in self.patterns for path in glob.glob(pattern))
+
+    def refresh(self):
+        # Bring the summary up to date; in the background unless background=False
+        if not self.background:
+            return self._summarize()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._summarize, daemon=True)
+                self._thread.start()
+
+    def _summarize(self):
+        files = {}
+        errors = {}
+        for path in self.files():
+            try:
+                st = os.stat(path)
+                previous = self._files.get(path)
+                if previous is not None and previous[0] == st.st_ino and previous[2] == st.st_mtime:
+                    files[path] = previous
+                    continue
+                offset, commands = 0, {}
+                if previous is not None and previous[0] == st.st_ino and previous[1] <= st.st_size and not path.endswith('.gz'):
+                    offset, commands = previous[1], dict(previous[3])  # Appended to since
+                end = st.st_size - st.st_size % ACCT_V3_SIZE
+                for command, ended in read_pacct(path, offset):
+                    command = normalize(command)[:COMM_LEN]
+                    if ended > commands.get(command, 0.0):
+                        commands[command] = ended
+                files[path] = (st.st_ino, end, st.st_mtime, commands)
+            except (OSError, EOFError) as e:
+                errors[path] = e
+        latest = {}
+        for _, _, _, commands in files.values():
+            for command, ended in commands.items():
+                if ended > latest.get(command, 0.0):
+                    latest[command] = ended
+        self._files = files
+        self.latest = latest
+        self.errors = errors
+        self.ready = True
+
+    def lookup(self, names):
+        # Commands are truncated, so match on the first COMM_LEN characters
+        self.refresh()
+        latest = self.latest
+        found = {}
+        for name in names:
+            ended = latest.get(name[:COMM_LEN])
+            if ended is not None:
+                found[name] = datetime.fromtimestamp(ended)
+        return found
+
+
+class HistoryProvider:
+    # The collector's own sightings, from usage_index
+    name = 'history'
+
+    def __init__(self, usage_index):
+        self.usage_index = usage_index
+
+    def lookup(self, names):
+        wanted = set(names)
+        found = {}
+        for executable, last_seen in self.usage_index.last_seen().items():
+            key = normalize(executable)
+            if key in wanted and (key not in found or last_seen > found[key]):
+                found[key] = last_seen
+        return found
+
+
+class WmiProvider:
+    # Creation time of running processes, from a single Win32_Process query
+    # on one WMI connection. connect defaults to wmi.WMI.
+    name = 'wmi'
+
+    def __init__(self, connect=None):
+        self.connect = connect
+
+    def lookup(self, names):
+        wanted = set(names)
+        found = {}
+        connect = self.connect
+        if connect is None:
+            import wmi
+            connect = wmi.WMI
+        for process in connect().Win32_Process(['Name', 'CreationDate']):
+            key = normalize(process.Name or '')
+            if key in wanted and process.CreationDate:
+                created = datetime.strptime(process.CreationDate.split('.')[0], '%Y%m%d%H%M%S')
+                if key not in found or created > found[key]:
+                    found[key] = created
+        return found
+
+
+class RecentDocsProvider:
+    # Explorer's RecentDocs key, walked once for all names: a value whose
+    # name contains the program name and whose data is a timestamp
+    name = 'recent_docs'
+    KEY_PATH = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Explorer\RecentDocs"
+
+    def lookup(self, names):
+        if sys.platform != 'win32':
+            return {}
+        import winreg  # Built into Windows Pythons, so it wins over this repo's winreg.py
+        found = {}
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, self.KEY_PATH, 0, winreg.KEY_READ) as key:
+            for i in range(winreg.QueryInfoKey(key)[0]):
+                with winreg.OpenKey(key, winreg.EnumKey(key, i), 0, winreg.KEY_READ) as subkey:
+                    for j in range(winreg.QueryInfoKey(subkey)[1]):
+                        value_name, value_data, value_type = winreg.EnumValue(subkey, j)
+                        value_name = value_name.lower()
+                        for name in names:
+                            if name in value_name:
+                                try:
+                                    used = datetime.fromtimestamp(int(value_data))
+                                except (TypeError, ValueError, OverflowError, OSError):
+                                    continue
+                                if name not in found or used > found[name]:
+                                    found[name] = used
+        return found
+
+
+class JsonFileProvider:
+    # {"program": "YYYY-MM-DD HH:MM:SS"}, e.g. an inventory exported from
+    # another tool or machine
+    name = 'json'
+
+    def __init__(self, path):
+        self.path = path
+
+    def lookup(self, names):
+        wanted = set(names)
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        found = {}
+        for program, when in data.items():
+            key = normalize(program)
+            if key in wanted and when:
+                found[key] = max(found.get(key, datetime.min), datetime.strptime(when, TIME_FORMAT))
+        return found
+
+
+def default_providers(usage_index=None, background=True):
+    # background=False reads process accounting on the calling thread, for scripts
+    providers = []
+    if sys.platform == 'win32':
+        providers += [WmiProvider(), RecentDocsProvider()]
+    elif sys.platform.startswith('linux'):
+        providers.append(PacctProvider(background=background))
+    if usage_index is not None:
+        providers.append(HistoryProvider(usage_index))
+    return providers
+
+
+class LastExecutionResolver:
+    # Latest time any provider reports for each program or one of its
+    # license_catalog aliases. Names missing from the cache, or cached longer
+    # than ttl_s ago, are looked up together: one call per provider however
+    # many names are asked for. "Never seen" (None) is cached as well, but
+    # only when every provider answered in full. errors holds {source:
+    # exception} for what the last lookup couldn't read.
+
+    def __init__(self, providers, ttl_s=CACHE_TTL_S, aliases=ALIASES, clock=time.monotonic):
+        self.providers = providers
+        self.ttl_s = ttl_s
+        self.aliases = {normalize(alias): normalize(target) for alias, target in aliases.items()}
+        self.clock = clock
+        self.cache = {}  # normalized name -> (looked up at, datetime or None)
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, names):
+        # {name: datetime or None}
+        keys = {name: normalize(name) for name in names}
+        now = self.clock()
+        with self.lock:
+            stale = {key for key in keys.values() if key not in self.cache or now - self.cache[key][0] >= self.ttl_s}
+            if stale:
+                variants = {key: key for key in stale}
+                for alias, target in self.aliases.items():
+                    if target in stale:
+                        variants[alias] = target
+                found = dict.fromkeys(stale)
+                errors = {}
+                for provider in self.providers:
+                    try:
+                        answers = provider.lookup(list(variants))
+                    except Exception as e:
+                        errors[provider.name] = e
+                        continue
+                    errors.update(getattr(provider, 'errors', {}))
+                    if not getattr(provider, 'ready', True):
+                        errors[provider.name] = 'not read yet'
+                    for name, when in answers.items():
+                        key = variants[name]
+                        if found[key] is None or when > found[key]:
+                            found[key] = when
+                self.errors = errors
+                # Partial answers are returned but looked up again next time
+                cached_at = now if not errors else now - self.ttl_s
+                for key, when in found.items():
+                    self.cache[key] = (cached_at, when)
+            return {name: self.cache[key][1] for name, key in keys.items()}
+
+    def invalidate(self):
+        with self.lock:
+            self.cache.clear()
+
+
+def unused_licenses(resolver, catalog, usage_index, days=UNUSED_DAYS, now=None):
+    # usage_index.unused() rows, minus executables another provider saw
+    # after the cutoff, plus licensed catalog programs the collector never
+    # saw and other sources last saw before it, or never. Those extra rows
+    # have None for first_seen, runtime_s and users, and never-seen programs
+    # None for last_seen too.
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=days)
+    rows = usage_index.unused(days, now)
+    seen = {normalize(executable) for executable in usage_index.last_seen()}
+    unseen = [name for name in catalog.licensed_names() if name not in seen]
+    resolved = resolver.resolve([row[0] for row in rows] + unseen)
+    report = [row for row in rows if resolved[row[0]] is None or resolved[row[0]] <= cutoff]
+    for name in unseen:
+        when = resolved[name]
+        if when is None or when <= cutoff:
+            report.append((name, catalog.get(name), None, when.strftime(TIME_FORMAT) if when is not None else None, None, None))
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Look up when programs last ran.")
+    parser.add_argument('names', nargs='*', help="program names (default: every licensed program in the catalog)")
+    parser.add_argument('--catalog', default=LICENSE_COST_DATA_FILE, help=f"license catalog (default: {LICENSE_COST_DATA_FILE})")
+    parser.add_argument('--store', default=None, help="collector database whose usage index to include")
+    parser.add_argument('--pacct', action='append', default=None, help="process accounting file or glob (repeatable)")
+    parser.add_argument('--json', action='append', default=[], help="JSON file of {program: 'YYYY-MM-DD HH:MM:SS'} (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    usage_index = UsageIndex(store.connect(args.store)) if args.store else None
+    if args.pacct or args.json:
+        # Only the given files, so results don't depend on the live system
+        providers = [PacctProvider(args.pacct, background=False)] if args.pacct else []
+        providers += [JsonFileProvider(path) for path in args.json]
+        if usage_index is not None:
+            providers.append(HistoryProvider(usage_index))
+    else:
+        providers = default_providers(usage_index, background=False)
+    names = args.names or LicenseCatalog(args.catalog).licensed_names()
+    resolver = LastExecutionResolver(providers)
+    for name, when in sorted(resolver.resolve(names).items()):
+        print(f"{name:<30} {when.strftime(TIME_FORMAT) if when is not None else 'never seen'}")
+    for source, error in resolver.errors.items():
+        print(f"Could not read {source}: {error}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
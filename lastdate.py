@@ -1,26 +1,19 @@
-import wmi
-import datetime
+import sys
 
-def get_last_execution_time(process_name):
-    try:
-        # Connect to the WMI service
-        c = wmi.WMI()
+from last_execution import LastExecutionResolver, WmiProvider
 
-        # Query for processes matching the process name
-        for process in c.Win32_Process(name=process_name):
-            last_execution_time = process.CreationDate.split('.')[0]  # Remove microseconds
-            last_execution_time = datetime.datetime.strptime(last_execution_time, "%Y%m%d%H%M%S")
-            return last_execution_time
-    except Exception as e:
-        print(f"Error accessing WMI: {e}")
-        return None
+def get_last_execution_times(process_names):
+    # One WMI connection and one Win32_Process query for every name
+    return LastExecutionResolver([WmiProvider()]).resolve(process_names)
 
-# Replace with the process name of the software you're interested in
-process_name = "notepad.exe"
+def get_last_execution_time(process_name):
+    return get_last_execution_times([process_name])[process_name]
 
-last_execution_time = get_last_execution_time(process_name)
+# Replace with the process names of the software you're interested in, or pass them as arguments
+process_names = sys.argv[1:] or ["notepad.exe"]
 
-if last_execution_time:
-    print(f"The last execution time of {process_name} was: {last_execution_time}")
-else:
-    print(f"Could not find {process_name} running.")
+for process_name, last_execution_time in get_last_execution_times(process_names).items():
+    if last_execution_time:
+        print(f"The last execution time of {process_name} was: {last_execution_time}")
+    else:
+        print(f"Could not find {process_name} running.")
@@ -0,0 +1,117 @@
+import json
+import os
+import time
+from fnmatch import fnmatchcase
+
+LICENSE_COST_DATA_FILE = 'license_cost_data.json'
+
+# Common Linux/macOS binary names for products that license_cost_data.json
+# lists under their Windows executable name
+ALIASES = {
+    'code': 'visual_studio_code',
+    'idea': 'intellij_idea',
+    'idea.sh': 'intellij_idea',
+    'pycharm.sh': 'pycharm',
+    'studio': 'android_studio',
+    'studio.sh': 'android_studio',
+    'google-chrome': 'chrome',
+    'chromium': 'chrome',
+    'mongod': 'mongodb',
+    'mysqld': 'mysql',
+    'dockerd': 'docker',
+    'kubectl': 'kubernetes',
+}
+
+GLOB_CHARS = '*?['
+
+
+def normalize(name):
+    # Case-insensitive, and 'java', 'JAVA.EXE' and 'java.exe' are the same program
+    name = name.strip().lower()
+    if name.endswith('.exe'):
+        name = name[:-4]
+    return name
+
+
+class LicenseCatalog:
+    # Loads license_cost_data.json once and re-reads it only when its mtime
+    # changes. Plain keys go into a normalized dict; keys containing glob
+    # characters (e.g. "pycharm*") are kept as ordered rules. Every name that
+    # had to fall back to the rules is memoized, so repeat lookups are O(1).
+
+    def __init__(self, filename=LICENSE_COST_DATA_FILE, check_interval_s=1.0, aliases=ALIASES):
+        self.filename = filename
+        self.check_interval_s = check_interval_s
+        self.aliases = {normalize(k): normalize(v) for k, v in aliases.items()}
+        self.mtime = None
+        self.exact = {}
+        self.rules = []
+        self._resolved = {}
+        self._checked_at = 0.0
+        self.reload_if_changed(force=True)
+
+    def reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval_s:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        with open(self.filename, 'r') as f:
+            data = json.load(f)
+        self._build_index(data)
+        self.mtime = mtime
+        return True
+
+    def _build_index(self, data):
+        exact = {}
+        rules = []
+        for key, cost in data.items():
+            if any(ch in key for ch in GLOB_CHARS):
+                rules.append((normalize(key), float(cost)))
+            else:
+                exact[normalize(key)] = float(cost)
+        self.exact = exact
+        self.rules = rules
+        self._resolved = {}
+
+    def _lookup(self, name):
+        key = normalize(name)
+        cost = self.exact.get(key)
+        if cost is not None:
+            return cost
+        cost = self._resolved.get(key)
+        if cost is not None:
+            return cost
+        cost = 0.0
+        alias = self.aliases.get(key)
+        if alias is not None and alias in self.exact:
+            cost = self.exact[alias]
+        else:
+            for pattern, rule_cost in self.rules:
+                if fnmatchcase(key, pattern):
+                    cost = rule_cost
+                    break
+        self._resolved[key] = cost
+        return cost
+
+    def get(self, name, default=0.0):
+        if not name:
+            return default
+        self.reload_if_changed()
+        return self._lookup(name)
+
+    def licensed_names(self):
+        # Normalized plain keys with a cost; glob rules can't be enumerated
+        self.reload_if_changed()
+        return [name for name, cost in self.exact.items() if cost > 0]
+
+    def get_many(self, names):
+        # Resolve a whole sweep at once: one mtime check, then dict lookups
+        self.reload_if_changed(force=True)
+        lookup = self._lookup
+        return [lookup(name) if name else 0.0 for name in names]
@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+import instrument
+
+STATE_DIR = 'process_state'
+SEGMENT_BYTES = 8 * 1024 * 1024
+MAX_SEGMENTS = 8
+FSYNC_EVERY_S = 5.0
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if hasattr(value, 'to_state'):
+        return value.to_state()
+    return str(value)
+
+
+def _decode(obj):
+    if len(obj) == 1 and '$dt' in obj:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def _fingerprint(value, volatile):
+    if hasattr(value, 'fingerprint'):
+        return value.fingerprint()
+    try:
+        if isinstance(value, dict):
+            return hash(tuple((k, v) for k, v in value.items() if k not in volatile))
+        return hash(value)
+    except TypeError:
+        # Nested containers: fall back to hashing the serialized form
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k not in volatile}
+        return hash(json.dumps(value, default=_encode, sort_keys=True))
+
+
+class ChangeLog:
+    # Append-only JSON Lines log of keyed records, one line per change:
+    #   {"s": store, "k": key, "v": value}   or   {"s": store, "k": key, "d": 1}
+    # sync_store() diffs a dict against what was last written and appends only
+    # the records that changed or disappeared, so write volume follows churn.
+    # Segments rotate at SEGMENT_BYTES; once there are MAX_SEGMENTS of them the
+    # log is compacted into a single checkpoint segment. fsync is batched to
+    # at most once every fsync_every_s. replay() rebuilds the state on startup.
+
+    def __init__(self, directory=STATE_DIR, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS, fsync_every_s=FSYNC_EVERY_S):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync_every_s = fsync_every_s
+        self.fingerprints = {}  # store -> {key: fingerprint of last written value}
+        self.records_written = 0
+        self.bytes_written = 0
+        self._synced_at = time.monotonic()
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        segments = self.segments()
+        self._seq = self._segment_seq(segments[-1]) if segments else 0
+        if segments and os.path.getsize(segments[-1]) < segment_bytes:
+            # Keep appending to the last segment so restarts don't leave a
+            # trail of small segments that trigger early compactions
+            self._open_segment(self._seq)
+        else:
+            self._open_next_segment()
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f'segment.{seq:08d}.jsonl')
+
+    @staticmethod
+    def _segment_seq(path):
+        return int(os.path.basename(path).split('.')[1])
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment.*.jsonl')))
+
+    def _open_segment(self, seq):
+        path = self._segment_path(seq)
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell():
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+            if torn:
+                # End the torn line so the next record starts on its own;
+                # replay() skips the fragment
+                self._file.write('\n')
+
+    def _open_next_segment(self):
+        self._seq += 1
+        self._open_segment(self._seq)
+
+    def replay(self):
+        # {store: {key: value}} as of the last record in the log
+        state = {}
+        for path in self.segments():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line, object_hook=_decode)
+                    except ValueError:
+                        continue  # Torn write at the end of a segment
+                    records = state.setdefault(record['s'], {})
+                    key = record['k']
+                    if isinstance(key, list):
+                        key = tuple(key)  # Tuple keys come back from JSON as lists
+                    if record.get('d'):
+                        records.pop(key, None)
+                    else:
+                        records[key] = record['v']
+        return state
+
+    def load(self, volatile=()):
+        # replay() and remember what is on disk so unchanged records are skipped
+        volatile = set(volatile)
+        state = self.replay()
+        for store, records in state.items():
+            self.fingerprints[store] = {key: _fingerprint(value, volatile) for key, value in records.items()}
+        return state
+
+    def remember(self, store, mapping, volatile=()):
+        # Treat mapping as already written, e.g. after rebuilding it from load()
+        volatile = set(volatile)
+        self.fingerprints[store] = {key: _fingerprint(value, volatile) for key, value in mapping.items()}
+
+    def _append(self, record):
+        line = json.dumps(record, default=_encode, separators=(',', ':')) + '\n'
+        self._file.write(line)
+        self.records_written += 1
+        self.bytes_written += len(line)
+        self._dirty = True
+
+    def sync_store(self, store, mapping, volatile=()):
+        # Append records for keys whose value changed (ignoring `volatile`
+        # fields) and deletions for keys no longer present
+        volatile = set(volatile)
+        written = self.fingerprints.setdefault(store, {})
+        records_before = self.records_written
+        seen = set()
+        for key, value in mapping.items():
+            seen.add(key)
+            fingerprint = _fingerprint(value, volatile)
+            if written.get(key) != fingerprint:
+                self._append({'s': store, 'k': key, 'v': value})
+                written[key] = fingerprint
+        for key in [key for key in written if key not in seen]:
+            self._append({'s': store, 'k': key, 'd': 1})
+            del written[key]
+        with instrument.timed('db_commit_seconds', table='state_log'):
+            self.flush()
+        instrument.inc('rows_written_total', self.records_written - records_before, destination='state_log')
+
+    def flush(self, force=False):
+        if not self._dirty:
+            return
+        self._file.flush()
+        if force or time.monotonic() - self._synced_at >= self.fsync_every_s:
+            os.fsync(self._file.fileno())
+            self._synced_at = time.monotonic()
+            self._dirty = False
+        if self._file.tell() >= self.segment_bytes:
+            self.rotate()
+
+    def rotate(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._dirty = False
+        if len(self.segments()) >= self.max_segments:
+            self._compact()
+        self._open_next_segment()
+
+    def _compact(self):
+        # Rewrite the whole log as one checkpoint segment, then drop the rest
+        old_segments = self.segments()
+        state = self.replay()
+        self._seq += 1
+        path = self._segment_path(self._seq)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for store, records in state.items():
+                for key, value in records.items():
+                    f.write(json.dumps({'s': store, 'k': key, 'v': value}, default=_encode, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        for old in old_segments:
+            os.remove(old)
+
+    def close(self):
+        self.flush(force=True)
+        self._file.close()
@@ -0,0 +1,417 @@
+import itertools
+import os
+import pwd
+import random
+import time
+from collections import namedtuple
+
+import psutil
+
+# Same shapes as the psutil fields the scanners read
+MemoryInfo = namedtuple('MemoryInfo', ['rss', 'vms'])
+IoCounters = namedtuple('IoCounters', ['read_bytes', 'write_bytes'])
+
+PROC_ROOT = '/proc'
+COMM_LEN = 15  # The kernel truncates /proc/<pid>/stat's command name to this
+
+
+def _read(path):
+    # One open/read/close; /proc files are small and generated on read
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 4096)
+    finally:
+        os.close(fd)
+
+
+class CounterDeltas:
+    # Per-process state for turning cumulative counters into deltas. Keyed by
+    # (pid, create_time) so a recycled PID starts from scratch instead of
+    # producing a negative or inflated delta.
+
+    def __init__(self):
+        self.previous = {}
+        self._current = {}
+
+    def delta(self, key, values):
+        previous = self.previous.get(key)
+        self._current[key] = values
+        if previous is None:
+            return None
+        return tuple(max(0, new - old) for new, old in zip(values, previous))
+
+    def end_sweep(self):
+        # Forget processes that didn't show up in this sweep
+        self.previous, self._current = self._current, {}
+
+
+# Always part of a sweep: identify the process, and cheap with either sampler
+ALWAYS_READ = frozenset(('pid', 'ppid', 'name', 'create_time', 'cpu_percent', 'cpu_times'))
+ALL_FIELDS = frozenset(('memory_info', 'io_counters', 'num_threads', 'username')) | ALWAYS_READ
+
+
+class CachedFields:
+    # Last read attributes per (pid, create_time), so a sweep can skip the
+    # ones that aren't due. Like CounterDeltas, processes missing from a
+    # sweep are forgotten.
+
+    def __init__(self):
+        self.previous = {}
+        self._current = {}
+
+    def get(self, key):
+        return self.previous.get(key)
+
+    def put(self, key, info):
+        self._current[key] = info
+        return info
+
+    def end_sweep(self):
+        self.previous, self._current = self._current, {}
+
+
+class SampledProcess:
+    __slots__ = ('pid', 'info')
+
+    def __init__(self, pid, info):
+        self.pid = pid
+        self.info = info
+
+
+class ProcSampler:
+    # Linux sampler that reads /proc/[pid]/stat, statm and io directly: three
+    # small reads and one stat() per process, against the dozen or so
+    # syscalls psutil makes for the same attributes. CPU% and I/O byte rates
+    # come from deltas against the previous sweep of the same process.
+    # sample() returns dicts with the psutil process_iter field names, plus
+    # 'ppid', 'cpu_time' (user + system seconds), 'io_delta' (bytes since the
+    # last sweep) and 'io_rate' (bytes/s).
+    # stat is read every sweep; statm and io only when 'memory_info' /
+    # 'io_counters' are in `refresh` (or the process is new), otherwise the
+    # last values are reused and io_delta is None until the next read.
+
+    def __init__(self, proc_root=PROC_ROOT):
+        self.proc_root = proc_root
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.boot_time = self._boot_time()
+        self.cpu = CounterDeltas()
+        self.io = CounterDeltas()
+        self.users = {}
+        self.cached = CachedFields()
+        self._sampled_at = None
+        self._io_sampled_at = None
+
+    def _boot_time(self):
+        for line in _read(os.path.join(self.proc_root, 'stat')).split(b'\n'):
+            if line.startswith(b'btime'):
+                return int(line.split()[1])
+        return 0
+
+    def _username(self, uid):
+        name = self.users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self.users[uid] = name
+        return name
+
+    @staticmethod
+    def _full_name(base, comm):
+        # The untruncated name, like psutil: the basename of argv[0], or of
+        # the executable, when it starts with the truncated command name
+        try:
+            argv0 = os.path.basename(_read(base + '/cmdline').partition(b'\0')[0].decode('utf-8', 'replace'))
+            if argv0.startswith(comm):
+                return argv0
+            exe = os.path.basename(os.readlink(base + '/exe'))
+            if exe.startswith(comm):
+                return exe
+        except OSError:
+            pass  # Exited, or another user's process without a readable exe
+        return comm
+
+    def _read_process(self, pid, elapsed, io_elapsed, refresh):
+        base = f'{self.proc_root}/{pid}'
+        stat = _read(base + '/stat')
+        # The command name is in parentheses and may itself contain spaces or ')'
+        left, _, right = stat.rpartition(b')')
+        name = left.partition(b'(')[2].decode('utf-8', 'replace')
+        fields = right.split()
+        ppid = int(fields[1])
+        cpu_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+        num_threads = int(fields[17])
+        start_ticks = int(fields[19])
+        create_time = self.boot_time + start_ticks / self.clock_ticks
+
+        key = (pid, start_ticks)
+        cached = self.cached.get(key)
+        if len(name) >= COMM_LEN:
+            if cached is not None and cached['name'].startswith(name):
+                name = cached['name']
+            else:
+                name = self._full_name(base, name)
+        if cached is None or 'memory_info' in refresh:
+            statm = _read(base + '/statm').split()
+            memory_info = MemoryInfo(rss=int(statm[1]) * self.page_size, vms=int(statm[0]) * self.page_size)
+        else:
+            memory_info = cached['memory_info']
+
+        read_io = cached is None or 'io_counters' in refresh
+        if read_io:
+            try:
+                io_counters = None
+                read_bytes = write_bytes = 0
+                for line in _read(base + '/io').split(b'\n'):
+                    if line.startswith(b'read_bytes:'):
+                        read_bytes = int(line.split()[1])
+                    elif line.startswith(b'write_bytes:'):
+                        write_bytes = int(line.split()[1])
+                io_counters = IoCounters(read_bytes, write_bytes)
+            except PermissionError:
+                pass
+        else:
+            io_counters = cached['io_counters']
+
+        # The owner of a process doesn't change often enough to stat() it every sweep
+        username = cached['username'] if cached is not None else self._username(os.stat(base).st_uid)
+
+        cpu_delta = self.cpu.delta(key, (cpu_ticks,))
+        cpu_percent = 0.0
+        if cpu_delta is not None and elapsed:
+            cpu_percent = cpu_delta[0] / self.clock_ticks / elapsed * 100
+
+        io_delta = io_rate = None
+        if io_counters is not None and read_io:
+            delta = self.io.delta(key, io_counters)
+            if delta is not None:
+                io_delta = IoCounters(*delta)
+                if io_elapsed:
+                    io_rate = IoCounters(delta[0] / io_elapsed, delta[1] / io_elapsed)
+
+        return self.cached.put(key, {
+            'pid': pid,
+            'ppid': ppid,
+            'name': name,
+            'memory_info': memory_info,
+            'num_threads': num_threads,
+            'cpu_percent': cpu_percent,
+            'cpu_time': cpu_ticks / self.clock_ticks,
+            'create_time': create_time,
+            'username': username,
+            'io_counters': io_counters,
+            'io_delta': io_delta,
+            'io_rate': io_rate,
+        })
+
+    def sample(self, refresh=None):
+        # refresh: process_iter attrs to re-read this sweep; None means all
+        refresh = ALL_FIELDS if refresh is None else frozenset(refresh)
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else None
+        self._sampled_at = now
+        refresh_io = 'io_counters' in refresh
+        io_elapsed = now - self._io_sampled_at if self._io_sampled_at is not None else None
+        if refresh_io:
+            self._io_sampled_at = now
+        processes = []
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            try:
+                processes.append(self._read_process(int(entry), elapsed, io_elapsed, refresh))
+            except (FileNotFoundError, ProcessLookupError, PermissionError, IndexError, ValueError):
+                continue  # Exited mid-read, or a kernel thread we can't inspect
+        self.cpu.end_sweep()
+        if refresh_io:
+            self.io.end_sweep()
+        self.cached.end_sweep()
+        return processes
+
+    def process_iter(self, attrs=None, refresh=None):
+        # Drop-in for psutil.process_iter(attrs) in the monitor_processes loops
+        for info in self.sample(refresh):
+            yield SampledProcess(info['pid'], info)
+
+
+class PsutilSampler:
+    # Fallback for platforms without /proc: psutil.process_iter with the same
+    # extra 'cpu_time', 'io_delta' and 'io_rate' fields, the last two computed
+    # from cumulative counters.
+    # Attributes left out of `refresh` are asked of psutil only for new
+    # processes; the others get their last values.
+
+    def __init__(self):
+        self.io = CounterDeltas()
+        self.cached = CachedFields()
+        self._sampled_at = None
+
+    def process_iter(self, attrs=None, refresh=None):
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else None
+        attrs = list(attrs) if attrs else None
+        if attrs is not None:
+            attrs = list(dict.fromkeys(attrs + ['create_time', 'cpu_times', 'io_counters']))
+        if refresh is None or attrs is None:
+            fresh, stale = attrs, []
+        else:
+            fresh = [attr for attr in attrs if attr in refresh or attr in ALWAYS_READ]
+            stale = [attr for attr in attrs if attr not in fresh]
+        refresh_io = 'io_counters' not in stale
+        if refresh_io:
+            self._sampled_at = now
+        for proc in psutil.process_iter(fresh):
+            info = proc.info
+            key = (proc.pid, info.get('create_time'))
+            cached = None
+            if stale:
+                cached = self.cached.get(key)
+                if cached is None:
+                    try:
+                        info.update(proc.as_dict(stale))
+                    except psutil.Error:
+                        continue
+                else:
+                    for attr in stale:
+                        info[attr] = cached[attr]
+            cpu_times = info.get('cpu_times')
+            info['cpu_time'] = cpu_times.user + cpu_times.system if cpu_times is not None else None
+            io_counters = info.get('io_counters')
+            info['io_delta'] = info['io_rate'] = None
+            if io_counters is not None and (refresh_io or cached is None):
+                delta = self.io.delta(key, (io_counters.read_bytes, io_counters.write_bytes))
+                if delta is not None:
+                    info['io_delta'] = IoCounters(*delta)
+                    if elapsed:
+                        info['io_rate'] = IoCounters(delta[0] / elapsed, delta[1] / elapsed)
+            self.cached.put(key, info)
+            yield proc
+        if refresh_io:
+            self.io.end_sweep()
+        self.cached.end_sweep()
+
+
+# Names the synthetic table draws from, most common first; the rest are
+# generated (proc_<n>.exe). Several are priced in license_cost_data.json.
+SYNTHETIC_NAMES = (
+    'svchost.exe', 'chrome.exe', 'bash', 'python.exe', 'code', 'teams.exe', 'outlook.exe',
+    'excel.exe', 'slack.exe', 'firefox.exe', 'java', 'matlab', 'intellij_idea.exe', 'zoom.exe',
+    'adobe_photoshop.exe', 'microsoft_word.exe', 'postgres', 'nginx', 'dockerd', 'sshd',
+)
+SYNTHETIC_USERS = ('root', 'system', 'alice', 'bob', 'carol', 'dave')
+
+
+class SyntheticSampler:
+    # Reproducible fake process table with the ProcSampler interface, for
+    # benchmarks and for running the collectors without a real host. Names
+    # follow a Zipf-like mix of SYNTHETIC_NAMES and generated ones, children
+    # often share their parent's name (browser and IDE helpers), memory and
+    # thread counts are log-normal and most processes are near-idle. Each
+    # sweep `churn` of the processes exit and as many start, and about 10%
+    # change memory and CPU. Time is simulated: interval_s per sweep.
+    # With auto_advance, every process_iter() after the first advances one
+    # sweep; otherwise call advance() yourself.
+
+    def __init__(self, num_processes=1000, churn=0.02, seed=0, interval_s=5.0, start=1.7e9, auto_advance=True):
+        self.rng = random.Random(seed)
+        self.churn = churn
+        self.interval_s = interval_s
+        self.now = start
+        self.auto_advance = auto_advance
+        self.names = list(SYNTHETIC_NAMES) + [f'proc_{i}.exe' for i in range(max(1, num_processes // 20))]
+        self.name_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(self.names))))
+        self.processes = {}  # pid -> info dict, in start order
+        self.next_pid = 1
+        self._pid_list = None
+        self._changed = []  # pids whose io_delta is set for the current sweep
+        self._sampled = False
+        self._spawn(None)  # pid 1, the root of the tree
+        for _ in range(num_processes - 1):
+            self._spawn(self._random_parent())
+        self.size = num_processes
+
+    def _pids(self):
+        if self._pid_list is None:
+            self._pid_list = list(self.processes)
+        return self._pid_list
+
+    def _random_parent(self):
+        return self.processes[self.rng.choice(self._pids())] if self.processes else None
+
+    def _spawn(self, parent):
+        rng = self.rng
+        pid = self.next_pid
+        self.next_pid += 1
+        if parent is not None and rng.random() < 0.4:
+            name = parent['name']
+        else:
+            name = rng.choices(self.names, cum_weights=self.name_weights)[0]
+        memory = rng.lognormvariate(3.5, 1.4) * 1024 ** 2  # Median ~33 MB
+        info = {
+            'pid': pid,
+            'ppid': parent['pid'] if parent is not None else 0,
+            'name': name,
+            'memory_info': MemoryInfo(rss=int(memory), vms=int(memory * 4)),
+            'num_threads': max(1, int(rng.lognormvariate(1.5, 1.0))),
+            'cpu_percent': self._cpu_percent(),
+            'cpu_time': 0.0,
+            'create_time': self.now - rng.uniform(0, self.interval_s),
+            'username': parent['username'] if parent is not None and rng.random() < 0.8 else rng.choice(SYNTHETIC_USERS),
+            'io_counters': IoCounters(0, 0),
+            'io_delta': None,
+            'io_rate': None,
+        }
+        self.processes[pid] = info
+        if self._pid_list is not None:
+            self._pid_list.append(pid)
+        return info
+
+    def _cpu_percent(self):
+        # Percent of one core, like psutil: mostly idle, a few busy
+        return min(100.0, self.rng.expovariate(1.0)) if self.rng.random() < 0.9 else self.rng.uniform(5, 100)
+
+    def advance(self):
+        rng = self.rng
+        self.now += self.interval_s
+        for info in self.processes.values():
+            info['cpu_time'] += info['cpu_percent'] / 100 * self.interval_s
+        for pid in self._changed:
+            info = self.processes.get(pid)
+            if info is not None:
+                info['io_delta'] = info['io_rate'] = None  # Deltas only cover the sweep they were read in
+        count = int(len(self.processes) * self.churn)
+        if count:
+            for pid in rng.sample(self._pids()[1:], min(count, len(self.processes) - 1)):
+                del self.processes[pid]
+            self._pid_list = None
+            for _ in range(count):
+                self._spawn(self._random_parent())
+        self._changed = rng.sample(self._pids(), len(self.processes) // 10)
+        for pid in self._changed:
+            info = self.processes[pid]
+            rss = int(info['memory_info'].rss * rng.uniform(0.9, 1.1))
+            info['memory_info'] = MemoryInfo(rss=rss, vms=rss * 4)
+            info['cpu_percent'] = self._cpu_percent()
+            read_bytes, write_bytes = info['io_counters']
+            delta = IoCounters(rng.randrange(1 << 20), rng.randrange(1 << 18))
+            info['io_counters'] = IoCounters(read_bytes + delta.read_bytes, write_bytes + delta.write_bytes)
+            info['io_delta'] = delta
+            info['io_rate'] = IoCounters(delta.read_bytes / self.interval_s, delta.write_bytes / self.interval_s)
+
+    def sample(self, refresh=None):
+        if self._sampled and self.auto_advance:
+            self.advance()
+        self._sampled = True
+        return list(self.processes.values())
+
+    def process_iter(self, attrs=None, refresh=None):
+        for info in self.sample(refresh):
+            yield SampledProcess(info['pid'], info)
+
+
+def default_sampler():
+    if os.path.exists(os.path.join(PROC_ROOT, 'self', 'stat')):
+        return ProcSampler()
+    return PsutilSampler()
@@ -0,0 +1,174 @@
+from operator import attrgetter
+
+# Sort keys for AppGroup rankings (topk.TopKIndex)
+GROUP_SORT_KEYS = {
+    'memory': attrgetter('memory_usage'),
+    'cpu': attrgetter('cpu_usage'),
+    'carbon': attrgetter('carbon_footprint'),
+    'license_cost': attrgetter('license_cost'),
+    'threads': attrgetter('num_threads'),
+}
+
+
+class TreeNode:
+    # One live process, keyed by (pid, create_time). owner is the key of the
+    # AppGroup its metrics are rolled up into.
+    __slots__ = ('pid', 'started', 'ppid', 'name', 'username', 'license_cost', 'sustainability_rating', 'owner',
+                 'memory_usage', 'num_threads', 'cpu_usage', 'io_bytes', 'carbon_footprint')
+
+    def __init__(self, pid, started, ppid, name, username, license_cost, sustainability_rating,
+                 memory_usage, num_threads, cpu_usage, io_bytes, carbon_footprint):
+        self.pid = pid
+        self.started = started
+        self.ppid = ppid
+        self.name = name
+        self.username = username
+        self.license_cost = license_cost
+        self.sustainability_rating = sustainability_rating
+        self.owner = None
+        self.memory_usage = memory_usage
+        self.num_threads = num_threads
+        self.cpu_usage = cpu_usage
+        self.io_bytes = io_bytes
+        self.carbon_footprint = carbon_footprint
+
+    @property
+    def key(self):
+        return (self.pid, self.started)
+
+
+class AppGroup:
+    # An application: the root process it is named after plus every
+    # descendant attributed to it, with their metrics summed. The license
+    # cost is the root's, counted once however many children it spawns.
+    __slots__ = ('key', 'name', 'username', 'license_cost', 'sustainability_rating', 'members',
+                 'memory_usage', 'num_threads', 'cpu_usage', 'io_bytes', 'carbon_footprint')
+
+    def __init__(self, root):
+        self.key = root.key
+        self.name = root.name
+        self.username = root.username
+        self.license_cost = root.license_cost
+        self.sustainability_rating = root.sustainability_rating
+        self.members = set()
+        self.memory_usage = 0.0
+        self.num_threads = 0
+        self.cpu_usage = 0.0
+        self.io_bytes = 0
+        self.carbon_footprint = 0.0
+
+    def add(self, node):
+        self.members.add(node.key)
+        self.memory_usage += node.memory_usage
+        self.num_threads += node.num_threads
+        self.cpu_usage += node.cpu_usage
+        self.io_bytes += node.io_bytes
+        self.carbon_footprint += node.carbon_footprint
+
+    def remove(self, node):
+        self.members.discard(node.key)
+        self.memory_usage -= node.memory_usage
+        self.num_threads -= node.num_threads
+        self.cpu_usage -= node.cpu_usage
+        self.io_bytes -= node.io_bytes
+        self.carbon_footprint -= node.carbon_footprint
+
+
+class ProcessTree:
+    # ppid-linked model of the live processes, rolled up to applications.
+    # A new process joins its parent's application when that application is
+    # licensed, or when it has the same name as its parent (browser and IDE
+    # helpers); a licensed process under an unlicensed one starts its own
+    # application, and anything else stands alone. So every process ends up
+    # under the outermost licensed executable above it. Attribution is
+    # decided once, when a process first appears: children keep their
+    # application if the root exits and they are re-parented.
+    #
+    # update() touches only processes that started, exited or whose metrics
+    # changed, and adjusts their application's sums by the difference.
+
+    def __init__(self):
+        self.nodes = {}  # (pid, create_time) -> TreeNode
+        self.by_pid = {}  # pid -> key of the live process with that pid
+        self.groups = {}  # root key -> AppGroup
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def update(self, sweep):
+        # sweep: (pid, create_time, ppid, name, username, license_cost,
+        # sustainability_rating, memory_usage, num_threads, cpu_usage,
+        # io_bytes, carbon_footprint) for every live process. Returns the
+        # keys of the applications that changed, including removed ones.
+        nodes = self.nodes
+        groups = self.groups
+        changed = set()
+        seen = set()
+        new = []
+        for pid, started, ppid, name, username, license_cost, rating, memory, threads, cpu, io_bytes, carbon in sweep:
+            key = (pid, started)
+            seen.add(key)
+            node = nodes.get(key)
+            if node is None:
+                node = nodes[key] = TreeNode(pid, started, ppid, name, username, license_cost, rating, memory, threads, cpu, io_bytes, carbon)
+                self.by_pid[pid] = key
+                new.append(node)
+                continue
+            node.ppid = ppid
+            if (memory != node.memory_usage or threads != node.num_threads or cpu != node.cpu_usage
+                    or io_bytes != node.io_bytes or carbon != node.carbon_footprint):
+                group = groups[node.owner]
+                group.memory_usage += memory - node.memory_usage
+                group.num_threads += threads - node.num_threads
+                group.cpu_usage += cpu - node.cpu_usage
+                group.io_bytes += io_bytes - node.io_bytes
+                group.carbon_footprint += carbon - node.carbon_footprint
+                node.memory_usage, node.num_threads, node.cpu_usage, node.io_bytes, node.carbon_footprint = memory, threads, cpu, io_bytes, carbon
+                changed.add(node.owner)
+
+        for key in nodes.keys() - seen:
+            node = nodes.pop(key)
+            if self.by_pid.get(node.pid) == key:
+                del self.by_pid[node.pid]
+            group = groups[node.owner]
+            group.remove(node)
+            if not group.members:
+                del groups[node.owner]
+            changed.add(node.owner)
+
+        # Parents start before their children, so attach in start order
+        new.sort(key=attrgetter('started'))
+        for node in new:
+            node.owner = self._owner(node)
+            group = groups.get(node.owner)
+            if group is None:
+                group = groups[node.owner] = AppGroup(node)
+            group.add(node)
+            changed.add(node.owner)
+        return changed
+
+    def parent(self, node):
+        # Live parent, unless the pid has since been reused by a newer process
+        parent = self.nodes.get(self.by_pid.get(node.ppid))
+        if parent is None or parent is node or parent.started > node.started:
+            return None
+        return parent
+
+    def _owner(self, node):
+        parent = self.parent(node)
+        if parent is not None and parent.owner is not None:
+            group = self.groups[parent.owner]
+            if group.license_cost or (not node.license_cost and node.name == parent.name):
+                return parent.owner
+        return node.key
+
+    def hierarchy(self, group_key):
+        # [(node, parent key or None)] for one application in start order;
+        # the parent is None for processes whose parent is outside it
+        group = self.groups[group_key]
+        members = sorted((self.nodes[key] for key in group.members), key=attrgetter('started'))
+        rows = []
+        for node in members:
+            parent = self.parent(node)
+            rows.append((node, parent.key if parent is not None and parent.key in group.members else None))
+        return rows
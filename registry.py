@@ -0,0 +1,168 @@
+from datetime import datetime
+from operator import attrgetter
+
+from retention import touch
+
+
+# Sort keys offered by the process lists, as topk.TopKIndex value functions
+SORT_KEYS = {
+    'memory': attrgetter('memory_usage'),
+    'cpu': attrgetter('cpu_usage'),
+    'carbon': attrgetter('carbon_footprint'),
+    'license_cost': attrgetter('license_cost'),
+    'threads': attrgetter('num_threads'),
+}
+
+
+class Interner:
+    # One shared str object per distinct value, so thousands of records with
+    # the same name or username cost a pointer each instead of a copy
+
+    def __init__(self):
+        self.values = {}
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        return self.values.setdefault(value, value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ProcessRecord:
+    # Latest sample of one process. Records are replaced, not mutated, on
+    # every sweep, so a snapshot holding the previous ones stays consistent.
+    # Times are epoch floats; create_time / last_execution_time give datetimes.
+    __slots__ = ('pid', 'started', 'name', 'username', 'exe', 'memory_usage', 'num_threads', 'cpu_usage',
+                 'carbon_footprint', 'license_cost', 'sustainability_rating', 'first_seen', 'last_seen')
+
+    def __init__(self, pid, started, name, username, exe, memory_usage, num_threads, cpu_usage,
+                 carbon_footprint, license_cost, sustainability_rating, first_seen, last_seen):
+        self.pid = pid
+        self.started = started
+        self.name = name
+        self.username = username
+        self.exe = exe
+        self.memory_usage = memory_usage
+        self.num_threads = num_threads
+        self.cpu_usage = cpu_usage
+        self.carbon_footprint = carbon_footprint
+        self.license_cost = license_cost
+        self.sustainability_rating = sustainability_rating
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @property
+    def key(self):
+        return (self.pid, self.started)
+
+    @property
+    def create_time(self):
+        return datetime.fromtimestamp(self.started)
+
+    @property
+    def last_execution_time(self):
+        return datetime.fromtimestamp(self.last_seen)
+
+    def to_state(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+    def fingerprint(self):
+        # Everything but last_seen and carbon_footprint, which change every
+        # sweep; the latter is a running total that energy.EnergyLedger saves
+        return hash((self.name, self.username, self.exe, self.memory_usage, self.num_threads, self.cpu_usage,
+                     self.license_cost, self.sustainability_rating))
+
+
+class AppView:
+    # Per-application totals derived from the live records of one sweep
+    __slots__ = ('name', 'instances', 'pids', 'memory_usage', 'num_threads', 'cpu_usage', 'carbon_footprint',
+                 'license_cost', 'sustainability_rating', 'started', 'username', 'last_seen')
+
+    def __init__(self, record):
+        self.name = record.name
+        self.instances = 1
+        self.pids = [record.pid]
+        self.memory_usage = record.memory_usage
+        self.num_threads = record.num_threads
+        self.cpu_usage = record.cpu_usage
+        self.carbon_footprint = record.carbon_footprint
+        self.license_cost = record.license_cost
+        self.sustainability_rating = record.sustainability_rating
+        self.started = record.started
+        self.username = record.username
+        self.last_seen = record.last_seen
+
+    def add(self, record):
+        self.instances += 1
+        self.pids.append(record.pid)
+        self.memory_usage += record.memory_usage
+        self.num_threads += record.num_threads
+        self.cpu_usage += record.cpu_usage
+        self.carbon_footprint += record.carbon_footprint
+        self.sustainability_rating = max(self.sustainability_rating, record.sustainability_rating)
+        self.started = min(self.started, record.started)
+        self.last_seen = max(self.last_seen, record.last_seen)
+
+
+class ProcessRegistry:
+    # Processes keyed by (pid, create_time), so a recycled PID is a new
+    # process rather than a continuation of an unrelated one. records is kept
+    # in least-recently-updated order (retention.touch) so RetentionManager
+    # can evict from the front. Names, usernames and executables are interned.
+
+    def __init__(self):
+        self.records = {}
+        self.names = Interner()
+        self.users = Interner()
+        self.exes = Interner()
+        self.sweep_time = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def begin_sweep(self, now=None):
+        self.sweep_time = (now or datetime.now()).timestamp()
+        return self.sweep_time
+
+    def observe(self, pid, started, name, username=None, exe=None, memory_usage=0.0, num_threads=0, cpu_usage=0.0,
+                carbon_footprint=0.0, license_cost=0.0, sustainability_rating=0):
+        key = (pid, started)
+        previous = self.records.get(key)
+        first_seen = previous.first_seen if previous is not None else self.sweep_time
+        record = ProcessRecord(pid, started, self.names(name), self.users(username), self.exes(exe), memory_usage, num_threads, cpu_usage,
+                               carbon_footprint, license_cost, sustainability_rating, first_seen, self.sweep_time)
+        touch(self.records, key, record)
+        return record
+
+    def live(self):
+        # Records seen in the latest sweep; they sit at the end of records
+        sweep_time = self.sweep_time
+        live = []
+        for record in reversed(self.records.values()):
+            if record.last_seen != sweep_time:
+                break
+            live.append(record)
+        live.reverse()
+        return live
+
+    def apps(self, records=None):
+        # {name: AppView} over the given records (default: the latest sweep)
+        views = {}
+        for record in self.live() if records is None else records:
+            view = views.get(record.name)
+            if view is None:
+                views[record.name] = AppView(record)
+            else:
+                view.add(record)
+        return views
+
+    def load(self, state):
+        # Rebuild from ChangeLog state: {(pid, started): ProcessRecord.to_state()}
+        for key, fields in sorted(state.items(), key=lambda item: item[1][-1]):
+            record = ProcessRecord(*fields)
+            record.name = self.names(record.name)
+            record.username = self.users(record.username)
+            record.exe = self.exes(record.exe)
+            self.records[tuple(key)] = record
@@ -0,0 +1,169 @@
+import sys
+import time
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def touch(mapping, key, value):
+    # Re-insert so dict order is least-recently-updated first
+    mapping.pop(key, None)
+    mapping[key] = value
+
+
+def deep_sizeof(value, _depth=0):
+    # Rough resident size of one stored entry
+    if hasattr(value, 'nbytes'):
+        return sys.getsizeof(value) + value.nbytes()
+    size = sys.getsizeof(value)
+    if _depth < 3:
+        if isinstance(value, dict):
+            size += sum(deep_sizeof(v, _depth + 1) for v in value.values())
+        elif isinstance(value, (list, tuple)):
+            size += sum(deep_sizeof(v, _depth + 1) for v in value)
+    return size
+
+
+class TrackedStore:
+    __slots__ = ('name', 'mapping', 'last_seen', 'ttl', 'max_entries', 'evicted', 'entry_bytes')
+
+    def __init__(self, name, mapping, last_seen, ttl, max_entries):
+        self.name = name
+        self.mapping = mapping
+        self.last_seen = last_seen
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evicted = 0
+        self.entry_bytes = 0
+
+
+class TrackedTable:
+    __slots__ = ('conn', 'table', 'time_column', 'ttl', 'max_rows', 'deleted')
+
+    def __init__(self, conn, table, time_column, ttl, max_rows):
+        self.conn = conn
+        self.table = table
+        self.time_column = time_column
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.deleted = 0
+
+
+class RetentionManager:
+    # Keeps long-running collectors inside a fixed memory and row budget.
+    # In-memory stores are dicts kept in least-recently-updated order (see
+    # touch()); entries are evicted from the front once they are older than
+    # the TTL or the store is over its size cap. SQLite tables are trimmed by
+    # age and by row count, oldest rowids first, in small chunks, each its own
+    # transaction. step() keeps deleting chunks until the table is back under
+    # its caps or max_trim_s is spent, so it keeps up with sweeps that insert
+    # more than one chunk; it is meant to be called once per sweep.
+
+    def __init__(self, max_evictions_per_step=1000, chunk_rows=500, max_trim_s=0.25):
+        self.max_evictions_per_step = max_evictions_per_step
+        self.chunk_rows = chunk_rows
+        self.max_trim_s = max_trim_s
+        self.stores = {}
+        self.tables = []
+
+    def track(self, name, mapping, last_seen, ttl=None, max_entries=None):
+        self.stores[name] = TrackedStore(name, mapping, last_seen, ttl, max_entries)
+
+    def track_table(self, conn, table, time_column=None, ttl=None, max_rows=None):
+        if ttl is not None:
+            if time_column is None:
+                raise ValueError(f'{table}: a ttl needs a time_column to compare against')
+            # Each TTL chunk looks up the oldest rows by time
+            with conn:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{time_column} ON {table} ({time_column})')
+        self.tables.append(TrackedTable(conn, table, time_column, ttl, max_rows))
+
+    def step(self, now=None):
+        now = now or datetime.now()
+        for store in self.stores.values():
+            self._evict(store, now, self.max_evictions_per_step)
+        for table in self.tables:
+            self._trim(table, now)
+
+    def expire(self, name, ttl, now=None):
+        # Full scan for entries older than ttl, regardless of dict order
+        now = now or datetime.now()
+        store = self.stores[name]
+        stale = [key for key, value in store.mapping.items() if now - store.last_seen(value) > ttl]
+        for key in stale:
+            del store.mapping[key]
+        store.evicted += len(stale)
+        return len(stale)
+
+    def _evict(self, store, now, limit):
+        mapping = store.mapping
+        if mapping:
+            # Sample the newest entry for the memory estimate
+            store.entry_bytes = deep_sizeof(next(reversed(mapping.values())))
+        evicted = 0
+        while mapping and evicted < limit:
+            key = next(iter(mapping))
+            over_cap = store.max_entries is not None and len(mapping) > store.max_entries
+            expired = store.ttl is not None and now - store.last_seen(mapping[key]) > store.ttl
+            if not (over_cap or expired):
+                break
+            del mapping[key]
+            evicted += 1
+        store.evicted += evicted
+
+    def _row_span(self, table):
+        # Approximate row count from the rowid range; rows are only ever
+        # deleted oldest-first, so this stays close without a full COUNT(*).
+        # One aggregate per SELECT: SQLite only answers MIN/MAX from the rowid
+        # b-tree when it is alone, otherwise it scans the table.
+        low, high = table.conn.execute(f'SELECT (SELECT MIN(rowid) FROM {table.table}), (SELECT MAX(rowid) FROM {table.table})').fetchone()
+        if low is None:
+            return 0, 0
+        return low, high - low + 1
+
+    def _trim(self, table, now):
+        conn = table.conn
+        deadline = time.monotonic() + self.max_trim_s
+        deleted = 0
+        if table.ttl is not None:
+            cutoff = (now - table.ttl).strftime(TIME_FORMAT)
+            while True:
+                with conn:
+                    chunk = conn.execute(f'''
+                        DELETE FROM {table.table} WHERE rowid IN (
+                            SELECT rowid FROM {table.table} WHERE {table.time_column} < ? LIMIT ?
+                        )
+                    ''', (cutoff, self.chunk_rows)).rowcount
+                deleted += chunk
+                if chunk < self.chunk_rows or time.monotonic() >= deadline:
+                    break
+        if table.max_rows is not None:
+            while True:
+                low, rows = self._row_span(table)
+                excess = min(rows - table.max_rows, self.chunk_rows)
+                if excess <= 0:
+                    break
+                with conn:
+                    deleted += conn.execute(f'DELETE FROM {table.table} WHERE rowid < ?', (low + excess,)).rowcount
+                if time.monotonic() >= deadline:
+                    break
+        table.deleted += deleted
+
+    def budget(self):
+        # Current usage against the configured caps
+        report = {}
+        for store in self.stores.values():
+            report[store.name] = {
+                'entries': len(store.mapping),
+                'max_entries': store.max_entries,
+                'approx_bytes': len(store.mapping) * store.entry_bytes,
+                'max_bytes': store.max_entries * store.entry_bytes if store.max_entries is not None else None,
+                'evicted': store.evicted,
+            }
+        for table in self.tables:
+            report[table.table] = {
+                'rows': self._row_span(table)[1],
+                'max_rows': table.max_rows,
+                'deleted': table.deleted,
+            }
+        return report
@@ -0,0 +1,83 @@
+from array import array
+from collections import deque
+
+DEFAULT_CAPACITY = 720  # One hour of samples at a 5 s cadence
+
+
+class RingBuffer:
+    # Fixed-capacity history of (timestamp, value) samples for one metric,
+    # stored in two flat arrays of doubles. Sum, mean, min and max are kept up
+    # to date as samples arrive, so reading them never walks the history.
+
+    __slots__ = ('capacity', 'times', 'values', 'count', 'head', 'total', '_appended', '_min', '_max')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.count = 0
+        self.head = 0  # Slot the next sample goes into
+        self.total = 0.0
+        self._appended = 0
+        # Monotonic queues of (sequence number, value) for sliding min/max
+        self._min = deque()
+        self._max = deque()
+
+    def append(self, timestamp, value):
+        value = float(value)
+        if self.count == self.capacity:
+            self.total -= self.values[self.head]
+        else:
+            self.count += 1
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.total += value
+
+        seq = self._appended
+        self._appended += 1
+        oldest = seq - self.count + 1
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+        while self._max[0][0] < oldest:
+            self._max.popleft()
+
+        # Re-sum once per lap so floating point drift can't accumulate
+        if self.head == 0:
+            self.total = sum(self.values)
+
+    def __len__(self):
+        return self.count
+
+    def sum(self):
+        return self.total
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def min(self):
+        return self._min[0][1] if self.count else 0.0
+
+    def max(self):
+        return self._max[0][1] if self.count else 0.0
+
+    def last(self):
+        return self.values[self.head - 1] if self.count else 0.0
+
+    def items(self):
+        # Samples oldest first
+        start = (self.head - self.count) % self.capacity
+        for i in range(self.count):
+            slot = (start + i) % self.capacity
+            yield self.times[slot], self.values[slot]
+
+    def nbytes(self):
+        return (self.times.itemsize + self.values.itemsize) * self.capacity
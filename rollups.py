@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import instrument
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Bucket width and how long buckets of that width are kept (None = forever)
+RESOLUTIONS = {
+    'minute': (timedelta(minutes=1), timedelta(days=7)),
+    'hour': (timedelta(hours=1), timedelta(days=365)),
+    'day': (timedelta(days=1), None),
+}
+RAW_RETENTION = timedelta(hours=6)
+COMPACT_EVERY_S = 300
+
+
+def bucket_start(when, resolution):
+    if resolution == 'minute':
+        return when.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class Rollups:
+    # Sweep-level time series (average memory, average CPU, total CO2) kept at
+    # several resolutions. Every sample goes into a short raw window and is
+    # folded into its minute, hour and day bucket in the same transaction, so
+    # the coarse tables are always current. compact() drops raw samples and
+    # fine buckets once they age out; it runs on a schedule from add().
+
+    RAW_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS raw_samples (
+            time TEXT NOT NULL,
+            avg_memory_usage REAL,
+            avg_cpu_usage REAL,
+            total_carbon_footprint REAL
+        )
+    '''
+    BUCKET_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rollup_{0} (
+            bucket TEXT PRIMARY KEY,
+            sample_count INTEGER NOT NULL,
+            memory_sum REAL NOT NULL,
+            memory_max REAL NOT NULL,
+            cpu_sum REAL NOT NULL,
+            cpu_max REAL NOT NULL,
+            carbon_sum REAL NOT NULL
+        )
+    '''
+    BUCKET_UPSERT = '''
+        INSERT INTO rollup_{0} (bucket, sample_count, memory_sum, memory_max, cpu_sum, cpu_max, carbon_sum)
+        VALUES (?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET
+            sample_count = sample_count + 1,
+            memory_sum = memory_sum + excluded.memory_sum,
+            memory_max = MAX(memory_max, excluded.memory_max),
+            cpu_sum = cpu_sum + excluded.cpu_sum,
+            cpu_max = MAX(cpu_max, excluded.cpu_max),
+            carbon_sum = carbon_sum + excluded.carbon_sum
+    '''
+
+    def __init__(self, conn, raw_retention=RAW_RETENTION, compact_every_s=COMPACT_EVERY_S):
+        self.conn = conn
+        self.raw_retention = raw_retention
+        self.compact_every_s = compact_every_s
+        self.lock = threading.Lock()
+        self._compacted_at = time.monotonic()
+        with self.lock, conn:
+            conn.execute(self.RAW_SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_raw_samples_time ON raw_samples (time)')
+            for resolution in RESOLUTIONS:
+                conn.execute(self.BUCKET_SCHEMA.format(resolution))
+
+    def add(self, when, avg_memory_usage, avg_cpu_usage, total_carbon_footprint):
+        avg_cpu_usage = avg_cpu_usage or 0.0
+        total_carbon_footprint = total_carbon_footprint or 0.0
+        with instrument.timed('db_commit_seconds', table='rollups'), self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO raw_samples (time, avg_memory_usage, avg_cpu_usage, total_carbon_footprint) VALUES (?, ?, ?, ?)',
+                (when.strftime(TIME_FORMAT), avg_memory_usage, avg_cpu_usage, total_carbon_footprint))
+            for resolution in RESOLUTIONS:
+                bucket = bucket_start(when, resolution).strftime(TIME_FORMAT)
+                self.conn.execute(self.BUCKET_UPSERT.format(resolution),
+                                  (bucket, avg_memory_usage, avg_memory_usage, avg_cpu_usage, avg_cpu_usage, total_carbon_footprint))
+        if time.monotonic() - self._compacted_at >= self.compact_every_s:
+            self.compact(when)
+
+    def compact(self, now=None):
+        now = now or datetime.now()
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM raw_samples WHERE time < ?', ((now - self.raw_retention).strftime(TIME_FORMAT),))
+            for resolution, (_, keep) in RESOLUTIONS.items():
+                if keep is not None:
+                    self.conn.execute(f'DELETE FROM rollup_{resolution} WHERE bucket < ?', ((now - keep).strftime(TIME_FORMAT),))
+        self._compacted_at = time.monotonic()
+
+    def pick_resolution(self, start, end, max_points=500):
+        # Finest resolution that still has data for start and fits max_points
+        now = datetime.now()
+        start = start or now - RESOLUTIONS['hour'][1]
+        end = end or now
+        for resolution, (width, keep) in RESOLUTIONS.items():
+            if (end - start) / width <= max_points and (keep is None or start >= now - keep):
+                return resolution
+        return 'day'
+
+    def series(self, start=None, end=None, resolution=None, max_points=500):
+        # [(bucket, avg_memory, max_memory, avg_cpu, max_cpu, total_carbon)]
+        resolution = resolution or self.pick_resolution(start, end, max_points)
+        start = start.strftime(TIME_FORMAT) if start else ''
+        end = end.strftime(TIME_FORMAT) if end else '9999'
+        with self.lock:
+            rows = self.conn.execute(f'''
+                SELECT bucket, memory_sum / sample_count, memory_max, cpu_sum / sample_count, cpu_max, carbon_sum
+                FROM rollup_{resolution}
+                WHERE bucket >= ? AND bucket <= ?
+                ORDER BY bucket
+            ''', (start, end)).fetchall()
+        return [(datetime.strptime(row[0], TIME_FORMAT),) + tuple(row[1:]) for row in rows]
+
+    def bucket(self, when, resolution='hour'):
+        # (avg_memory, max_memory, avg_cpu, max_cpu, total_carbon) for the bucket containing `when`
+        key = bucket_start(when, resolution).strftime(TIME_FORMAT)
+        with self.lock:
+            return self.conn.execute(f'''
+                SELECT memory_sum / sample_count, memory_max, cpu_sum / sample_count, cpu_max, carbon_sum
+                FROM rollup_{resolution} WHERE bucket = ?
+            ''', (key,)).fetchone()
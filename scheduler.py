@@ -0,0 +1,153 @@
+import time
+
+# Adaptive sweep pacing in place of fixed root.after() intervals. Each metric
+# has its own tier; a sweep re-reads only the metrics that are due (the
+# samplers in proc_reader reuse the last values of the rest). Intervals
+# stretch while a metric isn't changing or the host is idle, and the sweep
+# rate is capped so the monitor's own CPU time stays within a budget.
+
+# Metric -> base interval in seconds
+DEFAULT_TIERS = {'cpu': 2.0, 'memory': 10.0, 'io': 10.0, 'threads': 60.0}
+# For the scripts that write sweeps to the processes table. Rows are only
+# written every store.PERSIST_EVERY_S; the CPU samples in between are
+# averaged in memory (store.SweepWindow) rather than stored.
+HISTORY_TIERS = {'cpu': 15.0, 'memory': 60.0, 'io': 60.0, 'threads': 300.0}
+# process_iter attrs each metric re-reads
+METRIC_ATTRS = {
+    'cpu': ('cpu_percent',),
+    'memory': ('memory_info',),
+    'io': ('io_counters',),
+    'threads': ('num_threads', 'username'),
+}
+CPU_BUDGET = 0.01  # Fraction of one core the sweeps may use on average
+MAX_STRETCH = 8.0  # Quiet metrics slow down to at most 8x their base interval
+STRETCH_STEP = 1.5
+QUIET_CHANGE = 0.02  # A metric whose total moved less than 2% since its last sample counts as unchanged
+IDLE_BUSY = 0.05  # Below 5% host CPU everything counts as quiet
+COST_SMOOTHING = 0.3  # Weight of the newest sweep in the running cost estimate
+
+
+def attrs_for(metrics):
+    return {attr for metric in metrics for attr in METRIC_ATTRS.get(metric, ())}
+
+
+class SamplingScheduler:
+    # begin() says which metrics to sample now; end() feeds back what the
+    # sweep cost (CPU seconds, e.g. from time.thread_time) and per-metric
+    # totals, from which the next due times are set. delay() is how long to
+    # wait before the next begin(): until the earliest metric is due, but
+    # never sooner than cost / budget after the previous sweep started.
+
+    def __init__(self, tiers=DEFAULT_TIERS, budget=CPU_BUDGET, max_stretch=MAX_STRETCH, clock=time.monotonic):
+        self.tiers = dict(tiers)
+        self.budget = budget
+        self.max_stretch = max_stretch
+        self.clock = clock
+        self.stretch = dict.fromkeys(self.tiers, 1.0)
+        self.next_due = dict.fromkeys(self.tiers, 0.0)  # Everything is due on the first sweep
+        self.totals = {}  # metric -> total at its last sample
+        self.cost_s = None  # Smoothed CPU seconds per sweep
+        self.sweeps = 0
+        self.throttled = 0  # Sweeps held back by the budget
+        self._started_at = None
+        self._throttled_this_sweep = False
+
+    def interval(self, metric):
+        return self.tiers[metric] * self.stretch[metric]
+
+    def min_gap(self):
+        # Shortest sweep-to-sweep time that keeps cost within the budget
+        if not self.cost_s or not self.budget:
+            return 0.0
+        return self.cost_s / self.budget
+
+    def delay(self):
+        now = self.clock()
+        wait = min(self.next_due.values()) - now
+        if self._started_at is not None:
+            budget_wait = self._started_at + self.min_gap() - now
+            if budget_wait > wait:
+                wait = budget_wait
+                if not self._throttled_this_sweep:
+                    # delay() may be asked more than once per sweep
+                    self._throttled_this_sweep = True
+                    self.throttled += 1
+        return max(0.0, wait)
+
+    def delay_ms(self):
+        # For Tk's after()
+        return max(1, int(self.delay() * 1000))
+
+    def begin(self):
+        # Metrics due now. Woken early (a manual refresh), nothing is due,
+        # so everything is sampled.
+        now = self.clock()
+        self._started_at = now
+        self._throttled_this_sweep = False
+        due = {metric for metric, at in self.next_due.items() if at <= now}
+        return due or set(self.tiers)
+
+    def end(self, metrics, cost_s, totals=None, busy=None):
+        # metrics: what begin() returned; totals: {metric: sum over the sweep};
+        # busy: host CPU in use as a fraction of all cores, if known
+        now = self.clock()
+        self.cost_s = cost_s if self.cost_s is None else self.cost_s + COST_SMOOTHING * (cost_s - self.cost_s)
+        idle = busy is not None and busy < IDLE_BUSY
+        totals = totals or {}
+        gap = self.min_gap()
+        for metric in metrics:
+            if metric not in self.tiers:
+                continue
+            total = totals.get(metric)
+            previous = self.totals.get(metric)
+            quiet = idle or (total is not None and previous is not None
+                             and abs(total - previous) <= QUIET_CHANGE * max(abs(previous), abs(total)))
+            if total is not None:
+                self.totals[metric] = total
+            if quiet:
+                self.stretch[metric] = min(self.stretch[metric] * STRETCH_STEP, self.max_stretch)
+            else:
+                self.stretch[metric] = 1.0
+            self.next_due[metric] = now + max(self.interval(metric), gap)
+        self.sweeps += 1
+
+    def stats(self):
+        return {
+            'sweeps': self.sweeps,
+            'throttled': self.throttled,
+            'cost_ms': (self.cost_s or 0.0) * 1000,
+            'intervals_s': {metric: self.interval(metric) for metric in self.tiers},
+        }
+
+
+class TkLoop:
+    # Runs step(metrics) -> totals on a Tk widget's after() at the scheduler's
+    # pace, timing each run with the thread's CPU clock. run_now() is for
+    # Refresh buttons: it replaces the pending run instead of starting a
+    # second loop. busy(totals) turns the totals into host CPU use, if the
+    # step can tell.
+
+    def __init__(self, widget, scheduler, step, busy=None):
+        self.widget = widget
+        self.scheduler = scheduler
+        self.step = step
+        self.busy = busy
+        self._job = None
+
+    def run(self):
+        self._job = None
+        metrics = self.scheduler.begin()
+        started = time.thread_time()
+        totals = None
+        try:
+            totals = self.step(metrics)
+        finally:
+            # A failed sweep still counts, and the loop keeps going
+            busy = self.busy(totals) if self.busy is not None and totals else None
+            self.scheduler.end(metrics, time.thread_time() - started, totals, busy)
+            self._job = self.widget.after(self.scheduler.delay_ms(), self.run)
+
+    def run_now(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+        self.run()
@@ -0,0 +1,84 @@
+import json
+import os
+import socket
+from collections import namedtuple
+
+import numpy as np
+
+POWER_MODEL_FILE = 'power_model.json'
+
+# Watts at 100% CPU, watts per GB resident, kg CO2 per kWh, and how many
+# hours each sample is taken to represent (only by the per-sample scores;
+# energy.EnergyLedger integrates over the real time between samples)
+PowerModel = namedtuple('PowerModel', ['cpu_power_w', 'memory_power_w_per_gb', 'emissions_factor_kg_co2_per_kwh', 'interval_hours'])
+DEFAULT_POWER_MODEL = PowerModel(
+    cpu_power_w=50,
+    memory_power_w_per_gb=5,
+    emissions_factor_kg_co2_per_kwh=0.475,
+    interval_hours=1.0,
+)
+
+# Sustainability rating thresholds: one point for each one a process stays under
+RATING_MEMORY_MB = 500
+RATING_THREADS = 10
+
+Scores = namedtuple('Scores', ['power_w', 'energy_kwh', 'carbon_kg', 'rating'])
+
+
+def load_power_model(filename=POWER_MODEL_FILE, hostname=None):
+    # power_model.json is optional and looks like
+    #   {"default": {"cpu_power_w": 65}, "hosts": {"build-01": {"cpu_power_w": 180}}}
+    # Host entries override the default entry, which overrides the built-ins.
+    if not os.path.exists(filename):
+        return DEFAULT_POWER_MODEL
+    with open(filename, 'r') as f:
+        config = json.load(f)
+    hostname = hostname or socket.gethostname()
+    overrides = dict(config.get('default', {}))
+    overrides.update(config.get('hosts', {}).get(hostname, {}))
+    return DEFAULT_POWER_MODEL._replace(**overrides)
+
+
+# The formulas below are plain arithmetic, so they work unchanged on Python
+# floats and on NumPy arrays covering a whole sweep
+
+def power_w(cpu_percent, memory_mb, model=DEFAULT_POWER_MODEL):
+    return (cpu_percent / 100) * model.cpu_power_w + (memory_mb / 1024) * model.memory_power_w_per_gb
+
+
+def interval_energy_kwh(cpu_seconds, memory_mb, elapsed_s, cpu_count=1, model=DEFAULT_POWER_MODEL):
+    # Energy actually used over elapsed_s, from the CPU time spent in it.
+    # cpu_power_w is drawn with every core busy, so one core-second of CPU
+    # time costs cpu_power_w / cpu_count joules.
+    return (cpu_seconds / cpu_count * model.cpu_power_w + (memory_mb / 1024) * model.memory_power_w_per_gb * elapsed_s) / 3_600_000
+
+
+def carbon_kg(power, model=DEFAULT_POWER_MODEL):
+    return power * model.interval_hours / 1000 * model.emissions_factor_kg_co2_per_kwh
+
+
+def rating(memory_mb, num_threads):
+    return (memory_mb < RATING_MEMORY_MB) * 1 + (num_threads < RATING_THREADS) * 1
+
+
+def score_sweep(cpu_percent, memory_mb, num_threads, model=DEFAULT_POWER_MODEL):
+    # Score every process of a sweep in one pass over columnar arrays
+    cpu_percent = np.asarray(cpu_percent, dtype=np.float64)
+    memory_mb = np.asarray(memory_mb, dtype=np.float64)
+    num_threads = np.asarray(num_threads, dtype=np.int64)
+    power = power_w(cpu_percent, memory_mb, model)
+    energy = power * model.interval_hours / 1000
+    return Scores(
+        power_w=power,
+        energy_kwh=energy,
+        carbon_kg=energy * model.emissions_factor_kg_co2_per_kwh,
+        rating=rating(memory_mb, num_threads),
+    )
+
+
+def carbon_footprint(avg_cpu_percent, avg_memory_usage_mb, model=DEFAULT_POWER_MODEL):
+    return carbon_kg(power_w(avg_cpu_percent, avg_memory_usage_mb, model), model)
+
+
+def sustainability_rating(avg_memory_usage_mb, num_threads):
+    return rating(avg_memory_usage_mb, num_threads)
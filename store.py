@@ -0,0 +1,318 @@
+import sqlite3
+import time
+
+import instrument
+
+DB_FILE = 'process_monitor.db'
+PERSIST_EVERY_S = 60.0  # Shortest gap between sweeps written to the processes table
+MAX_FLUSH_RETRIES = 3  # Failed flushes of the same rows before BatchWriter drops them
+
+# SQLite tuning for a write-heavy sampler: WAL lets the UI read while a sweep
+# is being written, and synchronous=NORMAL only fsyncs at checkpoints.
+PRAGMAS = (
+    'PRAGMA page_size=8192',  # Only takes effect on a fresh database
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16384',  # 16 MB
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA wal_autocheckpoint=2000',
+)
+
+
+def add_column_if_missing(conn, table, column, decl):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def create_indexes(conn, statements):
+    with conn:
+        for statement in statements:
+            conn.execute(statement)
+
+
+def connect(filename=DB_FILE, **kwargs):
+    conn = sqlite3.connect(filename, **kwargs)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class BatchWriter:
+    # Buffers rows for one table and writes them with executemany() inside a
+    # single transaction. A flush happens once max_rows are buffered or the
+    # oldest buffered row is older than max_delay_s; readers should call
+    # flush() before querying so they see the latest sweep. Rows whose
+    # flush fails are retried with the next one, at most max_retries times
+    # and max_retained_rows at once (default 4 * max_rows); past either the
+    # oldest are dropped and logged.
+
+    def __init__(self, conn, table, columns, max_rows=10000, max_delay_s=5.0, on_flush=None,
+                 max_retries=MAX_FLUSH_RETRIES, max_retained_rows=None):
+        self.conn = conn
+        self.columns = tuple(columns)
+        # on_flush(conn, rows) runs inside the insert transaction, so derived
+        # tables stay consistent with the raw rows. It may return a function
+        # to call once the transaction has committed, for in-memory state a
+        # rollback would not undo.
+        self.on_flush = on_flush
+        self.max_rows = max_rows
+        self.max_delay_s = max_delay_s
+        self.max_retries = max_retries
+        self.max_retained_rows = max_retained_rows if max_retained_rows is not None else 4 * max_rows
+        self.table = table
+        self.rows = []
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.failures = 0  # Failed flushes in a row
+        self._first_row_at = None
+        instrument.gauge_callback('queue_depth', self.__len__, queue=f'{table}_writer')
+        placeholders = ', '.join('?' for _ in columns)
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def __len__(self):
+        # Rows waiting for the next flush
+        return len(self.rows)
+
+    def add(self, row):
+        if not self.rows:
+            self._first_row_at = time.monotonic()
+        self.rows.append(row)
+        self._maybe_flush()
+
+    def extend(self, rows):
+        if not self.rows:
+            self._first_row_at = time.monotonic()
+        self.rows.extend(rows)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.rows) >= self.max_rows or time.monotonic() - self._first_row_at >= self.max_delay_s:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        committed = None
+        try:
+            with instrument.timed('db_commit_seconds', table=self.table), self.conn:
+                self.conn.executemany(self.sql, rows)
+                if self.on_flush is not None:
+                    committed = self.on_flush(self.conn, rows)
+        except Exception as e:
+            # The transaction was rolled back; keep the rows (ahead of any
+            # added meanwhile) so the next flush retries them
+            self.failures += 1
+            self.rows[:0] = rows
+            dropped = len(rows) if self.failures > self.max_retries else 0
+            dropped = max(dropped, len(self.rows) - self.max_retained_rows)
+            if dropped > 0:
+                del self.rows[:dropped]
+                self.failures = 0
+                self.rows_dropped += dropped
+                instrument.inc('rows_dropped_total', dropped, destination=self.table)
+                print(f"Error writing to {self.table}, dropped {dropped} rows: {e}")
+            raise
+        self.failures = 0
+        if committed is not None:
+            committed()
+        self.rows_written += len(rows)
+        instrument.inc('rows_written_total', len(rows), destination=self.table)
+        return len(rows)
+
+
+class SweepWindow:
+    # Sweeps taken more often than they are written (the scheduler's fast
+    # tiers) are folded in here. add() takes each sweep's rows and, once
+    # `every` seconds of sweep time have passed since the last write, returns
+    # the rows to write: the current sweep's, with the `average` columns
+    # replaced by each process's mean and the `total` columns by its sum
+    # since then. In between it returns no rows.
+
+    def __init__(self, key, average=(), total=(), every=PERSIST_EVERY_S):
+        self.key = tuple(key)  # Positions of the columns identifying a process
+        self.average = tuple(average)
+        self.total = tuple(total)
+        self.every = every
+        self.sums = {}  # process -> [samples, sums of the average then total columns]
+        self.written_at = None
+
+    def add(self, rows, now):
+        # now: the sweep's time in epoch seconds
+        columns = self.average + self.total
+        sums = self.sums
+        for row in rows:
+            process = tuple(row[i] for i in self.key)
+            entry = sums.get(process)
+            if entry is None:
+                sums[process] = [1] + [row[i] or 0.0 for i in columns]
+            else:
+                entry[0] += 1
+                for j, i in enumerate(columns, 1):
+                    entry[j] += row[i] or 0.0
+        if self.written_at is not None and now - self.written_at < self.every:
+            return []
+        self.written_at = now
+        first_total = 1 + len(self.average)
+        written = []
+        for row in rows:
+            entry = sums[tuple(row[i] for i in self.key)]
+            row = list(row)
+            for j, i in enumerate(self.average, 1):
+                row[i] = entry[j] / entry[0]
+            for j, i in enumerate(self.total, first_total):
+                row[i] = entry[j]
+            written.append(row)
+        self.sums = {}  # Processes that exited in the meantime go with it
+        return written
+
+
+# Raw per-process samples, as written by all-db-sys-1.py and headless.py
+PROCESS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS processes (
+        id INTEGER PRIMARY KEY,
+        pid INTEGER,
+        name TEXT,
+        memory_usage REAL,
+        num_threads INTEGER,
+        cpu_usage REAL,
+        carbon_footprint REAL,
+        license_cost REAL,
+        sustainability_rating INTEGER,
+        create_time TEXT,
+        username TEXT,
+        sample_time TEXT,
+        carbon_kg REAL
+    )
+'''
+PROCESS_COLUMNS = ('pid', 'name', 'memory_usage', 'num_threads', 'cpu_usage', 'carbon_footprint', 'license_cost', 'sustainability_rating', 'create_time', 'username', 'sample_time')
+# carbon_footprint is the per-sample score (the sample's power held for an
+# hour); carbon_kg is the CO2 the process actually emitted since its previous
+# written row, from energy.EnergyLedger. NULL in rows written without one.
+ENERGY_PROCESS_COLUMNS = PROCESS_COLUMNS + ('carbon_kg',)
+
+PROCESS_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_processes_name ON processes (name)',
+    'CREATE INDEX IF NOT EXISTS idx_processes_sample_time ON processes (sample_time)',
+    'CREATE INDEX IF NOT EXISTS idx_processes_pid ON processes (pid)',
+)
+
+
+def create_process_table(conn):
+    with conn:
+        conn.execute(PROCESS_SCHEMA)
+    add_column_if_missing(conn, 'processes', 'sample_time', 'TEXT')
+    add_column_if_missing(conn, 'processes', 'carbon_kg', 'REAL')
+    create_indexes(conn, PROCESS_INDEXES)
+
+
+class AppStats:
+    # Per-application running aggregates (count, sums, max, last seen) kept
+    # in the app_stats table. update() is meant to be a BatchWriter on_flush
+    # hook: it folds a batch of processes rows in by name with one upsert per
+    # application, so "top N by average memory" becomes an indexed read
+    # instead of a GROUP BY over the whole history.
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS app_stats (
+            name TEXT PRIMARY KEY,
+            sample_count INTEGER NOT NULL,
+            memory_sum REAL NOT NULL,
+            memory_max REAL NOT NULL,
+            threads_sum REAL NOT NULL,
+            cpu_sum REAL NOT NULL,
+            carbon_sum REAL NOT NULL,
+            license_cost REAL,
+            sustainability_rating INTEGER,
+            create_time TEXT,
+            username TEXT,
+            last_seen TEXT
+        )
+    '''
+    # Sort key -> ORDER BY expression; each has a matching expression index
+    # so top() reads the first `limit` index entries whatever the key
+    SORT_KEYS = {
+        'memory': 'memory_sum / sample_count',
+        'cpu': 'cpu_sum / sample_count',
+        'carbon': 'carbon_sum / sample_count',
+        'license_cost': 'license_cost',
+        'threads': 'threads_sum / sample_count',
+    }
+    INDEXES = (
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_avg_memory ON app_stats (memory_sum / sample_count)',
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_avg_cpu ON app_stats (cpu_sum / sample_count)',
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_avg_carbon ON app_stats (carbon_sum / sample_count)',
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_license_cost ON app_stats (license_cost)',
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_avg_threads ON app_stats (threads_sum / sample_count)',
+        'CREATE INDEX IF NOT EXISTS idx_app_stats_last_seen ON app_stats (last_seen)',
+    )
+    UPSERT = '''
+        INSERT INTO app_stats (name, sample_count, memory_sum, memory_max, threads_sum, cpu_sum, carbon_sum, license_cost, sustainability_rating, create_time, username, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            sample_count = sample_count + excluded.sample_count,
+            memory_sum = memory_sum + excluded.memory_sum,
+            memory_max = MAX(memory_max, excluded.memory_max),
+            threads_sum = threads_sum + excluded.threads_sum,
+            cpu_sum = cpu_sum + excluded.cpu_sum,
+            carbon_sum = carbon_sum + excluded.carbon_sum,
+            license_cost = excluded.license_cost,
+            sustainability_rating = excluded.sustainability_rating,
+            create_time = excluded.create_time,
+            username = excluded.username,
+            last_seen = MAX(COALESCE(last_seen, ''), excluded.last_seen)
+    '''
+    TOP = '''
+        SELECT name, memory_sum / sample_count, threads_sum / sample_count, cpu_sum / sample_count, carbon_sum / sample_count, license_cost, sustainability_rating, create_time, username
+        FROM app_stats
+        ORDER BY {order} DESC
+        LIMIT ?
+    '''
+    FIELDS = ('name', 'memory_usage', 'num_threads', 'cpu_usage', 'carbon_footprint', 'license_cost', 'sustainability_rating', 'create_time', 'username', 'sample_time')
+
+    def __init__(self, conn, columns):
+        self.conn = conn
+        self.positions = [columns.index(field) for field in self.FIELDS]
+        with conn:
+            conn.execute(self.SCHEMA)
+            for statement in self.INDEXES:
+                conn.execute(statement)
+            if conn.execute('SELECT 1 FROM app_stats LIMIT 1').fetchone() is None:
+                self._backfill()
+
+    def _backfill(self):
+        # One-off build from history that predates the aggregate table
+        self.conn.execute('''
+            INSERT INTO app_stats (name, sample_count, memory_sum, memory_max, threads_sum, cpu_sum, carbon_sum, license_cost, sustainability_rating, create_time, username, last_seen)
+            SELECT name, COUNT(*), SUM(memory_usage), MAX(memory_usage), SUM(num_threads), SUM(cpu_usage), SUM(carbon_footprint), MAX(license_cost), MAX(sustainability_rating), MAX(create_time), MAX(username), MAX(sample_time)
+            FROM processes
+            WHERE name IS NOT NULL
+            GROUP BY name
+        ''')
+
+    def update(self, conn, rows):
+        aggregates = {}
+        positions = self.positions
+        for row in rows:
+            name, memory, threads, cpu, carbon, license_cost, rating, create_time, username, sample_time = [row[i] for i in positions]
+            if name is None:
+                continue
+            entry = aggregates.get(name)
+            if entry is None:
+                aggregates[name] = [name, 1, memory, memory, threads, cpu, carbon, license_cost, rating, create_time, username, sample_time]
+            else:
+                entry[1] += 1
+                entry[2] += memory
+                entry[3] = max(entry[3], memory)
+                entry[4] += threads
+                entry[5] += cpu
+                entry[6] += carbon
+                entry[7:12] = [license_cost, rating, create_time, username, max(entry[11], sample_time)]
+        conn.executemany(self.UPSERT, list(aggregates.values()))
+
+    def top(self, sort_key='memory', limit=20):
+        return self.conn.execute(self.TOP.format(order=self.SORT_KEYS[sort_key]), (limit,)).fetchall()
+
+    def top_by_memory(self, limit=20):
+        return self.top('memory', limit)
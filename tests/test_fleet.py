@@ -0,0 +1,71 @@
+import pytest
+
+import fleet
+
+
+def row(pid, memory=10.0, name='app'):
+    # A processes row in store.PROCESS_COLUMNS layout
+    return [pid, name, memory, 1, 0.0, 0.0, 0.0, 0, '2026-01-01 00:00:00', 'user', '2026-01-01 00:01:00']
+
+
+@pytest.fixture
+def encoder():
+    return fleet.DeltaEncoder()
+
+
+def test_apply_materializes_deltas(encoder):
+    state = fleet.HostState()
+    first = encoder.encode([row(1), row(2)])
+    second = encoder.encode([row(1, memory=20.0), row(3)])
+    rows = state.apply('host', 7, [first, second])
+    assert [r[:4] for r in rows] == [['host', 1, 'app', 10.0], ['host', 2, 'app', 10.0],
+                                     ['host', 1, 'app', 20.0], ['host', 3, 'app', 10.0]]
+    assert state.seq == 2
+    assert sorted(pid for pid, _ in state.live) == [1, 3]
+
+
+def test_apply_skips_retried_sweeps(encoder):
+    state = fleet.HostState()
+    batch = [encoder.encode([row(1)]), encoder.encode([row(1), row(2)])]
+    assert len(state.apply('host', 7, batch)) == 3
+    assert state.apply('host', 7, batch) == []
+    assert len(state.apply('host', 7, batch + [encoder.encode([row(2)])])) == 1
+
+
+def test_apply_gap_needs_resync_and_keeps_state(encoder):
+    state = fleet.HostState()
+    state.apply('host', 7, [encoder.encode([row(1)])])
+    second = encoder.encode([row(1), row(2)])
+    encoder.encode([row(1), row(2), row(3)])  # Lost
+    fourth = encoder.encode([row(1)])
+    with pytest.raises(fleet.ResyncNeeded):
+        state.apply('host', 7, [second, fourth])
+    assert state.seq == 1
+    assert list(state.live) == [(1, '2026-01-01 00:00:00')]
+
+
+def test_apply_malformed_sweep_keeps_state(encoder):
+    state = fleet.HostState()
+    state.apply('host', 7, [encoder.encode([row(1)])])
+    second = encoder.encode([row(1), row(2)])
+    with pytest.raises(KeyError):
+        state.apply('host', 7, [second, {'q': 3}])
+    assert state.seq == 1 and len(state.live) == 1
+
+
+def test_apply_new_session_starts_over(encoder):
+    state = fleet.HostState()
+    state.apply('host', 7, [encoder.encode([row(1)]), encoder.encode([row(2)])])
+    restarted = fleet.DeltaEncoder()
+    rows = state.apply('host', 8, [restarted.encode([row(5)])])
+    assert [r[1] for r in rows] == [5]
+    assert state.session == 8 and state.seq == 1
+
+
+def test_agent_overflow_sends_full_sweep_first():
+    agent = fleet.FleetAgent('http://127.0.0.1:1', batch_sweeps=100, max_pending=3)
+    for memory in range(5):
+        agent.add_sweep([row(1, memory=float(memory))])
+    assert [(sweep['q'], sweep['f']) for sweep in agent.pending] == [(4, 1), (5, 0)]
+    state = fleet.HostState()
+    assert len(state.apply('host', agent.session, agent.pending)) == 2
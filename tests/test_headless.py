@@ -0,0 +1,63 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import headless
+import proc_reader
+import scoring
+import store
+from energy import EnergyLedger
+from license_catalog import LicenseCatalog
+
+LICENSE_FILE = os.path.join(os.path.dirname(os.path.abspath(headless.__file__)), headless.LICENSE_COST_DATA_FILE)
+
+
+@pytest.fixture
+def license_catalog():
+    return LicenseCatalog(LICENSE_FILE)
+
+
+def test_monitor_processes_reads_injected_source(license_catalog):
+    source = proc_reader.SyntheticSampler(1000, auto_advance=False)
+    now = datetime.fromtimestamp(source.now)
+    rows = headless.monitor_processes(license_catalog, scoring.DEFAULT_POWER_MODEL, source, current_time=now)
+    assert len(rows) == 1000
+    assert {row[0] for row in rows} == set(source.processes)
+    assert all(len(row) == len(store.PROCESS_COLUMNS) for row in rows)
+    assert {row[10] for row in rows} == {now.strftime('%Y-%m-%d %H:%M:%S')}
+    info = source.processes[1]
+    row = next(row for row in rows if row[0] == 1)
+    assert row[1] == info['name']
+    assert row[2] == info['memory_info'].rss / (1024 ** 2)
+
+
+def test_monitor_processes_follows_churn(license_catalog):
+    source = proc_reader.SyntheticSampler(1000, churn=0.1, auto_advance=False)
+    first = {row[0] for row in headless.monitor_processes(license_catalog, scoring.DEFAULT_POWER_MODEL, source)}
+    source.advance()
+    second = {row[0] for row in headless.monitor_processes(license_catalog, scoring.DEFAULT_POWER_MODEL, source)}
+    assert len(second) == 1000
+    assert len(first - second) == 100
+
+
+def test_monitor_processes_with_energy_adds_carbon_kg(license_catalog):
+    source = proc_reader.SyntheticSampler(200, auto_advance=False)
+    ledger = EnergyLedger(sqlite3.connect(':memory:'), flush_every_s=float('inf'))
+    headless.monitor_processes(license_catalog, scoring.DEFAULT_POWER_MODEL, source, current_time=datetime.fromtimestamp(source.now), energy=ledger)
+    source.advance()
+    rows = headless.monitor_processes(license_catalog, scoring.DEFAULT_POWER_MODEL, source, current_time=datetime.fromtimestamp(source.now), energy=ledger)
+    assert all(len(row) == len(store.ENERGY_PROCESS_COLUMNS) for row in rows)
+    assert sum(row[11] for row in rows) == pytest.approx(ledger.sweep_carbon_kg)
+    assert ledger.sweep_carbon_kg > 0
+
+
+def test_collector_writes_injected_source(tmp_path):
+    source = proc_reader.SyntheticSampler(300, churn=0.0, auto_advance=False)
+    collector = headless.HeadlessCollector(str(tmp_path / 'headless.db'), license_file=LICENSE_FILE, process_source=source)
+    assert collector.sweep(now=datetime.fromtimestamp(source.now)) == 300
+    count, names = collector.conn.execute('SELECT COUNT(*), COUNT(DISTINCT name) FROM processes').fetchone()
+    assert count == 300
+    assert collector.conn.execute('SELECT COUNT(*) FROM app_stats').fetchone()[0] == names
+    collector.close()
@@ -0,0 +1,53 @@
+import struct
+from datetime import datetime
+
+import pytest
+
+import last_execution
+
+BTIME = 1_700_000_000  # Epoch seconds the process started
+
+
+def pack(command, btime=BTIME, etime_ticks=0.0, byteorder='<'):
+    record = struct.Struct(last_execution.ACCT_V3.format(byteorder))
+    version = last_execution.ACCT_VERSION | (last_execution.ACCT_BYTEORDER if byteorder == '>' else 0)
+    return record.pack(0, version, 0, 0, 1000, 1000, 42, 1, btime, etime_ticks, *([0] * 8), command.encode())
+
+
+@pytest.fixture
+def pacct(tmp_path):
+    # Ran 90 s (9000 ticks), 2 s, and a long name the kernel truncated
+    path = tmp_path / 'pacct'
+    path.write_bytes(pack('matlab', etime_ticks=9000.0) + pack('matlab', btime=BTIME - 3600, etime_ticks=200.0)
+                     + pack('verylongprogram', etime_ticks=100.0))
+    return path
+
+
+def test_end_time_is_btime_plus_etime_in_ahz_ticks(pacct):
+    records = list(last_execution.read_pacct(str(pacct)))
+    assert records[0] == ('matlab', BTIME + 90.0)
+    assert records[1] == ('matlab', BTIME - 3600 + 2.0)
+    assert records[2] == ('verylongprogram', BTIME + 1.0)
+
+
+def test_big_endian_file(tmp_path):
+    path = tmp_path / 'pacct.big'
+    path.write_bytes(pack('matlab', etime_ticks=9000.0, byteorder='>'))
+    assert list(last_execution.read_pacct(str(path))) == [('matlab', BTIME + 90.0)]
+
+
+def test_lookup_returns_latest_end_and_matches_truncated_names(pacct):
+    provider = last_execution.PacctProvider([str(pacct)], background=False)
+    found = provider.lookup(['matlab', 'verylongprogramname', 'excel'])
+    assert found == {
+        'matlab': datetime.fromtimestamp(BTIME + 90.0),
+        'verylongprogramname': datetime.fromtimestamp(BTIME + 1.0),
+    }
+
+
+def test_lookup_picks_up_appended_records(pacct):
+    provider = last_execution.PacctProvider([str(pacct)], background=False)
+    provider.lookup(['matlab'])
+    with open(pacct, 'ab') as f:
+        f.write(pack('matlab', btime=BTIME + 600))
+    assert provider.lookup(['matlab']) == {'matlab': datetime.fromtimestamp(BTIME + 600)}
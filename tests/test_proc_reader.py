@@ -0,0 +1,47 @@
+import pytest
+
+import proc_reader
+
+
+@pytest.mark.parametrize('size', [1000, 10000, 50000])
+def test_synthetic_table_size(size):
+    sampler = proc_reader.SyntheticSampler(size, auto_advance=False)
+    pids = [proc.pid for proc in sampler.process_iter()]
+    assert len(pids) == len(set(pids)) == size
+    sampler.advance()
+    assert len(list(sampler.process_iter())) == size
+
+
+def test_synthetic_churn_replaces_processes():
+    sampler = proc_reader.SyntheticSampler(1000, churn=0.05, auto_advance=False)
+    before = set(sampler.processes)
+    sampler.advance()
+    after = set(sampler.processes)
+    assert len(before - after) == len(after - before) == 50
+    assert 1 in after  # The root never exits
+    assert all(sampler.processes[pid]['ppid'] in before | after for pid in after - before)
+
+
+def test_synthetic_without_churn_keeps_processes():
+    sampler = proc_reader.SyntheticSampler(1000, churn=0.0, auto_advance=False)
+    before = set(sampler.processes)
+    sampler.advance()
+    assert set(sampler.processes) == before
+
+
+def test_synthetic_is_reproducible():
+    def sweeps(seed):
+        sampler = proc_reader.SyntheticSampler(500, seed=seed)
+        return [[(proc.pid, proc.info['name'], proc.info['memory_info'].rss) for proc in sampler.process_iter()] for _ in range(3)]
+
+    assert sweeps(1) == sweeps(1)
+    assert sweeps(1) != sweeps(2)
+
+
+def test_synthetic_auto_advance_moves_time():
+    sampler = proc_reader.SyntheticSampler(100, interval_s=5.0)
+    start = sampler.now
+    list(sampler.process_iter())
+    assert sampler.now == start
+    list(sampler.process_iter())
+    assert sampler.now == start + 5.0
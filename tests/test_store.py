@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+import store
+
+
+def sweep(*processes):
+    # (pid, cpu, carbon) -> rows keyed on pid, averaging cpu and totalling carbon
+    return [[pid, cpu, carbon] for pid, cpu, carbon in processes]
+
+
+def test_sweep_window_folds_sweeps_between_writes():
+    window = store.SweepWindow(key=(0,), average=(1,), total=(2,), every=60)
+    assert window.add(sweep((1, 10.0, 1.0), (2, 4.0, 2.0)), 0) == [[1, 10.0, 1.0], [2, 4.0, 2.0]]
+    assert window.add(sweep((1, 20.0, 1.0), (2, 8.0, 2.0)), 20) == []
+    assert window.add(sweep((1, 30.0, 1.0)), 40) == []
+    assert window.add(sweep((1, 40.0, 1.0), (3, 5.0, 0.5)), 60) == [[1, 30.0, 3.0], [3, 5.0, 0.5]]
+
+
+def test_sweep_window_every_zero_writes_each_sweep():
+    window = store.SweepWindow(key=(0,), average=(1,), total=(2,), every=0)
+    window.add(sweep((1, 10.0, 1.0)), 0)
+    assert window.add(sweep((1, 20.0, None)), 1) == [[1, 20.0, 0.0]]
+
+
+def test_sweep_window_leaves_input_rows_alone():
+    window = store.SweepWindow(key=(0,), average=(1,), every=60)
+    rows = sweep((1, 10.0, 1.0))
+    window.add(rows, 0)
+    window.add(sweep((1, 20.0, 1.0)), 30)
+    assert window.add(rows, 60) == [[1, 15.0, 1.0]]
+    assert rows == [[1, 10.0, 1.0]]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    store.create_process_table(conn)
+    yield conn
+    conn.close()
+
+
+def process_row(pid, name, memory, threads, cpu, carbon, sample_time, license_cost=0.0):
+    return (pid, name, memory, threads, cpu, carbon, license_cost, 3, '2026-01-01 00:00:00', 'user', sample_time)
+
+
+def test_app_stats_update_aggregates_by_name(conn):
+    app_stats = store.AppStats(conn, store.PROCESS_COLUMNS)
+    with conn:
+        app_stats.update(conn, [
+            process_row(1, 'a', 100.0, 4, 10.0, 0.5, '2026-01-01 00:01:00'),
+            process_row(2, 'a', 300.0, 8, 30.0, 1.5, '2026-01-01 00:01:00'),
+            process_row(3, 'b', 50.0, 1, 1.0, 0.1, '2026-01-01 00:01:00'),
+            process_row(4, None, 999.0, 1, 1.0, 0.1, '2026-01-01 00:01:00'),
+        ])
+        app_stats.update(conn, [process_row(1, 'a', 200.0, 6, 20.0, 1.0, '2026-01-01 00:02:00', license_cost=99.0)])
+    row = conn.execute('SELECT sample_count, memory_sum, memory_max, threads_sum, cpu_sum, carbon_sum, license_cost, last_seen FROM app_stats WHERE name = ?', ('a',)).fetchone()
+    assert row == (3, 600.0, 300.0, 18.0, 60.0, 3.0, 99.0, '2026-01-01 00:02:00')
+    assert conn.execute('SELECT COUNT(*) FROM app_stats').fetchone()[0] == 2
+
+
+def test_app_stats_top_orders_by_average(conn):
+    app_stats = store.AppStats(conn, store.PROCESS_COLUMNS)
+    with conn:
+        app_stats.update(conn, [
+            process_row(1, 'small', 10.0, 1, 90.0, 0.0, '2026-01-01 00:01:00'),
+            process_row(2, 'big', 500.0, 1, 1.0, 0.0, '2026-01-01 00:01:00'),
+            process_row(3, 'big', 100.0, 1, 1.0, 0.0, '2026-01-01 00:01:00'),
+        ])
+    assert [row[0] for row in app_stats.top('memory')] == ['big', 'small']
+    assert app_stats.top('memory')[0][1] == 300.0
+    assert [row[0] for row in app_stats.top('cpu', 1)] == ['small']
+
+
+def test_app_stats_backfills_from_history(conn):
+    with conn:
+        conn.executemany(f"INSERT INTO processes ({', '.join(store.PROCESS_COLUMNS)}) VALUES ({', '.join('?' for _ in store.PROCESS_COLUMNS)})",
+                         [process_row(1, 'a', 100.0, 2, 5.0, 1.0, '2026-01-01 00:01:00'), process_row(1, 'a', 300.0, 2, 5.0, 1.0, '2026-01-01 00:02:00')])
+    app_stats = store.AppStats(conn, store.PROCESS_COLUMNS)
+    assert app_stats.top('memory') == [('a', 200.0, 2.0, 5.0, 1.0, 0.0, 3, '2026-01-01 00:00:00', 'user')]
+
+
+def test_batch_writer_drops_rows_after_max_retries():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (a INTEGER NOT NULL)')
+    writer = store.BatchWriter(conn, 't', ('a',), max_rows=100, max_retries=2)
+    writer.add((None,))
+    for failures in (1, 2):
+        with pytest.raises(sqlite3.IntegrityError):
+            writer.flush()
+        assert len(writer) == 1 and writer.failures == failures
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.flush()
+    assert len(writer) == 0 and writer.rows_dropped == 1
+    writer.add((1,))
+    assert writer.flush() == 1
+
+
+def test_batch_writer_caps_retained_rows():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (a INTEGER NOT NULL)')
+    writer = store.BatchWriter(conn, 't', ('a',), max_rows=100, max_retained_rows=3)
+    writer.rows = [(None,), (1,), (2,), (3,), (4,)]
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.flush()
+    assert writer.rows == [(2,), (3,), (4,)]
+    assert writer.flush() == 3
+
+
+def test_batch_writer_runs_after_commit_only_on_success():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (a INTEGER NOT NULL)')
+    committed = []
+
+    def on_flush(conn, rows):
+        return lambda: committed.extend(rows)
+
+    writer = store.BatchWriter(conn, 't', ('a',), on_flush=on_flush)
+    writer.add((None,))
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.flush()
+    assert committed == []
+    writer.rows = [(1,)]
+    writer.flush()
+    assert committed == [(1,)]
@@ -0,0 +1,54 @@
+import random
+
+import topk
+
+
+def brute_force(source, k):
+    return sorted(source.values(), reverse=True)[:k]
+
+
+def test_top_matches_sorting_through_updates_and_exits():
+    rng = random.Random(0)
+    source = {key: rng.uniform(0, 100) for key in range(500)}
+    ranking = topk.TopK(source, lambda value: value, k=20)
+    assert [value for _, value in ranking.top()] == brute_force(source, 20)
+    for _ in range(100):
+        changed = rng.sample(list(source), 25)
+        for key in changed:
+            source[key] = rng.uniform(0, 100) if rng.random() < 0.9 else rng.uniform(100, 200)
+        for key in rng.sample(list(source), 2):
+            del source[key]  # Dropped behind the ranking's back, like retention
+        ranking.update((key, source[key]) for key in changed if key in source)
+        assert [value for _, value in ranking.top()] == brute_force(source, 20)
+    assert ranking.rebuilds < 100
+
+
+def test_top_with_fewer_items_than_k():
+    source = {'a': 3, 'b': 1}
+    ranking = topk.TopK(source, lambda value: value, k=5)
+    assert ranking.top() == [('a', 3), ('b', 1)]
+    source['c'] = 2
+    ranking.update([('c', 2)])
+    assert ranking.top() == [('a', 3), ('c', 2), ('b', 1)]
+
+
+def test_empty_source():
+    ranking = topk.TopK({}, lambda value: value)
+    assert ranking.top() == []
+
+
+def test_discard_removes_candidate():
+    source = {key: key for key in range(10)}
+    ranking = topk.TopK(source, lambda value: value, k=3)
+    ranking.top()
+    del source[9]
+    ranking.discard(9)
+    assert ranking.top() == [(8, 8), (7, 7), (6, 6)]
+
+
+def test_index_ranks_each_key():
+    source = {'a': (1, 30), 'b': (2, 20), 'c': (3, 10)}
+    index = topk.TopKIndex(source, {'first': lambda item: item[0], 'second': lambda item: item[1]}, k=2)
+    index.update(source.items())
+    assert [key for key, _ in index.top('first')] == ['c', 'b']
+    assert index.tops() == {'first': [(3, 10), (2, 20)], 'second': [(1, 30), (2, 20)]}
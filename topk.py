@@ -0,0 +1,123 @@
+import heapq
+from operator import itemgetter
+
+DEFAULT_K = 20
+NEGATIVE_INFINITY = float('-inf')
+
+
+class TopK:
+    # The k largest items of a mapping by one value, kept current as items
+    # change instead of re-sorting the whole mapping on every read. Up to
+    # k + slack candidates are tracked; every item outside them is known to
+    # be <= ceiling. top() is exact while the k-th candidate is still >=
+    # ceiling; otherwise the candidates are rebuilt with one heapq.nlargest
+    # pass over the source (counted in rebuilds). Items added to or changed
+    # in the source must be passed to update(); items may disappear from it
+    # behind our back (retention), and are dropped on the next top().
+
+    def __init__(self, source, value, k=DEFAULT_K, slack=None):
+        self.source = source  # {key: item}
+        self.value = value  # item -> number
+        self.k = k
+        self.capacity = k + (k if slack is None else slack)
+        self.candidates = {}  # key -> value
+        self.floor = NEGATIVE_INFINITY  # <= the smallest candidate value
+        self.ceiling = NEGATIVE_INFINITY  # >= every value outside the candidates
+        self.rebuilds = 0
+        self._seeded = False  # The first top() scans whatever the source already holds
+        self._ranked = None
+
+    def update(self, items):
+        # items: (key, item) pairs whose value may have changed
+        value = self.value
+        candidates = self.candidates
+        capacity = self.capacity
+        floor, ceiling = self.floor, self.ceiling
+        for key, item in items:
+            v = value(item)
+            if v <= ceiling and v <= floor:
+                # Common case: below every candidate and no new outside maximum
+                if key in candidates:
+                    candidates[key] = v
+                    floor = v
+                continue
+            if key in candidates:
+                candidates[key] = v
+                if v < floor:
+                    floor = v
+            elif len(candidates) < capacity:
+                candidates[key] = v
+                if len(candidates) == capacity:
+                    floor = min(candidates.values())
+            elif v > floor:
+                # floor may be stale-low, so check against the real minimum
+                low_key = min(candidates, key=candidates.__getitem__)
+                low = candidates[low_key]
+                if v > low:
+                    del candidates[low_key]
+                    candidates[key] = v
+                    if low > ceiling:
+                        ceiling = low
+                    floor = min(candidates.values())
+                else:
+                    floor = low
+                    if v > ceiling:
+                        ceiling = v
+            elif v > ceiling:
+                ceiling = v
+        self.floor, self.ceiling = floor, ceiling
+        self._ranked = None
+
+    def discard(self, key):
+        if self.candidates.pop(key, None) is not None:
+            self._ranked = None
+
+    def top(self):
+        # [(key, item)] for the k largest values, largest first
+        if self._ranked is None:
+            source = self.source
+            candidates = self.candidates
+            for key in [key for key in candidates if key not in source]:
+                del candidates[key]
+            ranked = sorted(candidates.items(), key=itemgetter(1), reverse=True)[:self.k]
+            if not self._seeded or (len(ranked) < self.k and len(candidates) < len(source)) or (ranked and ranked[-1][1] < self.ceiling):
+                ranked = self.rebuild()
+            self._ranked = [(key, source[key]) for key, _ in ranked]
+        return self._ranked
+
+    def rebuild(self):
+        value = self.value
+        capacity = self.capacity
+        pairs = heapq.nlargest(capacity + 1, ((key, value(item)) for key, item in self.source.items()), key=itemgetter(1))
+        self.ceiling = pairs.pop()[1] if len(pairs) > capacity else NEGATIVE_INFINITY
+        self.candidates = dict(pairs)
+        self.floor = pairs[-1][1] if len(pairs) == capacity else NEGATIVE_INFINITY
+        self.rebuilds += 1
+        self._seeded = True
+        return pairs[:self.k]
+
+
+class TopKIndex:
+    # One TopK per sort key over the same source. update() feeds a sweep to
+    # all of them, so switching the sort key is a lookup, not a re-sort.
+    # keys: {sort key: item -> number}
+
+    def __init__(self, source, keys, k=DEFAULT_K):
+        self.rankings = {name: TopK(source, value, k) for name, value in keys.items()}
+
+    def update(self, items):
+        items = list(items)
+        for ranking in self.rankings.values():
+            ranking.update(items)
+
+    def discard(self, key):
+        for ranking in self.rankings.values():
+            ranking.discard(key)
+
+    def top(self, name):
+        # [(key, item)], largest first
+        return self.rankings[name].top()
+
+    def tops(self):
+        # {sort key: [item]}, e.g. for a snapshot
+        return {name: [item for _, item in ranking.top()] for name, ranking in self.rankings.items()}
@@ -0,0 +1,227 @@
+import tkinter as tk
+from tkinter import ttk
+
+import instrument
+
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+SORT_MARK = ' \u25bc'
+
+
+class VirtualTree:
+    # Keyed, incremental view over a ttk.Treeview. The full row model lives in
+    # Python; only the rows that fit in the widget are materialized in Tk.
+    # On each update, rows are matched by key: unchanged rows cost nothing,
+    # changed rows only have their changed cells set, and rows are inserted or
+    # deleted only when they enter or leave the visible window.
+
+    def __init__(self, tree, scrollbar=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.columns = tuple(tree['columns'])
+        self.keys = []
+        self.values = {}
+        self.offset = 0
+        self.page_size = int(tree.cget('height'))
+        self.shown = {}  # iid -> values tuple currently in the widget
+        self.shown_order = []
+        self.active = True
+        self.row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or DEFAULT_ROW_HEIGHT)
+
+        tree.bind('<Configure>', self._on_configure, add='+')
+        tree.bind('<MouseWheel>', self._on_mousewheel, add='+')
+        tree.bind('<Button-4>', lambda event: self.scroll(-3), add='+')
+        tree.bind('<Button-5>', lambda event: self.scroll(3), add='+')
+        if scrollbar is not None:
+            scrollbar.config(command=self._on_scrollbar)
+
+    def update(self, rows):
+        # rows: ordered iterable of (key, values)
+        keys = []
+        values = {}
+        for key, row in rows:
+            key = str(key)
+            keys.append(key)
+            values[key] = tuple(row)
+        self.keys = keys
+        self.values = values
+        self._clamp_offset()
+        self.render()
+
+    def render(self):
+        if not self.active:
+            return
+        with instrument.timed('render_seconds', view='list'):
+            self._render()
+
+    def _render(self):
+        tree = self.tree
+        window = self.keys[self.offset:self.offset + self.page_size]
+        wanted = set(window)
+
+        for iid in self.shown_order:
+            if iid not in wanted:
+                tree.delete(iid)
+                del self.shown[iid]
+
+        for index, key in enumerate(window):
+            values = self.values[key]
+            shown = self.shown.get(key)
+            if shown is None:
+                tree.insert('', index, iid=key, values=values)
+            elif shown != values:
+                for column, old, new in zip(self.columns, shown, values):
+                    if old != new:
+                        tree.set(key, column, new)
+            self.shown[key] = values
+
+        # Fix up ordering only where it differs from what Tk already has
+        current = tree.get_children('')
+        if list(current) != window:
+            for index, key in enumerate(window):
+                if index >= len(current) or current[index] != key:
+                    tree.move(key, '', index)
+                    current = tree.get_children('')
+        self.shown_order = window
+
+        if self.scrollbar is not None:
+            total = len(self.keys) or 1
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.page_size) / total))
+
+    def suspend(self):
+        # Hand the widget over to another view (TreeRows): remove our rows
+        # and ignore scrolling until resume()
+        for iid in self.shown_order:
+            self.tree.delete(iid)
+        self.shown = {}
+        self.shown_order = []
+        self.active = False
+
+    def resume(self):
+        self.active = True
+        if self.scrollbar is not None:
+            self.scrollbar.config(command=self._on_scrollbar)
+        self.render()
+
+    def scroll(self, rows):
+        if not self.active:
+            return
+        self.offset += rows
+        self._clamp_offset()
+        self.render()
+
+    def _clamp_offset(self):
+        self.offset = max(0, min(self.offset, len(self.keys) - self.page_size))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.offset = int(float(amount) * len(self.keys))
+            self._clamp_offset()
+            self.render()
+        elif action == tk.SCROLL:
+            step = self.page_size if unit == tk.PAGES else 1
+            self.scroll(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        if not self.active:
+            return
+        page_size = max(1, (event.height - HEADING_HEIGHT) // self.row_height)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self._clamp_offset()
+            self.render()
+
+
+class TreeRows:
+    # Keyed, incremental hierarchy in a ttk.Treeview shown as a tree, for
+    # rows (iid, parent iid or '', values) listed parents first. Like
+    # VirtualTree, update() only inserts, deletes, moves or sets cells where
+    # the widget differs; expanded rows stay expanded. Rows aren't
+    # virtualized, so callers keep the row count bounded.
+
+    def __init__(self, tree, scrollbar=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.columns = tuple(tree['columns'])
+        self.shown = {}  # iid -> (parent, values)
+        self.active = False
+
+    def attach(self):
+        self.active = True
+        self.tree.configure(show='tree headings')
+        if self.scrollbar is not None:
+            self.scrollbar.config(command=self.tree.yview)
+            self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+    def detach(self):
+        for iid in self.tree.get_children(''):
+            self.tree.delete(iid)
+        self.shown = {}
+        self.active = False
+        self.tree.configure(show='headings', yscrollcommand='')
+
+    def update(self, rows):
+        if not self.active:
+            return
+        with instrument.timed('render_seconds', view='tree'):
+            self._update(rows)
+
+    def _update(self, rows):
+        tree = self.tree
+        wanted = {}
+        order = {}
+        for iid, parent, values in rows:
+            iid = str(iid)
+            wanted[iid] = (str(parent), tuple(values))
+            order.setdefault(str(parent), []).append(iid)
+
+        for parent, iids in order.items():
+            for index, iid in enumerate(iids):
+                row = wanted[iid]
+                shown = self.shown.get(iid)
+                if shown is None:
+                    tree.insert(parent, index, iid=iid, values=row[1])
+                else:
+                    if shown[0] != parent:
+                        tree.move(iid, parent, index)
+                    if shown[1] != row[1]:
+                        for column, old, new in zip(self.columns, shown[1], row[1]):
+                            if old != new:
+                                tree.set(iid, column, new)
+                self.shown[iid] = row
+            if list(tree.get_children(parent)) != iids:
+                for index, iid in enumerate(iids):
+                    tree.move(iid, parent, index)
+
+        # Deleted last: a row's surviving children have been moved out by now
+        for iid in [iid for iid in self.shown if iid not in wanted]:
+            if tree.exists(iid):
+                tree.delete(iid)
+            del self.shown[iid]
+
+
+class SortHeadings:
+    # Makes the headings in sort_keys ({column: sort key}) clickable; the
+    # active one carries SORT_MARK. on_sort(key) re-renders the rows, which
+    # should come from a precomputed ranking rather than a fresh sort.
+
+    def __init__(self, tree, sort_keys, on_sort, current):
+        self.tree = tree
+        self.sort_keys = sort_keys
+        self.on_sort = on_sort
+        self.current = current
+        for column, key in sort_keys.items():
+            tree.heading(column, command=lambda key=key: self.select(key))
+        self._mark()
+
+    def select(self, key):
+        self.current = key
+        self._mark()
+        self.on_sort(key)
+
+    def _mark(self):
+        for column, key in self.sort_keys.items():
+            self.tree.heading(column, text=column + (SORT_MARK if key == self.current else ''))
@@ -3,61 +3,89 @@ from tkinter import ttk
 
 import psutil
 import time
-import pandas as pd
 from datetime import datetime, timedelta
+from ring_buffer import RingBuffer
+from tree_view import VirtualTree
+from retention import RetentionManager
+from scheduler import SamplingScheduler, TkLoop
+
+# Memory samples kept per process; older ones are overwritten
+HISTORY_CAPACITY = 720
+
+# Names not seen for PROCESS_TTL are dropped; at most MAX_TRACKED_PROCESSES are kept
+PROCESS_TTL = timedelta(days=30)
+MAX_TRACKED_PROCESSES = 20000
 
 # Initialize data structures
 process_usage = {}
 
-def monitor_processes():
+retention = RetentionManager()
+retention.track('process_usage', process_usage, lambda info: info['last_used'], ttl=PROCESS_TTL, max_entries=MAX_TRACKED_PROCESSES)
+
+# Memory is the only metric shown: every 10 s, stretched while it isn't
+# changing, within 1% of a core
+scheduler = SamplingScheduler({'memory': 10.0})
+
+def monitor_processes(source=None):
+    # Returns the total memory for the scheduler. source: anything with
+    # process_iter(attrs), e.g. proc_reader.SyntheticSampler; defaults to psutil.
     current_time = datetime.now()
-    for proc in psutil.process_iter(['pid', 'name', 'memory_info']):
+    total_mem = 0.0
+    for proc in (source or psutil).process_iter(['pid', 'name', 'memory_info']):
         try:
             pid = proc.info['pid']
             name = proc.info['name']
             mem = proc.info['memory_info'].rss / (1024 ** 2)  # Memory in MB
 
-            if name not in process_usage:
-                process_usage[name] = {'pid': pid, 'last_used': current_time, 'mem_usage': []}
-            process_usage[name]['last_used'] = current_time
-            process_usage[name]['mem_usage'].append((current_time, mem))
+            # Re-insert so process_usage stays in least-recently-used order
+            usage = process_usage.pop(name, None)
+            if usage is None:
+                usage = {'pid': pid, 'last_used': current_time, 'mem_usage': RingBuffer(HISTORY_CAPACITY)}
+            process_usage[name] = usage
+            usage['last_used'] = current_time
+            usage['mem_usage'].append(current_time.timestamp(), mem)
+            total_mem += mem
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
+    return {'memory': total_mem}
 
 def remove_unused_processes(threshold_days=30):
-    current_time = datetime.now()
-    unused_processes = []
-    for name, info in process_usage.items():
-        if current_time - info['last_used'] > timedelta(days=threshold_days):
-            unused_processes.append(name)
-    for name in unused_processes:
-        del process_usage[name]
+    return retention.expire('process_usage', timedelta(days=threshold_days))
 
 
-def update_ui():
-    monitor_processes()
-    for row in tree.get_children():
-        tree.delete(row)
-    
+def update_ui(metrics):
+    # One sweep, run by ui_loop
+    totals = monitor_processes()
+    retention.step()
+    rows = []
     for name, info in process_usage.items():
-        mem_usage = sum([mem for _, mem in info['mem_usage']]) / len(info['mem_usage'])
+        mem_usage = info['mem_usage'].mean()
         carbon_footprint = 100
         license_cost = 100
         last_used = info['last_used'].strftime('%Y-%m-%d %H:%M:%S')
         
-        tree.insert("", "end", values=(name, mem_usage, carbon_footprint, license_cost, last_used))
-    
-    root.after(10, update_ui)
+        rows.append((name, (name, mem_usage, carbon_footprint, license_cost, last_used)))
+    tree_view.update(rows)
+    return totals
 
 root = tk.Tk()
 root.title("Process Monitor")
 
 columns = ("Process Name", "Memory Usage (MB)", "Carbon Footprint (kg CO2)", "License Cost ($)", "Last Used")
-tree = ttk.Treeview(root, columns=columns, show="headings")
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill=tk.BOTH, expand=True)
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 tree.pack(fill=tk.BOTH, expand=True)
 
+# Rows are keyed and updated in place; only the visible ones exist in Tk
+tree_view = VirtualTree(tree, scrollbar)
+
 for col in columns:
     tree.heading(col, text=col)
 
-update_ui()
+# Sweep now, then whenever the scheduler says memory is due
+ui_loop = TkLoop(root, scheduler, update_ui)
+ui_loop.run()
 root.mainloop()
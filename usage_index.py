@@ -0,0 +1,225 @@
+import argparse
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+
+import instrument
+import store
+
+# Per-executable usage, kept up to date as sweeps are ingested so the
+# unused-license report is an index read instead of a pass over history.
+# Report from an existing database with:
+#   python usage_index.py --store process_monitor.db --days 60
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+UNUSED_DAYS = 60
+MAX_GAP_S = 300  # Longer gaps between sightings mean the sampler wasn't running; they don't count as runtime
+
+
+class UsageIndex:
+    # first_seen / last_seen, cumulative runtime and distinct users per
+    # executable, folded in one sweep at a time. Runtime is wall-clock time
+    # the executable was running at all: the gap between consecutive sweeps
+    # that both saw it, however many instances it had. Each row carries the
+    # current license cost, and a partial index over the licensed rows makes
+    # unused() a range read of licensed executables only.
+
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS exe_usage (
+            executable TEXT PRIMARY KEY,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            runtime_s REAL NOT NULL,
+            license_cost REAL NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS exe_users (
+            executable TEXT NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (executable, username)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_exe_usage_licensed ON exe_usage (last_seen) WHERE license_cost > 0',
+    )
+    UPSERT = '''
+        INSERT INTO exe_usage (executable, first_seen, last_seen, runtime_s, license_cost)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(executable) DO UPDATE SET
+            first_seen = MIN(first_seen, excluded.first_seen),
+            last_seen = MAX(last_seen, excluded.last_seen),
+            runtime_s = runtime_s + excluded.runtime_s,
+            license_cost = excluded.license_cost
+    '''
+    MERGE = '''
+        INSERT INTO exe_usage (executable, first_seen, last_seen, runtime_s, license_cost)
+        VALUES (?, ?, ?, 0.0, ?)
+        ON CONFLICT(executable) DO UPDATE SET
+            first_seen = MIN(first_seen, excluded.first_seen),
+            last_seen = MAX(last_seen, excluded.last_seen)
+    '''
+    UNUSED = '''
+        SELECT executable, license_cost, first_seen, last_seen, runtime_s,
+               (SELECT COUNT(*) FROM exe_users WHERE exe_users.executable = exe_usage.executable)
+        FROM exe_usage
+        WHERE license_cost > 0 AND last_seen <= ?
+        ORDER BY last_seen
+    '''
+    FIELDS = ('name', 'username', 'license_cost', 'sample_time')
+
+    def __init__(self, conn, columns=None, history_table=None, max_gap_s=MAX_GAP_S):
+        self.conn = conn
+        self.max_gap_s = max_gap_s
+        self.lock = threading.Lock()
+        # For update(): where FIELDS sit in a processes row
+        self.positions = [columns.index(field) for field in self.FIELDS] if columns is not None else None
+        self.previous_time = None
+        self.previous = frozenset()
+        with self.lock, conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            if history_table is not None and conn.execute('SELECT 1 FROM exe_usage LIMIT 1').fetchone() is None:
+                self._backfill(history_table)
+        self.known_users = set(conn.execute('SELECT executable, username FROM exe_users'))
+
+    def _backfill(self, table):
+        # One-off build from raw history; runtime before this point is unknown
+        self.conn.execute(f'''
+            INSERT INTO exe_usage (executable, first_seen, last_seen, runtime_s, license_cost)
+            SELECT name, MIN(sample_time), MAX(sample_time), 0.0, COALESCE(MAX(license_cost), 0.0)
+            FROM {table}
+            WHERE name IS NOT NULL AND sample_time IS NOT NULL
+            GROUP BY name
+        ''')
+        self.conn.execute(f'''
+            INSERT OR IGNORE INTO exe_users (executable, username)
+            SELECT DISTINCT name, username FROM {table} WHERE name IS NOT NULL AND username IS NOT NULL
+        ''')
+
+    def backfill(self, sightings):
+        # Merge sightings recorded outside the index, e.g. a collector's saved
+        # state when it has no raw history table: (executable, username,
+        # license_cost, first_seen, last_seen) with datetimes. Only widens the
+        # seen range, so it is safe to repeat on every start.
+        users = set()
+        rows = []
+        for executable, username, license_cost, first_seen, last_seen in sightings:
+            if not executable:
+                continue
+            rows.append((executable, first_seen.strftime(TIME_FORMAT), last_seen.strftime(TIME_FORMAT), license_cost or 0.0))
+            if username and (executable, username) not in self.known_users:
+                users.add((executable, username))
+        with self.lock, self.conn:
+            self.conn.executemany(self.MERGE, rows)
+            self.conn.executemany('INSERT OR IGNORE INTO exe_users (executable, username) VALUES (?, ?)', users)
+        self.known_users |= users
+        return len(rows)
+
+    def add_sweep(self, when, processes):
+        # processes: (executable, username, license_cost) for everything
+        # running at `when`. Runs inside the caller's transaction; returns a
+        # function that moves the index's own state on to this sweep, to
+        # call once the transaction has committed.
+        state = self._state()
+        self._fold(state, when, processes)
+        return partial(self._commit, state)
+
+    def _state(self):
+        # [previous_time, previous, new (executable, username) pairs]
+        return [self.previous_time, self.previous, set()]
+
+    def _commit(self, state):
+        self.previous_time, self.previous, new_users = state
+        self.known_users |= new_users
+
+    def _fold(self, state, when, processes):
+        # One sweep's upserts. Reads and advances `state` rather than the
+        # index, so sweeps of a rolled-back transaction leave no trace.
+        previous_time, previous, new_users = state
+        stamp = when.strftime(TIME_FORMAT)
+        running = {}
+        users = []
+        known_users = self.known_users
+        for executable, username, license_cost in processes:
+            if not executable:
+                continue
+            running[executable] = license_cost or 0.0
+            if username and (executable, username) not in known_users and (executable, username) not in new_users:
+                new_users.add((executable, username))
+                users.append((executable, username))
+
+        elapsed = 0.0
+        if previous_time is not None:
+            gap = (when - previous_time).total_seconds()
+            if 0 < gap <= self.max_gap_s:
+                elapsed = gap
+        self.conn.executemany(self.UPSERT, [
+            (executable, stamp, stamp, elapsed if executable in previous else 0.0, license_cost)
+            for executable, license_cost in running.items()
+        ])
+        if users:
+            self.conn.executemany('INSERT OR IGNORE INTO exe_users (executable, username) VALUES (?, ?)', users)
+        state[0] = when
+        state[1] = frozenset(running)
+
+    def record(self, when, processes):
+        # add_sweep() in its own transaction
+        with self.lock:
+            with instrument.timed('db_commit_seconds', table='exe_usage'), self.conn:
+                committed = self.add_sweep(when, processes)
+            committed()
+
+    def update(self, conn, rows):
+        # BatchWriter on_flush hook: rows arrive in sweep order, one
+        # sample_time per sweep. Returns the BatchWriter's after-commit call.
+        name_at, user_at, cost_at, time_at = self.positions
+        state = self._state()
+        stamp = None
+        sweep = []
+        for row in rows:
+            if row[time_at] != stamp:
+                if sweep:
+                    self._fold(state, datetime.strptime(stamp, TIME_FORMAT), sweep)
+                stamp = row[time_at]
+                sweep = []
+            sweep.append((row[name_at], row[user_at], row[cost_at]))
+        if sweep:
+            self._fold(state, datetime.strptime(stamp, TIME_FORMAT), sweep)
+        return partial(self._commit, state)
+
+    def last_seen(self):
+        # {executable: datetime} for everything ever seen
+        with self.lock:
+            rows = self.conn.execute('SELECT executable, last_seen FROM exe_usage').fetchall()
+        return {executable: datetime.strptime(last_seen, TIME_FORMAT) for executable, last_seen in rows}
+
+    def unused(self, days=UNUSED_DAYS, now=None):
+        # [(executable, license_cost, first_seen, last_seen, runtime_s, users)]
+        # for licensed executables not seen in the last `days`, oldest first
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime(TIME_FORMAT)
+        with self.lock:
+            return self.conn.execute(self.UNUSED, (cutoff,)).fetchall()
+
+
+def format_runtime(seconds):
+    hours, seconds = divmod(int(seconds), 3600)
+    return f'{hours}h {seconds // 60:02d}m'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="List licensed executables that haven't run recently.")
+    parser.add_argument('--store', default=store.DB_FILE, help=f"SQLite database path (default: {store.DB_FILE})")
+    parser.add_argument('--days', type=int, default=UNUSED_DAYS, help=f"idle threshold in days (default: {UNUSED_DAYS})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = store.connect(args.store)
+    index = UsageIndex(conn, history_table='processes' if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'processes'").fetchone() else None)
+    rows = index.unused(args.days)
+    for executable, license_cost, first_seen, last_seen, runtime_s, users in rows:
+        print(f"{executable:<30} ${license_cost:>10,.2f}  last seen {last_seen}  runtime {format_runtime(runtime_s)}  {users} user(s)")
+    print(f"{len(rows)} licensed executable(s) not seen in the last {args.days} days")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()